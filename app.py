@@ -1,46 +1,149 @@
 import os
 import logging
+import click
 from flask import Flask, session, redirect, url_for, request
 from werkzeug.middleware.proxy_fix import ProxyFix
 from extensions import db
+from engine_profiles import engine_options, init_engine_profiles
+from identity import current_user_snapshot
+from instrumentation import init_query_instrumentation
+from metrics import init_metrics
+from replicas import REPLICA_BIND, init_replica_routing, sync_replica_command
 
-# Initialize Flask app
-app = Flask(__name__)
 
-# Set secret key from environment or fallback to default (use a secure key in production!)
-app.secret_key = os.environ.get("SESSION_SECRET", "your-secret-key-here")
+def create_app(config=None):
+    """Build and configure the Flask application.
 
-# Fix proxy headers if behind a reverse proxy (e.g., nginx)
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    Nothing here touches the database or imports the export libraries
+    (ReportLab, openpyxl); those load on the first export request. Create the
+    schema with ``flask --app main create-db`` (or ``init_db.py``).
+    """
+    app = Flask(__name__)
 
-# Configure SQLAlchemy database URI and engine options
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///blood_bank.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+    # Set secret key from environment or fallback to default (use a secure key in production!)
+    app.secret_key = os.environ.get("SESSION_SECRET", "your-secret-key-here")
 
-# Initialize SQLAlchemy with the Flask app
-db.init_app(app)
+    # Fix proxy headers if behind a reverse proxy (e.g., nginx)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure SQLAlchemy database URI; engine options follow from the backend (engine_profiles.py)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///blood_bank.db")
+    app.config["DB_ENGINE_PROFILE"] = os.environ.get("DB_ENGINE_PROFILE", "auto")
+
+    # Optional read replica for dashboards, reports and exports (replicas.py), and the seconds
+    # a user who just wrote something keeps reading from the primary
+    app.config["REPLICA_DATABASE_URI"] = os.environ.get("REPLICA_DATABASE_URL")
+    app.config["REPLICA_STALENESS_SECONDS"] = float(os.environ.get("REPLICA_STALENESS_SECONDS", 5))
+
+    # SQLite: milliseconds a writer waits for the lock, page cache (KiB) and memory map (bytes)
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    app.config["SQLITE_CACHE_SIZE_KB"] = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 65536))
+    app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+    # PostgreSQL: connections per worker process, extra connections for bursts, seconds to wait
+    # for one, and server-side timeouts (ms) for statements, lock waits and idle transactions
+    app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 10))
+    app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    app.config["DB_POOL_TIMEOUT"] = int(os.environ.get("DB_POOL_TIMEOUT", 10))
+    app.config["DB_STATEMENT_TIMEOUT_MS"] = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
+    app.config["DB_LOCK_TIMEOUT_MS"] = int(os.environ.get("DB_LOCK_TIMEOUT_MS", 5000))
+    app.config["DB_IDLE_IN_TRANSACTION_TIMEOUT_MS"] = int(os.environ.get("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", 60000))
+
+    # Rows per page for the keyset-paginated list views
+    app.config["PAGE_SIZE"] = int(os.environ.get("PAGE_SIZE", 50))
+
+    # Seconds between version checks for in-process caches (inventory snapshot etc.)
+    app.config["CACHE_VERSION_POLL_INTERVAL"] = float(os.environ.get("CACHE_VERSION_POLL_INTERVAL", 1.0))
+
+    # Background report exports: process pool size and artifact storage (default: instance/reports)
+    app.config["REPORT_WORKERS"] = int(os.environ.get("REPORT_WORKERS", 2))
+    app.config["REPORT_ARTIFACT_DIR"] = os.environ.get("REPORT_ARTIFACT_DIR")
+
+    # O- units kept back from non-urgent approvals for other blood groups
+    app.config["UNIVERSAL_DONOR_RESERVE"] = int(os.environ.get("UNIVERSAL_DONOR_RESERVE", 0))
+
+    # Bulk imports: password hashing processes (default: CPU count; 2 for uploads from the admin page)
+    # and skipped-row files (default: instance/imports)
+    app.config["IMPORT_WORKERS"] = int(os.environ.get("IMPORT_WORKERS", 0)) or None
+    app.config["IMPORT_WEB_WORKERS"] = int(os.environ.get("IMPORT_WEB_WORKERS", 0)) or None
+    app.config["IMPORT_ERROR_DIR"] = os.environ.get("IMPORT_ERROR_DIR")
+
+    # Live updates (Server-Sent Events): outbox poll interval, seconds of events kept for
+    # reconnecting clients, and seconds a stream stays open before the browser reconnects
+    app.config["EVENT_POLL_INTERVAL"] = float(os.environ.get("EVENT_POLL_INTERVAL", 0.5))
+    app.config["EVENT_RETENTION"] = int(os.environ.get("EVENT_RETENTION", 300))
+    app.config["EVENT_STREAM_TIMEOUT"] = int(os.environ.get("EVENT_STREAM_TIMEOUT", 300))
+
+    # Camp appointments: slot length in minutes and donors booked per slot
+    app.config["CAMP_SLOT_MINUTES"] = int(os.environ.get("CAMP_SLOT_MINUTES", 15))
+    app.config["CAMP_DONORS_PER_SLOT"] = int(os.environ.get("CAMP_DONORS_PER_SLOT", 4))
+
+    # Prometheus metrics at /admin/metrics (metrics.py): on by default; scrapers authenticate with
+    # "Authorization: Bearer <METRICS_TOKEN>", people with an admin session
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") not in ("0", "false", "no")
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+
+    # Explicit overrides (scripts, benchmarks) win over the environment
+    if config:
+        app.config.update(config)
+
+    # Initialize SQLAlchemy with the Flask app (explicit SQLALCHEMY_ENGINE_OPTIONS still win)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+    replica_uri = app.config["REPLICA_DATABASE_URI"]
+    if replica_uri:
+        app.config.setdefault("SQLALCHEMY_BINDS", {}).setdefault(
+            REPLICA_BIND, {"url": replica_uri, **engine_options(app.config, replica_uri)})
+    db.init_app(app)
+    init_engine_profiles(app)
+    init_replica_routing(app)
+
+    # Count and time SQL statements per request (X-SQL-Queries header in debug mode)
+    init_query_instrumentation(app)
+    # Request latency, SQL and export render metrics for Prometheus
+    init_metrics(app)
 
-# Import models and register blueprints inside the application context
-with app.app_context():
     import models
-    from routes import auth, admin, donor, patient
-    
+    from bulk_import import import_donations_command, import_users_command
+    from camps import generate_camp_slots_command
+    from counters import repair_counters_command
+    from eligibility import backfill_donor_stats_command
+    from expiry import backfill_blood_units_command, expire_blood_units_command
+    from reports import backfill_rollups_command
+    from routes import api, auth, admin, donor, events, patient
+    from search import build_search_index_command
+    from triage import backfill_triage_command
+
     # Register blueprints
     app.register_blueprint(auth.bp)
     app.register_blueprint(admin.bp)
     app.register_blueprint(donor.bp)
     app.register_blueprint(patient.bp)
-    
-    # Create all tables (if not exist)
-    db.create_all()
+    app.register_blueprint(api.bp)
+    app.register_blueprint(events.bp)
+
+    # CLI commands (flask --app main <command>)
+    app.cli.add_command(create_db_command)
+    app.cli.add_command(repair_counters_command)
+    app.cli.add_command(backfill_rollups_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(import_donations_command)
+    app.cli.add_command(backfill_triage_command)
+    app.cli.add_command(backfill_donor_stats_command)
+    app.cli.add_command(build_search_index_command)
+    app.cli.add_command(expire_blood_units_command)
+    app.cli.add_command(backfill_blood_units_command)
+    app.cli.add_command(sync_replica_command)
+    app.cli.add_command(generate_camp_slots_command)
+
+    app.add_url_rule('/', 'index', index)
+    app.context_processor(inject_user)
+
+    return app
+
 
-@app.route('/')
 def index():
     if 'user_id' in session:
-        user = models.User.query.get(session['user_id'])
+        user = current_user_snapshot()
         if user:
             if user.role == 'admin':
                 return redirect(url_for('admin.dashboard'))
@@ -50,13 +153,18 @@ def index():
                 return redirect(url_for('patient.dashboard'))
     return redirect(url_for('auth.login'))
 
-@app.context_processor
+
 def inject_user():
-    if 'user_id' in session:
-        user = models.User.query.get(session['user_id'])
-        return {'current_user': user}
-    return {'current_user': None}
+    # The navbar only needs name and role, so a cached snapshot is enough
+    return {'current_user': current_user_snapshot()}
 
-if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=True)
 
+@click.command('create-db')
+def create_db_command():
+    """Create any missing tables and indexes (existing data is left untouched)."""
+    db.create_all()
+    click.echo('Database tables created.')
+
+
+if __name__ == "__main__":
+    create_app().run(host="127.0.0.1", port=5000, debug=True)
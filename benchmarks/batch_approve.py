@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Batch approval benchmark
+Creates a scratch SQLite database with many pending requests across every
+blood group and urgency and less stock than they need, then approves them
+with triage.batch_approve (one transaction) and, with --compare, one request
+at a time through inventory.allocate. Fails if stock went negative, the
+ledger or the bags left disagree with the stock, the counters drift from a full
+recompute, or a request left pending could still have been filled.
+
+Usage: python benchmarks/batch_approve.py --requests 10000 --stock 15000 [--compare]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+URGENCIES = ('urgent', 'normal', 'low')
+PATIENTS = 200
+
+
+def setup_database(app, num_requests, stock, seed):
+    from sqlalchemy import insert
+
+    from counters import recompute_counters
+    from expiry import backfill_blood_units
+    from extensions import db
+    from models import BloodInventory, BloodRequest, User
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin = User(username='admin', email='admin@bloodbank.com', role='admin', full_name='Admin')
+        # Hashing is not what is measured here
+        admin.password_hash = '!'
+        db.session.add(admin)
+        db.session.flush()
+        admin_id = admin.id
+        db.session.execute(insert(User), [
+            {'username': f'patient{i}', 'email': f'patient{i}@bloodbank.com', 'password_hash': '!',
+             'role': 'patient', 'full_name': f'Patient {i}', 'blood_group': rng.choice(BLOOD_GROUPS)}
+            for i in range(PATIENTS)
+        ])
+        patient_ids = [user_id for (user_id,) in db.session.query(User.id).filter_by(role='patient')]
+
+        # Spread stock unevenly so some groups must borrow from compatible ones
+        weights = [rng.random() for _ in BLOOD_GROUPS]
+        db.session.add_all([
+            BloodInventory(blood_group=group, units_available=int(stock * weight / sum(weights)))
+            for group, weight in zip(BLOOD_GROUPS, weights)
+        ])
+        today = date.today()
+        db.session.execute(insert(BloodRequest), [
+            {'patient_id': rng.choice(patient_ids), 'blood_group': rng.choice(BLOOD_GROUPS),
+             'units_required': rng.randint(1, 3), 'urgency': rng.choices(URGENCIES, (1, 6, 3))[0],
+             'request_date': today - timedelta(days=rng.randint(0, 30)), 'status': 'pending'}
+            for _ in range(num_requests)
+        ])
+        db.session.commit()
+        backfill_blood_units()
+        recompute_counters()
+    return admin_id
+
+
+def run_batch(app, admin_id):
+    from triage import batch_approve
+
+    with app.app_context():
+        result = batch_approve(admin_id)
+        return len(result.approved), len(result.unfilled), result.units_allocated, result.elapsed
+
+
+def run_one_by_one(app, admin_id):
+    from counters import request_status_changed
+    from extensions import db
+    from inventory import REASON_APPROVAL, allocate
+    from models import BloodRequest
+    from triage import triage_order
+
+    with app.app_context():
+        reserve = app.config['UNIVERSAL_DONOR_RESERVE']
+        pending = BloodRequest.query.filter_by(status='pending').order_by(*triage_order()).all()
+        started = time.perf_counter()
+        approved = 0
+        for blood_request in pending:
+            if allocate(blood_request.blood_group, blood_request.units_required, REASON_APPROVAL,
+                        reserve=0 if blood_request.urgency == 'urgent' else reserve,
+                        request_id=blood_request.id, user_id=admin_id):
+                blood_request.status = 'approved'
+                request_status_changed(blood_request.patient_id, 'pending', 'approved')
+                approved += 1
+            db.session.commit()
+        return approved, time.perf_counter() - started
+
+
+def check_consistency(app, stock):
+    from sqlalchemy import func
+
+    from counters import recompute_counters
+    from extensions import db
+    from models import UNIT_AVAILABLE, BloodInventory, BloodRequest, BloodUnit, Counter, InventoryMovement
+    from triage import preview_batch
+
+    with app.app_context():
+        remaining = db.session.query(func.sum(BloodInventory.units_available)).scalar() or 0
+        negative = BloodInventory.query.filter(BloodInventory.units_available < 0).count()
+        ledger = db.session.query(func.sum(InventoryMovement.change)).scalar() or 0
+        bags = BloodUnit.query.filter_by(status=UNIT_AVAILABLE).count()
+        before = dict(db.session.query(Counter.name, Counter.value))
+        recompute_counters()
+        after = dict(db.session.query(Counter.name, Counter.value))
+        counters_ok = {k: v for k, v in before.items() if v} == {k: v for k, v in after.items() if v}
+        # Nothing still pending may be fillable from what is left
+        leftover_fillable = len(preview_batch()[0])
+        urgent_pending = BloodRequest.query.filter_by(status='pending', urgency='urgent').count()
+
+    print(f"Remaining stock:    {remaining} (negative groups: {negative})")
+    print(f"Ledger total:       {ledger}")
+    print(f"Bags in stock:      {bags}")
+    print(f"Counters:           {'match recompute' if counters_ok else 'DRIFTED'}")
+    print(f"Still fillable:     {leftover_fillable}")
+    print(f"Urgent unfilled:    {urgent_pending}")
+    return (negative == 0 and ledger == remaining - stock and bags == remaining and counters_ok
+            and leftover_fillable == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--stock', type=int, default=15000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--compare', action='store_true',
+                        help='also time one-at-a-time approval (minutes at 10k requests)')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'batch_bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from extensions import db
+    from models import BloodInventory
+    from sqlalchemy import func
+
+    app = create_app()
+    admin_id = setup_database(app, args.requests, args.stock, args.seed)
+    with app.app_context():
+        stock = db.session.query(func.sum(BloodInventory.units_available)).scalar()
+
+    approved, unfilled, units, elapsed = run_batch(app, admin_id)
+    print(f"Pending requests:   {args.requests} (stock {stock} units)")
+    print(f"Batch approved:     {approved} ({units} units), unfilled {unfilled}")
+    print(f"Batch elapsed:      {elapsed:.2f}s ({approved / elapsed:.0f} approvals/sec)")
+    ok = check_consistency(app, stock)
+
+    if args.compare:
+        setup_database(app, args.requests, args.stock, args.seed)
+        serial_approved, serial_elapsed = run_one_by_one(app, admin_id)
+        print(f"One-by-one:         {serial_approved} approved in {serial_elapsed:.2f}s "
+              f"({serial_approved / serial_elapsed:.0f} approvals/sec, "
+              f"batch is {serial_elapsed / elapsed:.1f}x faster)")
+        ok = ok and serial_approved == approved
+
+    print("Consistency:        " + ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
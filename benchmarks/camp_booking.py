@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Camp booking load test
+Creates a scratch SQLite database with one camp and far more donors than
+places, then has every donor book through donor.book from N concurrent
+worker processes, as when a campus drive opens. Each donor asks for a
+random slot among the first few (so bookings pile onto the same rows) and
+then tries to book a second slot at the same camp. Reports bookings per
+second and fails if a slot or the camp was overbooked, a counter disagrees
+with the bookings, a donor holds two appointments, or a request errored.
+
+Usage: python benchmarks/camp_booking.py --workers 8 --donors 4000 --slots 40 --per-slot 25
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as clock, timedelta
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Donors aim at this many of the earliest slots, so most of them contend for the same rows
+HOT_SLOTS = 5
+
+
+def setup_database(num_donors, num_slots, per_slot):
+    from sqlalchemy import insert
+
+    from app import create_app, db
+    from camps import generate_slots
+    from models import CampSlot, DonationCamp, User
+
+    app = create_app({'CAMP_SLOT_MINUTES': 10, 'CAMP_DONORS_PER_SLOT': per_slot})
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        camp_date = date.today() + timedelta(days=7)
+        opens = datetime.combine(camp_date, clock(8, 0))
+        camp = DonationCamp(name='Campus Drive', location='Student Center', camp_date=camp_date,
+                            start_time=opens.time(), end_time=(opens + timedelta(minutes=10 * num_slots)).time())
+        db.session.add(camp)
+        # No usable password: workers set the session directly and never log in
+        db.session.execute(insert(User), [
+            {'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'unused',
+             'role': 'donor', 'full_name': f'Donor {i}', 'blood_group': 'O+'}
+            for i in range(num_donors)
+        ])
+        db.session.commit()
+        camp_id = camp.id
+        generate_slots()
+        donor_ids = [user_id for user_id, in db.session.query(User.id).order_by(User.id)]
+        slot_ids = [slot_id for slot_id, in db.session.query(CampSlot.id).filter_by(camp_id=camp_id)
+                    .order_by(CampSlot.starts_at)]
+        # Forked workers must open their own connections
+        db.engine.dispose()
+        return camp_id, donor_ids, slot_ids
+
+
+def book_batch(args):
+    camp_id, slot_ids, donor_ids, seed = args
+    from app import create_app
+
+    client = create_app().test_client()
+    rng = random.Random(seed)
+    hot = slot_ids[:HOT_SLOTS]
+
+    attempts = errors = 0
+    for donor_id in donor_ids:
+        with client.session_transaction() as sess:
+            # Drops the previous donor's unread flash messages too
+            sess.clear()
+            sess['user_id'] = donor_id
+            sess['user_role'] = 'donor'
+        for slot_id in (rng.choice(hot), rng.choice(slot_ids)):
+            attempts += 1
+            if client.post(f'/donor/camps/{camp_id}/book', data={'slot_id': slot_id}).status_code != 302:
+                errors += 1
+    return attempts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--donors', type=int, default=4000)
+    parser.add_argument('--slots', type=int, default=40)
+    parser.add_argument('--per-slot', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'camp_bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    camp_id, donor_ids, slot_ids = setup_database(args.donors, args.slots, args.per_slot)
+    batches = [(camp_id, slot_ids, donor_ids[i::args.workers], args.seed + i) for i in range(args.workers)]
+
+    started = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = pool.map(book_batch, batches)
+    elapsed = time.perf_counter() - started
+    attempts = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+
+    from sqlalchemy import func
+
+    from app import create_app, db
+    from models import CampBooking, CampSlot, DonationCamp
+
+    app = create_app()
+
+    with app.app_context():
+        camp = db.session.get(DonationCamp, camp_id)
+        per_slot = dict(db.session.query(CampBooking.slot_id, func.count(CampBooking.id))
+                        .group_by(CampBooking.slot_id))
+        slots = CampSlot.query.filter_by(camp_id=camp_id).all()
+        bookings = CampBooking.query.filter_by(camp_id=camp_id).count()
+        donors_booked = db.session.query(func.count(func.distinct(CampBooking.donor_id))).scalar()
+        overbooked = [slot.id for slot in slots if per_slot.get(slot.id, 0) > slot.capacity]
+        miscounted = [slot.id for slot in slots if per_slot.get(slot.id, 0) != slot.booked]
+        capacity, booked_count = camp.capacity, camp.booked_count
+
+    print(f"Workers:            {args.workers}")
+    print(f"Booking attempts:   {attempts} ({args.donors} donors, 2 each)")
+    print(f"Booked:             {bookings} of {capacity} places in {len(slots)} slots")
+    print(f"Errors:             {errors}")
+    print(f"Elapsed:            {elapsed:.2f}s")
+    print(f"Attempts/sec:       {attempts / elapsed:.1f}")
+
+    ok = (not overbooked and not miscounted and not errors
+          and bookings == booked_count <= capacity and donors_booked == bookings
+          # More donors than places: every place should have been taken
+          and (args.donors < capacity or bookings == capacity))
+    if overbooked:
+        print(f"Overbooked slots:   {overbooked}")
+    if miscounted:
+        print(f"Miscounted slots:   {miscounted}")
+    print("Consistency:        " + ("OK" if ok else "OVERBOOKING OR LOST UPDATES DETECTED"))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
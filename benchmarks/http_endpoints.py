@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+HTTP endpoint benchmark suite
+Logs in as admin, donor and patient through /login and drives every
+blueprint route (dashboards, lists, search, reports, exports, the JSON API,
+camp booking, donate, request_blood, approve, reject and batch triage) from a
+pool of concurrent clients. Reports p50/p95/p99 latency, throughput and SQL
+queries per endpoint, saves the results as JSON and, given --baseline, fails
+when an endpoint regressed against it.
+
+In-process mode (default) builds a scratch SQLite database with init_db.py at
+--scale and calls the app through the Flask test client. With --url it drives
+a running server instead (e.g. gunicorn on a database seeded with
+`python init_db.py --scale N`); SQL counts are then only available if the
+server sends X-SQL-Queries headers (SQL_DEBUG_HEADERS).
+
+Usage: python benchmarks/http_endpoints.py --scale 0.1 --concurrency 8 --iterations 50
+       python benchmarks/http_endpoints.py --url http://127.0.0.1:5000 --baseline baseline.json
+"""
+
+import argparse
+import html
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, NamedTuple, Optional, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'http_endpoints.json')
+
+# Sample accounts created by init_db.py
+CREDENTIALS = {
+    'admin': ('admin', 'admin123'),
+    'donor': ('john_doe', 'password123'),
+    'patient': ('patient1', 'password123'),
+}
+# Donors the suite registers itself, one per client thread: with no donation
+# history they pass the eligibility check that camp bookings make
+NEW_DONOR = 'new_donor'
+
+# A p95 increase is only a regression if it is above both limits
+DEFAULT_THRESHOLD = 0.2
+MIN_REGRESSION_MS = 2.0
+
+PENDING_PATTERN = re.compile(r'/admin/requests/(\d+)/approve')
+NEXT_PAGE_PATTERN = re.compile(r'href="(/admin/requests\?cursor=[^"]+)"')
+API_REQUEST_PATTERN = re.compile(r'"id":\s*(\d+)')
+CAMP_PATTERN = re.compile(r'href="/donor/camps/(\d+)"')
+SLOT_PATTERN = re.compile(r'name="slot_id" value="(\d+)"')
+CANCEL_PATTERN = re.compile(r'action="(/donor/bookings/\d+/cancel)"')
+
+
+class Endpoint(NamedTuple):
+    name: str
+    role: str
+    method: str
+    path: Union[str, Callable[[], Optional[str]]]
+    data: Union[None, dict, Callable[[], Optional[dict]]] = None
+    # Fraction of --iterations to run (exports over the whole dataset are slow)
+    share: float = 1.0
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        # Reading the body also drains streamed exports inside the timing
+        body = response.get_data().decode(errors='replace')
+        return response.status_code, response.headers.get('X-SQL-Queries'), body
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=120) as response:
+                return response.status, response.headers.get('X-SQL-Queries'), response.read().decode(errors='replace')
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get('X-SQL-Queries'), error.read().decode(errors='replace')
+
+
+class Suite:
+    def __init__(self, make_client, concurrency, iterations):
+        self.make_client = make_client
+        self.concurrency = concurrency
+        self.iterations = iterations
+        self.pending_ids = deque()
+        self._local = threading.local()
+
+    def client(self, role):
+        """This thread's logged-in client for ``role``."""
+        clients = self._local.__dict__.setdefault('clients', {})
+        if role not in clients:
+            client = self.make_client()
+            if role == NEW_DONOR:
+                username, password = self.register_donor(client), 'password123'
+            else:
+                username, password = CREDENTIALS[role]
+            status, _, _ = client.request('POST', '/login', {'username': username, 'password': password})
+            if status != 302:
+                raise SystemExit(f'Login as {username} failed (HTTP {status}) - seed the database with init_db.py')
+            clients[role] = client
+        return clients[role]
+
+    def register_donor(self, client):
+        username = f'bench_{uuid.uuid4().hex[:12]}'
+        status, _, _ = client.request('POST', '/register', {
+            'username': username, 'email': f'{username}@example.com', 'password': 'password123',
+            'role': 'donor', 'full_name': 'Benchmark Donor', 'phone': '555-0100', 'address': 'Benchmark',
+            'blood_group': 'O+', 'date_of_birth': '1990-01-01', 'gender': 'other',
+        })
+        if status != 302:
+            raise SystemExit(f'Registering benchmark donor {username} failed (HTTP {status})')
+        return username
+
+    def next_pending(self):
+        try:
+            return self.pending_ids.popleft()
+        except IndexError:
+            return None
+
+    def collect_pending(self, wanted):
+        """Queue up to ``wanted`` pending request ids scraped from the admin request list."""
+        client = self.client('admin')
+        path = '/admin/requests?per_page=200'
+        while path and len(self.pending_ids) < wanted:
+            _, _, body = client.request('GET', path)
+            self.pending_ids.extend(int(request_id) for request_id in PENDING_PATTERN.findall(body))
+            match = NEXT_PAGE_PATTERN.search(body)
+            path = html.unescape(match.group(1)) if match else None
+
+    def find(self, role, path, pattern):
+        """The first ``pattern`` group in the page at ``path``, or ``None``."""
+        _, _, body = self.client(role).request('GET', path)
+        match = pattern.search(body)
+        return match.group(1) if match else None
+
+    def call(self, endpoint):
+        path = endpoint.path() if callable(endpoint.path) else endpoint.path
+        data = endpoint.data() if callable(endpoint.data) else endpoint.data
+        if path is None:
+            return None
+        client = self.client(endpoint.role)
+        started = time.perf_counter()
+        try:
+            status, queries, _ = client.request(endpoint.method, path, data)
+        except Exception:
+            status, queries = 599, None
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, status, int(queries.split(';')[0]) if queries else None
+
+    def run(self, endpoint):
+        count = max(1, int(self.iterations * endpoint.share))
+        # Log every worker in before the clock starts
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            list(pool.map(lambda _: self.client(endpoint.role), range(self.concurrency)))
+            started = time.perf_counter()
+            samples = [sample for sample in pool.map(lambda _: self.call(endpoint), range(count)) if sample]
+            wall = time.perf_counter() - started
+        return summarize(samples, wall)
+
+
+def percentile(ordered, pct):
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, wall):
+    if not samples:
+        return None
+    latencies = sorted(sample[0] for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    statuses = Counter(sample[1] for sample in samples)
+    return {
+        'count': len(samples),
+        'errors': sum(count for status, count in statuses.items() if status >= 500),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+        'sql_queries': round(statistics.fmean(queries), 1) if queries else None,
+    }
+
+
+def endpoints(suite):
+    """Every benchmarked endpoint, in run order: reads, then the writes that feed approve/reject."""
+    required_by = (date.today() + timedelta(days=7)).isoformat()
+
+    def pending_action(action):
+        def path():
+            request_id = suite.next_pending()
+            return f'/admin/requests/{request_id}/{action}' if request_id else None
+        return path
+
+    found = {}
+
+    def api_request_path():
+        if 'request' not in found:
+            found['request'] = suite.find('patient', '/api/v1/requests', API_REQUEST_PATTERN)
+        return f"/api/v1/requests/{found['request']}" if found['request'] else None
+
+    def camp_path(suffix=''):
+        def path():
+            if 'camp' not in found:
+                found['camp'] = suite.find('donor', '/donor/camps', CAMP_PATTERN)
+            return f"/donor/camps/{found['camp']}{suffix}" if found['camp'] else None
+        return path
+
+    def booking_data():
+        if 'slot' not in found:
+            camp = camp_path()()
+            found['slot'] = camp and suite.find('donor', camp, SLOT_PATTERN)
+        return {'slot_id': found['slot']} if found['slot'] else None
+
+    def cancel_path():
+        # Book (outside the timing) so every call has an appointment to cancel. donor.book
+        # fills its slot, so take the first slot with places left, in any camp
+        client = suite.client(NEW_DONOR)
+        if 'camps' not in found:
+            _, _, body = client.request('GET', '/donor/camps')
+            found['camps'] = list(dict.fromkeys(CAMP_PATTERN.findall(body)))
+        for camp_id in found['camps']:
+            _, _, body = client.request('GET', f'/donor/camps/{camp_id}')
+            slot = SLOT_PATTERN.search(body)
+            if slot:
+                client.request('POST', f'/donor/camps/{camp_id}/book', {'slot_id': slot.group(1)})
+                return suite.find(NEW_DONOR, '/donor/camps', CANCEL_PATTERN)
+        return None
+
+    reads = [
+        Endpoint('auth.login', 'admin', 'GET', '/login'),
+        Endpoint('admin.dashboard', 'admin', 'GET', '/admin/dashboard'),
+        Endpoint('admin.inventory', 'admin', 'GET', '/admin/inventory'),
+        Endpoint('admin.requests', 'admin', 'GET', '/admin/requests'),
+        Endpoint('admin.donors', 'admin', 'GET', '/admin/donors'),
+        Endpoint('admin.patients', 'admin', 'GET', '/admin/patients'),
+        Endpoint('admin.donors[search]', 'admin', 'GET', '/admin/donors?q=john'),
+        Endpoint('admin.search_users_api', 'admin', 'GET', '/admin/api/users/search?q=pat'),
+        Endpoint('admin.reports', 'admin', 'GET', '/admin/reports'),
+        Endpoint('admin.export_reports_pdf', 'admin', 'GET', '/admin/reports/export/pdf'),
+        Endpoint('admin.export_reports_excel', 'admin', 'GET', '/admin/reports/export/excel'),
+        Endpoint('admin.export_status_view', 'admin', 'GET', '/admin/reports/export/pdf/status'),
+        Endpoint('admin.export_raw[donations.csv]', 'admin', 'GET', '/admin/export/donations.csv', share=0.1),
+        Endpoint('admin.export_raw[donors.xlsx]', 'admin', 'GET', '/admin/export/donors.xlsx', share=0.1),
+        Endpoint('admin.triage', 'admin', 'GET', '/admin/triage'),
+        Endpoint('admin.eligible_donors_api', 'admin', 'GET', '/admin/api/eligible-donors?blood_group=O%2B'),
+        Endpoint('admin.eligible_donors_api[compat]', 'admin', 'GET',
+                 '/admin/api/eligible-donors?blood_group=AB%2B&compatible=1'),
+        Endpoint('donor.dashboard', 'donor', 'GET', '/donor/dashboard'),
+        Endpoint('donor.profile', 'donor', 'GET', '/donor/profile'),
+        Endpoint('donor.history', 'donor', 'GET', '/donor/history'),
+        Endpoint('donor.camps', 'donor', 'GET', '/donor/camps'),
+        Endpoint('donor.camp', 'donor', 'GET', camp_path()),
+        Endpoint('patient.dashboard', 'patient', 'GET', '/patient/dashboard'),
+        Endpoint('patient.request_blood[GET]', 'patient', 'GET', '/patient/request'),
+        Endpoint('patient.requests', 'patient', 'GET', '/patient/requests'),
+        # patient.profile is left out: its template does not exist yet
+        Endpoint('api.inventory', 'patient', 'GET', '/api/v1/inventory'),
+        Endpoint('api.camps', 'patient', 'GET', '/api/v1/camps'),
+        Endpoint('api.request_list', 'patient', 'GET', '/api/v1/requests'),
+        Endpoint('api.request_status', 'patient', 'GET', api_request_path),
+    ]
+    writes = [
+        # Concurrent bookings of one slot; repeats measure the one-booking-per-camp check
+        Endpoint('donor.book', NEW_DONOR, 'POST', camp_path('/book'), booking_data),
+        Endpoint('donor.cancel', NEW_DONOR, 'POST', cancel_path),
+        # After the first donation the donor is ineligible, so repeats measure the eligibility check
+        Endpoint('donor.donate', 'donor', 'POST', '/donor/donate', {'hemoglobin': '13.5', 'notes': 'benchmark'}),
+        Endpoint('patient.request_blood[POST]', 'patient', 'POST', '/patient/request',
+                 {'blood_group': 'O+', 'units_required': '1', 'urgency': 'normal',
+                  'reason': 'Benchmark request', 'required_by': required_by}),
+        # Small batches, so pending requests are left for approve/reject below
+        Endpoint('admin.triage_approve', 'admin', 'POST', '/admin/triage/approve', {'limit': '5'}, share=0.2),
+    ]
+    decisions = [
+        Endpoint('admin.approve_request', 'admin', 'POST', pending_action('approve')),
+        Endpoint('admin.reject_request', 'admin', 'POST', pending_action('reject'), {'notes': 'benchmark'}),
+    ]
+    return reads, writes, decisions
+
+
+def build_database(scale, seed):
+    """Point the app at a fresh scratch database populated by init_db.py; returns the app."""
+    workdir = tempfile.mkdtemp(prefix='http_bench_')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ.setdefault('REPORT_ARTIFACT_DIR', os.path.join(workdir, 'reports'))
+
+    import init_db
+    init_db.init_database(scale, seed)
+    return init_db.app
+
+
+def compare(results, baseline, threshold):
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not current or not previous:
+            continue
+        limit = max(previous['p95_ms'] * (1 + threshold), previous['p95_ms'] + MIN_REGRESSION_MS)
+        if current['p95_ms'] > limit:
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current['sql_queries'] is not None and previous.get('sql_queries') is not None \
+                and current['sql_queries'] > previous['sql_queries'] + 0.5:
+            regressions.append(f"{name}: SQL queries {previous['sql_queries']} -> {current['sql_queries']}")
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: {current['errors']} server errors (baseline {previous.get('errors', 0)})")
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"{'endpoint':<36}{'n':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'sql':>7}{'p95 vs base':>13}")
+    for name, result in results.items():
+        if result is None:
+            print(f'{name:<36}  (skipped: nothing to act on)')
+            continue
+        delta = ''
+        previous = baseline.get(name)
+        if previous and previous['p95_ms']:
+            delta = f"{(result['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%"
+        sql = '-' if result['sql_queries'] is None else f"{result['sql_queries']:g}"
+        print(f"{name:<36}{result['count']:>6}{result['errors']:>5}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+              f"{result['p99_ms']:>9.1f}{result['throughput_rps']:>9.1f}{sql:>7}{delta:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--scale', type=float, default=0.1, help='synthetic data scale (in-process mode)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=50, help='requests per endpoint')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the JSON results')
+    parser.add_argument('--baseline', help='JSON results of a known-good run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative p95 increase before an endpoint counts as regressed')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)
+    else:
+        app = build_database(args.scale, args.seed)
+        app.config['SQL_DEBUG_HEADERS'] = True
+        make_client = lambda: InProcessClient(app)
+
+    suite = Suite(make_client, args.concurrency, args.iterations)
+    reads, writes, decisions = endpoints(suite)
+    results = {}
+    for endpoint in reads + writes:
+        results[endpoint.name] = suite.run(endpoint)
+    suite.collect_pending(args.iterations * len(decisions))
+    for endpoint in decisions:
+        results[endpoint.name] = suite.run(endpoint)
+    # A write with nothing to act on measured nothing: the seed data or an earlier step is wrong
+    skipped = [endpoint.name for endpoint in writes + decisions if results[endpoint.name] is None]
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['endpoints']
+    print_table(results, baseline)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'mode': 'http' if args.url else 'in-process',
+                'url': args.url,
+                'scale': None if args.url else args.scale,
+                'concurrency': args.concurrency,
+                'iterations': args.iterations,
+                'python': platform.python_version(),
+            },
+            'endpoints': results,
+        }, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    for name in skipped:
+        print(f'FAILED {name}: nothing to act on, so the endpoint was not measured')
+    return 1 if regressions or skipped else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Inventory approval throughput benchmark
+Creates a scratch SQLite database with more pending requests than stock, then
+approves them from N concurrent worker processes through admin.approve_request
+and reports approvals per second. Fails if any update was lost or stock went
+negative, or a bag was issued twice.
+
+Usage: python benchmarks/inventory_throughput.py --workers 8 --requests 2000 --stock 1500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BLOOD_GROUP = 'O+'
+
+
+def setup_database(num_requests, stock):
+    from app import create_app, db
+    from expiry import backfill_blood_units
+    from models import User, BloodInventory, BloodRequest
+
+    app = create_app()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin = User(username='admin', email='admin@bloodbank.com', role='admin', full_name='Admin')
+        patient = User(username='patient', email='patient@bloodbank.com', role='patient', full_name='Patient')
+        admin.set_password('admin123')
+        patient.set_password('password123')
+        db.session.add_all([admin, patient, BloodInventory(blood_group=BLOOD_GROUP, units_available=stock)])
+        db.session.flush()
+        db.session.add_all([
+            BloodRequest(patient_id=patient.id, blood_group=BLOOD_GROUP, units_required=1,
+                         request_date=date.today())
+            for _ in range(num_requests)
+        ])
+        db.session.commit()
+        admin_id = admin.id
+        backfill_blood_units()
+        # Forked workers must open their own connections
+        db.engine.dispose()
+        return admin_id
+
+
+def approve_batch(args):
+    admin_id, request_ids = args
+    from app import create_app
+
+    client = create_app().test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+        sess['user_role'] = 'admin'
+
+    errors = 0
+    for request_id in request_ids:
+        if client.post(f'/admin/requests/{request_id}/approve').status_code != 302:
+            errors += 1
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--stock', type=int, default=1500)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'inventory_bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    admin_id = setup_database(args.requests, args.stock)
+    request_ids = list(range(1, args.requests + 1))
+    # Every worker walks all requests in a different order, so they contend for the same rows
+    batches = [(admin_id, request_ids if i % 2 == 0 else request_ids[::-1]) for i in range(args.workers)]
+
+    started = time.perf_counter()
+    with Pool(args.workers) as pool:
+        errors = sum(pool.map(approve_batch, batches))
+    elapsed = time.perf_counter() - started
+
+    from app import create_app, db
+    from models import UNIT_AVAILABLE, UNIT_ISSUED, BloodInventory, BloodRequest, BloodUnit, InventoryMovement
+    from sqlalchemy import func
+
+    app = create_app()
+
+    with app.app_context():
+        approved = BloodRequest.query.filter_by(status='approved').count()
+        remaining = BloodInventory.query.filter_by(blood_group=BLOOD_GROUP).one().units_available
+        ledger = db.session.query(func.sum(InventoryMovement.change)).scalar() or 0
+        bags = BloodUnit.query.filter_by(status=UNIT_AVAILABLE).count()
+        issued = BloodUnit.query.filter_by(status=UNIT_ISSUED).count()
+
+    print(f"Workers:            {args.workers}")
+    print(f"Approval attempts:  {len(batches) * args.requests}")
+    print(f"Approved:           {approved} (stock {args.stock}, requests {args.requests})")
+    print(f"Remaining stock:    {remaining}")
+    print(f"Errors:             {errors}")
+    print(f"Elapsed:            {elapsed:.2f}s")
+    print(f"Approvals/sec:      {approved / elapsed:.1f}")
+    print(f"Attempts/sec:       {len(batches) * args.requests / elapsed:.1f}")
+
+    expected = min(args.stock, args.requests)
+    ok = (approved == expected and remaining == args.stock - approved and ledger == -approved and remaining >= 0
+          and bags == remaining and issued == approved)
+    print("Consistency:        " + ("OK" if ok else "LOST UPDATES DETECTED"))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
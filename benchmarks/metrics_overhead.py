@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Metrics collection overhead benchmark
+Builds a scratch SQLite database with init_db.py and serves the same requests
+through two apps on it, one with METRICS_ENABLED and one without, in
+alternating rounds so both see the same machine noise. Samples are written
+to a temporary PROMETHEUS_MULTIPROC_DIR, as under gunicorn. Reports the
+median per-request time of each endpoint with and without metrics, checks
+that /admin/metrics counted every request, and exits non-zero when the
+median added cost exceeds --budget microseconds.
+
+Usage: python benchmarks/metrics_overhead.py --rounds 20 --requests 100 --budget 150
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (endpoint, path, role): a page without SQL and two dashboard reads
+ENDPOINTS = (
+    ('auth.login', '/login', None),
+    ('donor.dashboard', '/donor/dashboard', 'donor'),
+    ('admin.dashboard', '/admin/dashboard', 'admin'),
+)
+CREDENTIALS = {
+    'admin': ('admin', 'admin123'),
+    'donor': ('john_doe', 'password123'),
+}
+
+
+def prepare():
+    workdir = tempfile.mkdtemp(prefix='metrics_bench_')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    # Must be set before prometheus_client is first imported
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(workdir, 'metrics')
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+    import init_db
+    from app import create_app
+    init_db.init_database()
+    return init_db.app, create_app({'METRICS_ENABLED': False})
+
+
+def clients(app):
+    """A test client per role, logged in."""
+    result = {None: app.test_client()}
+    for role, (username, password) in CREDENTIALS.items():
+        client = app.test_client()
+        response = client.post('/login', data={'username': username, 'password': password})
+        if response.status_code != 302:
+            raise SystemExit(f'Login as {username} failed (HTTP {response.status_code})')
+        result[role] = client
+    return result
+
+
+def time_requests(client, path, count):
+    """Median seconds per request over ``count`` requests."""
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f'{path} returned HTTP {response.status_code}')
+    return statistics.median(timings)
+
+
+def counted_requests(body, endpoint):
+    """GET requests to ``endpoint`` in the exposition text (histogram _count samples)."""
+    total = 0.0
+    pattern = re.compile(r'^bloodbank_http_request_duration_seconds_count\{([^}]*)\} (\S+)$', re.M)
+    for labels, value in pattern.findall(body):
+        if 'method="GET"' in labels and f'endpoint="{endpoint}"' in labels:
+            total += float(value)
+    return int(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint per round')
+    parser.add_argument('--budget', type=float, default=150.0,
+                        help='maximum median microseconds metrics may add to a request')
+    args = parser.parse_args()
+
+    metered_app, plain_app = prepare()
+    metered, plain = clients(metered_app), clients(plain_app)
+
+    # Warm both apps (templates, caches, pooled connections)
+    for _, path, role in ENDPOINTS:
+        time_requests(metered[role], path, 5)
+        time_requests(plain[role], path, 5)
+
+    added = {path: [] for _, path, _ in ENDPOINTS}
+    baseline = {path: [] for _, path, _ in ENDPOINTS}
+    for _ in range(args.rounds):
+        for _, path, role in ENDPOINTS:
+            off = time_requests(plain[role], path, args.requests)
+            on = time_requests(metered[role], path, args.requests)
+            baseline[path].append(off)
+            added[path].append(on - off)
+
+    print(f"Rounds: {args.rounds} x {args.requests} requests per endpoint")
+    print(f"{'endpoint':<20} {'without':>12} {'added':>12}")
+    failed = False
+    for _, path, _ in ENDPOINTS:
+        median_added = statistics.median(added[path]) * 1e6
+        print(f"{path:<20} {statistics.median(baseline[path]) * 1e6:9.0f} us {median_added:9.1f} us")
+        if median_added > args.budget:
+            print(f"FAIL: {path} metrics add {median_added:.1f}us, budget {args.budget:.0f}us")
+            failed = True
+
+    body = metered['admin'].get('/admin/metrics').get_data(as_text=True)
+    expected = 5 + args.rounds * args.requests
+    for endpoint, path, _ in ENDPOINTS:
+        counted = counted_requests(body, endpoint)
+        if counted < expected:
+            print(f"FAIL: /admin/metrics counted {counted} requests to {path}, expected {expected}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Worker cold-start benchmark
+Starts a fresh interpreter per run (as a new gunicorn worker or CLI script
+would), then times importing the app module, create_app() and the first
+request to the login page. Reports the median and worst run, lists any heavy
+export library that was loaded during start-up, and exits non-zero when the
+median total exceeds --budget.
+
+Usage: python benchmarks/startup.py --runs 10 --budget 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must only load when an export is requested
+HEAVY_MODULES = ('reportlab', 'openpyxl', 'pandas', 'numpy')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app()
+created = time.perf_counter()
+response = app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'total': served - started,
+    'status': response.status_code,
+    'heavy': [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=1.5,
+                        help='maximum median seconds from interpreter start to first response')
+    args = parser.parse_args()
+
+    # Start-up must not depend on (or touch) a real database
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(tempfile.mkdtemp(), "startup.db")}')
+    results = [run_once(env) for _ in range(args.runs)]
+
+    print(f"Runs: {args.runs}")
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        timings = [result[phase] for result in results]
+        print(f"{phase:<15} median {statistics.median(timings) * 1000:8.1f} ms   "
+              f"max {max(timings) * 1000:8.1f} ms")
+
+    failed = False
+    heavy = sorted({name for result in results for name in result['heavy']})
+    if heavy:
+        print(f"FAIL: heavy modules loaded at start-up: {', '.join(heavy)}")
+        failed = True
+    if any(result['status'] != 200 for result in results):
+        print(f"FAIL: first request returned HTTP {results[0]['status']}")
+        failed = True
+    median_total = statistics.median(result['total'] for result in results)
+    if median_total > args.budget:
+        print(f"FAIL: median start-up {median_total:.2f}s exceeds budget {args.budget:.2f}s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
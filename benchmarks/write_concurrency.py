@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Write concurrency benchmark per engine profile
+Runs the same mixed workload - donations through donor.donate, approvals
+through admin.approve_request and admin dashboard reads from N concurrent
+worker processes, while one more process streams the donations CSV export
+over a large donation history - against a fresh SQLite database, once with
+the basic engine profile (rollback journal, driver defaults) and once with
+the tuned one (WAL, synchronous=NORMAL, busy_timeout, cache and mmap
+pragmas). Reports write throughput, failed requests ("database is locked")
+and pool wait times; fails if a profile loses updates.
+
+In rollback-journal mode a long read holds a shared lock that stops every
+commit until it finishes; in WAL mode writers and readers proceed together.
+
+Usage: python benchmarks/write_concurrency.py --workers 8 --ops 300 --history 50000 [--profiles basic auto]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from datetime import timedelta
+from multiprocessing import Event, Pool, Process, Value
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BLOOD_GROUP = 'O+'
+
+
+def make_app(profile):
+    from app import create_app
+
+    app = create_app({'DB_ENGINE_PROFILE': profile})
+    # Failed requests are counted, not logged
+    app.logger.disabled = True
+    logging.getLogger('instrumentation').setLevel(logging.ERROR)
+    return app
+
+
+def setup_database(profile, workers, ops, history):
+    from sqlalchemy import insert
+
+    from extensions import db
+    from models import BloodInventory, BloodRequest, Donation, User
+
+    app = make_app(profile)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin = User(username='admin', email='admin@bloodbank.com', role='admin', full_name='Admin')
+        patient = User(username='patient', email='patient@bloodbank.com', role='patient', full_name='Patient')
+        # Hashing is not what is measured here
+        admin.password_hash = patient.password_hash = '!'
+        db.session.add_all([admin, patient, BloodInventory(blood_group=BLOOD_GROUP, units_available=0)])
+        db.session.flush()
+        admin_id, patient_id = admin.id, patient.id
+        # One fresh donor per donation, so the 56-day rule never rejects one
+        db.session.execute(insert(User), [
+            {'username': f'donor{i}', 'email': f'donor{i}@bloodbank.com', 'password_hash': '!',
+             'role': 'donor', 'full_name': f'Donor {i}', 'blood_group': BLOOD_GROUP}
+            for i in range(workers * ops)
+        ])
+        db.session.execute(insert(BloodRequest), [
+            {'patient_id': patient_id, 'blood_group': BLOOD_GROUP, 'units_required': 1,
+             'request_date': date.today(), 'status': 'pending'}
+            for _ in range(workers * ops)
+        ])
+        db.session.commit()
+        # Past donations for the export to stream (not part of the stock ledger)
+        first_donor = db.session.query(User.id).filter_by(role='donor').order_by(User.id).first()[0]
+        for start in range(0, history, 50000):
+            db.session.execute(insert(Donation), [
+                {'donor_id': first_donor + i % (workers * ops), 'blood_group': BLOOD_GROUP, 'units_donated': 1,
+                 'donation_date': date.today() - timedelta(days=60 + i % 3000), 'status': 'completed'}
+                for i in range(start, min(start + 50000, history))
+            ])
+        db.session.commit()
+        donor_ids = [user_id for (user_id,) in db.session.query(User.id).filter_by(role='donor').order_by(User.id)]
+        request_ids = [request_id for (request_id,) in db.session.query(BloodRequest.id).order_by(BloodRequest.id)]
+        # Forked workers must open their own connections
+        db.engine.dispose()
+    return admin_id, donor_ids, request_ids
+
+
+def run_worker(args):
+    profile, admin_id, donor_ids, request_ids = args
+    from engine_profiles import pool_stats
+
+    app = make_app(profile)
+    admin = app.test_client()
+    donor = app.test_client()
+    with admin.session_transaction() as sess:
+        sess['user_id'] = admin_id
+        sess['user_role'] = 'admin'
+
+    ok = failed = reads = 0
+    for donor_id, request_id in zip(donor_ids, request_ids):
+        with donor.session_transaction() as sess:
+            sess['user_id'] = donor_id
+            sess['user_role'] = 'donor'
+        for response in (donor.post('/donor/donate', data={'hemoglobin': '13.5'}),
+                         admin.post(f'/admin/requests/{request_id}/approve')):
+            if response.status_code == 302:
+                ok += 1
+            else:
+                failed += 1
+        reads += admin.get('/admin/dashboard').status_code == 200
+    with app.app_context():
+        stats = pool_stats()['default']
+    return ok, failed, reads, stats['checkouts'], stats['wait_total_ms'], stats['wait_max_ms']
+
+
+def run_reader(profile, admin_id, stop, exports):
+    app = make_app(profile)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+        sess['user_role'] = 'admin'
+    while not stop.is_set():
+        # Reading the body drains the stream, holding the read open meanwhile
+        if client.get('/admin/export/donations.csv').get_data():
+            with exports.get_lock():
+                exports.value += 1
+
+
+def run_profile(profile, workers, ops, history):
+    from sqlalchemy import func
+
+    from extensions import db
+    from models import BloodInventory, BloodRequest, Donation, InventoryMovement
+
+    admin_id, donor_ids, request_ids = setup_database(profile, workers, ops, history)
+    batches = [(profile, admin_id, donor_ids[i::workers], request_ids[i::workers]) for i in range(workers)]
+
+    stop, exports = Event(), Value('i', 0)
+    reader = Process(target=run_reader, args=(profile, admin_id, stop, exports))
+    reader.start()
+    started = time.perf_counter()
+    with Pool(workers) as pool:
+        results = pool.map(run_worker, batches)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    reader.join()
+
+    ok, failed, reads = (sum(result[i] for result in results) for i in range(3))
+    checkouts = sum(result[3] for result in results)
+    wait_total = sum(result[4] for result in results)
+    wait_max = max(result[5] for result in results)
+
+    app = make_app(profile)
+    with app.app_context():
+        donations = db.session.query(func.count(Donation.id)).scalar() - history
+        approved = BloodRequest.query.filter_by(status='approved').count()
+        stock = BloodInventory.query.filter_by(blood_group=BLOOD_GROUP).one().units_available
+        ledger = db.session.query(func.sum(InventoryMovement.change)).scalar() or 0
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+    consistent = stock == ledger == donations - approved and stock >= 0
+
+    print(f"Profile:            {profile} (journal_mode={journal_mode})")
+    print(f"Writes:             {ok} ok, {failed} failed in {elapsed:.2f}s ({ok / elapsed:.1f} writes/sec)")
+    print(f"Reads:              {reads} dashboards, {exports.value} full donation exports")
+    print(f"Pool:               {checkouts} checkouts, avg wait {wait_total / max(checkouts, 1):.2f}ms, "
+          f"max wait {wait_max:.1f}ms")
+    print(f"Consistency:        {'OK' if consistent else 'LOST UPDATES DETECTED'} "
+          f"(donations {donations}, approved {approved}, stock {stock})")
+    print()
+    return ok / elapsed, failed, consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=300, help='donations and approvals per worker')
+    parser.add_argument('--history', type=int, default=50000, help='past donations the export streams')
+    parser.add_argument('--profiles', nargs='+', default=['basic', 'auto'])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='write_bench_')
+    results = {}
+    for profile in args.profiles:
+        # A fresh file per profile: WAL mode persists in the database file
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, profile + ".db")}'
+        results[profile] = run_profile(profile, args.workers, args.ops, args.history)
+
+    if 'basic' in results and 'auto' in results:
+        print(f"Tuned vs basic:     {results['auto'][0] / results['basic'][0]:.2f}x write throughput, "
+              f"failed requests {results['basic'][1]} -> {results['auto'][1]}")
+    return 0 if all(consistent for _, _, consistent in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# broker.py
+"""
+Live-update events for Server-Sent Events.
+
+Writers call ``publish()`` (usually through ``inventory_changed()`` or
+``requests_changed()``) inside their transaction. The events are written to
+the ``live_event`` outbox just before commit, so an event exists exactly
+when the change it describes does, in every worker.
+
+Each worker process runs one ``Broker`` thread that polls the outbox by
+primary key every ``EVENT_POLL_INTERVAL`` seconds (at once after a commit in
+the same process) and fans new events out to its SSE subscribers' queues by
+channel: ``inventory`` for everyone, ``role:<role>`` and ``user:<id>``. The
+poll costs one indexed query per worker however many clients are connected.
+
+Ids are handed out at insert but become visible at commit, so on PostgreSQL
+a lower id can appear after a higher one has been read. The broker remembers
+the ids it skipped over and re-reads them for ``LATE_EVENT_WINDOW`` seconds;
+one that turns up is delivered late, without an SSE id so the client's
+``Last-Event-ID`` stays at the high-water mark.
+Inventory events carry the stock as of delivery, read from the
+version-checked inventory snapshot, so a burst of stock changes reaches
+clients as a single update.
+
+The outbox keeps ``EVENT_RETENTION`` seconds of events; a client that
+reconnects with ``Last-Event-ID`` is replayed what it missed.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from counters import get_counts, requests_key
+from extensions import db
+from inventory import invalidate_inventory_snapshot, inventory_snapshot, inventory_summary
+from models import LiveEvent
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_CHANNEL = 'inventory'
+
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_RETENTION = 300
+
+# Outbox rows read per poll or replay query
+POLL_BATCH_SIZE = 500
+# Undelivered events a slow client may have queued before it is disconnected
+# (it reconnects with Last-Event-ID and is replayed from the outbox)
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Seconds between deletes of events older than the retention window
+PRUNE_INTERVAL = 60
+# Seconds a skipped outbox id is re-read in case its transaction commits late
+LATE_EVENT_WINDOW = 10
+# Skipped ids tracked at once; beyond this the oldest are given up
+MAX_PENDING_IDS = 1000
+
+_next_prune = 0.0
+
+
+def role_channel(role):
+    return f'role:{role}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def channels_for(user_id, role):
+    return (INVENTORY_CHANNEL, role_channel(role), user_channel(user_id))
+
+
+def publish(channel, kind, payload=None):
+    """Queue an event on ``channel``; it is written, and delivered, only if the transaction commits."""
+    pending = db.session.info.setdefault('live_events', {})
+    key = (channel, kind, json.dumps(payload, sort_keys=True))
+    pending.setdefault(key, {'channel': channel, 'kind': kind, 'payload': payload})
+
+
+def inventory_changed():
+    # No payload: subscribers get the stock as of delivery
+    publish(INVENTORY_CHANNEL, 'inventory')
+
+
+def requests_changed(changes):
+    """Publish the new status of each ``(blood_request, status)`` to its patient and to admins.
+
+    ``blood_request`` is anything with ``id``, ``patient_id``, ``blood_group``,
+    ``units_required`` and ``urgency`` (a ``BloodRequest`` or a triage
+    ``PendingRequest``). Call after the status counters have been adjusted.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    pending_key = requests_key('pending')
+    pending_requests = get_counts(pending_key)[pending_key]
+    for blood_request, status in changes:
+        payload = {'id': blood_request.id, 'status': status, 'blood_group': blood_request.blood_group,
+                   'units_required': blood_request.units_required, 'urgency': blood_request.urgency}
+        publish(user_channel(blood_request.patient_id), 'request', payload)
+        publish(role_channel('admin'), 'request', dict(payload, pending_requests=pending_requests))
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_live_events(session):
+    global _next_prune
+    events = session.info.pop('live_events', None)
+    if not events:
+        return
+    session.execute(insert(LiveEvent), list(events.values()))
+    session.info['live_events_written'] = True
+    # Writers keep the outbox trimmed, whether or not anyone is listening
+    now = time.monotonic()
+    if now >= _next_prune:
+        _next_prune = now + PRUNE_INTERVAL
+        retention = current_app.config.get('EVENT_RETENTION', DEFAULT_RETENTION)
+        session.execute(delete(LiveEvent).where(
+            LiveEvent.created_at < datetime.utcnow() - timedelta(seconds=retention)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_broker(session):
+    if session.info.pop('live_events_written', False):
+        broker.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_live_events(session):
+    session.info.pop('live_events', None)
+    session.info.pop('live_events_written', None)
+
+
+class Message(NamedTuple):
+    id: int
+    kind: str
+    data: dict
+    # Committed after newer events were delivered; sent without an SSE id
+    late: bool = False
+
+    def to_sse(self):
+        event_id = f'id: {self.id}\n' if self.id is not None and not self.late else ''
+        return f'{event_id}event: {self.kind}\ndata: {json.dumps(self.data)}\n\n'
+
+
+def inventory_message():
+    """The current stock as an inventory message, re-checking the data version first."""
+    invalidate_inventory_snapshot()
+    return Message(None, 'inventory', inventory_summary(inventory_snapshot()))
+
+
+def latest_event_id():
+    return db.session.query(func.max(LiveEvent.id)).scalar() or 0
+
+
+def replay(channels, after_id):
+    """Yield the retained events on ``channels`` after ``after_id``, oldest first (inventory excluded)."""
+    while True:
+        rows = db.session.execute(
+            select(LiveEvent.id, LiveEvent.kind, LiveEvent.payload)
+            .where(LiveEvent.id > after_id, LiveEvent.channel.in_(channels), LiveEvent.kind != 'inventory')
+            .order_by(LiveEvent.id)
+            .limit(POLL_BATCH_SIZE)
+        ).all()
+        for row in rows:
+            yield Message(row.id, row.kind, row.payload or {})
+        if len(rows) < POLL_BATCH_SIZE:
+            return
+        after_id = rows[-1].id
+
+
+class Subscription:
+    def __init__(self, channels, last_id):
+        self.channels = frozenset(channels)
+        self.last_id = last_id
+        self.overflowed = False
+        self._queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._replayed = set()
+
+    def mark_replayed(self, message_id):
+        """Record an event the stream already sent from the outbox replay."""
+        self._replayed.add(message_id)
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """The next message not yet seen, or ``None`` after ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                message = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if message.id is None:
+                return message
+            # Replay and the broker can both hand over the same event
+            if message.id not in self._replayed and (message.late or message.id > self.last_id):
+                return message
+
+
+class Broker:
+    """Per-process fan-out of outbox events to SSE subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_id = None
+        # Outbox ids skipped over by the poll -> monotonic time to give up on them
+        self._pending_ids = {}
+
+    def subscribe(self, app, channels, last_id):
+        """Register a subscriber that has seen every event up to ``last_id``."""
+        subscription = Subscription(channels, last_id)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(app,),
+                                                name='live-event-broker', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self, app):
+        with app.app_context():
+            interval = app.config.get('EVENT_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+            while True:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+                try:
+                    self._poll()
+                except Exception:
+                    logger.exception('Polling live events failed')
+                finally:
+                    db.session.remove()
+
+    def _poll(self):
+        with self._lock:
+            subscriptions = set().union(*self._subscribers.values())
+        if not subscriptions:
+            # Nobody listening: pick up from the next subscriber's position
+            self._last_id = None
+            self._pending_ids.clear()
+            return
+        if self._last_id is None:
+            self._last_id = min(subscription.last_id for subscription in subscriptions)
+
+        now = time.monotonic()
+        for event_id, give_up_at in list(self._pending_ids.items()):
+            if give_up_at <= now:
+                del self._pending_ids[event_id]
+        condition = LiveEvent.id > self._last_id
+        if self._pending_ids:
+            condition = or_(condition, LiveEvent.id.in_(list(self._pending_ids)))
+        rows = db.session.execute(
+            select(LiveEvent.id, LiveEvent.channel, LiveEvent.kind, LiveEvent.payload)
+            .where(condition)
+            .order_by(LiveEvent.id)
+            .limit(POLL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        if len(rows) == POLL_BATCH_SIZE:
+            self._wakeup.set()
+
+        late_ids = set()
+        for row in rows:
+            if self._pending_ids.pop(row.id, None) is not None:
+                late_ids.add(row.id)
+            elif row.id > self._last_id:
+                self._skip_ids(range(self._last_id + 1, row.id), now + LATE_EVENT_WINDOW)
+                self._last_id = row.id
+
+        # Only the newest inventory event of a batch is sent, with the stock as of now
+        inventory_ids = [row.id for row in rows if row.kind == 'inventory']
+        for row in rows:
+            late = row.id in late_ids
+            if row.kind == 'inventory':
+                if row.id != inventory_ids[-1]:
+                    continue
+                message = inventory_message()._replace(id=row.id, late=late)
+            else:
+                message = Message(row.id, row.kind, row.payload or {}, late)
+            with self._lock:
+                targets = list(self._subscribers.get(row.channel, ()))
+            for subscription in targets:
+                subscription.put(message)
+
+    def _skip_ids(self, event_ids, give_up_at):
+        # Most gaps are rolled-back inserts and just expire; a huge jump keeps the newest ids
+        for event_id in event_ids[-MAX_PENDING_IDS:]:
+            self._pending_ids[event_id] = give_up_at
+        while len(self._pending_ids) > MAX_PENDING_IDS:
+            del self._pending_ids[next(iter(self._pending_ids))]
+
+
+broker = Broker()
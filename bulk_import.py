@@ -0,0 +1,526 @@
+# bulk_import.py
+"""
+Bulk import of users and donations from CSV or JSONL files.
+
+Records are streamed from the file and handled in chunks: each chunk is
+validated, checked for duplicates with one batched lookup per key, and
+written with a single multi-row INSERT per table. Password hashing, which
+dominates the cost of a user import, is spread across a process pool.
+Rows that fail validation or already exist are skipped and written, with
+their line number and the reason, to a CSV error file so the rest of the
+import carries on. Each chunk is committed on its own, so an interrupted
+import keeps the rows it had already written and can simply be re-run.
+
+Uploads from the admin page are saved to disk and imported on a background
+thread (``start_import``), one at a time per worker process and with
+``IMPORT_WEB_WORKERS`` hashing processes, so a large file neither outlives
+the request timeout nor takes every core from the web server. The job's
+progress is kept in a small JSON status file, so any worker can report it.
+"""
+
+import csv
+import json
+import os
+import time
+import uuid
+from collections import Counter as Tally, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import NamedTuple
+
+import click
+from flask import current_app
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from compatibility import BLOOD_GROUPS
+from counters import active_users_key, increment
+from eligibility import record_donor_totals
+from extensions import db
+from models import Donation, User
+from reports import record_donation_totals
+
+CHUNK_SIZE = 1000
+
+FORMATS = ('csv', 'jsonl')
+
+# Admin accounts are never created by an import
+IMPORT_ROLES = ('donor', 'patient')
+GENDERS = ('male', 'female', 'other')
+DONATION_STATUSES = ('completed', 'cancelled')
+
+# Password hashing processes for an upload, unless IMPORT_WEB_WORKERS is set
+DEFAULT_WEB_WORKERS = 2
+# A job still running after this many seconds is reported failed (e.g. the worker died)
+JOB_TIMEOUT = 6 * 3600
+
+STATUS_READY = 'ready'
+STATUS_RUNNING = 'running'
+STATUS_FAILED = 'failed'
+
+_executor = None
+
+
+class RowError(ValueError):
+    """A record that cannot be imported; the message goes to the error file."""
+
+
+class ImportJob(NamedTuple):
+    status: str
+    kind: str
+    result: object = None
+
+
+class ImportResult(NamedTuple):
+    kind: str
+    total: int
+    imported: int
+    duplicates: int
+    failed: int
+    elapsed: float
+    error_file: str
+
+    @property
+    def rows_per_second(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        text = (f'Imported {self.imported} of {self.total} {self.kind} '
+                f'({self.duplicates} duplicates, {self.failed} invalid) '
+                f'in {self.elapsed:.1f}s, {self.rows_per_second:.0f} rows/s')
+        if self.duplicates or self.failed:
+            text += f'; skipped rows written to {self.error_file}'
+        return text
+
+
+def format_for(filename, default='csv'):
+    """Guess the record format from a file name."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if extension == '.csv':
+        return 'csv'
+    return default
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, record, error)`` for each record in a text ``stream``.
+
+    Keys are normalised to lower_snake_case, so files written by the raw
+    exports ("Blood Group", "Date of Birth") can be imported back.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, _normalise(row), None
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, {'raw': line.rstrip('\n')}, f'invalid JSON: {exc}'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {'raw': line.rstrip('\n')}, 'expected a JSON object'
+            continue
+        yield line_number, _normalise(record), None
+
+
+def _normalise(record):
+    return {str(key).strip().lower().replace(' ', '_'): value
+            for key, value in record.items() if key is not None}
+
+
+def _text(record, *names, required=False, max_length=None):
+    for name in names:
+        value = record.get(name)
+        if value is not None and str(value).strip():
+            value = str(value).strip()
+            if max_length and len(value) > max_length:
+                raise RowError(f'{names[0]} longer than {max_length} characters')
+            return value
+    if required:
+        raise RowError(f'missing {names[0]}')
+    return None
+
+
+def _date(record, *names, required=False):
+    value = _text(record, *names, required=required)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        raise RowError(f'invalid {names[0]} {value!r} (expected YYYY-MM-DD)')
+
+
+def _number(record, cast, *names, default=None):
+    value = _text(record, *names)
+    if value is None:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise RowError(f'invalid {names[0]} {value!r}')
+
+
+def _choice(value, choices, name):
+    if value is not None and value not in choices:
+        raise RowError(f'invalid {name} {value!r}')
+    return value
+
+
+def validate_user(record):
+    """Return the ``user`` column values for ``record`` plus its plain ``password``."""
+    password = _text(record, 'password', required=True)
+    role = (_text(record, 'role') or 'donor').lower()
+    gender = _text(record, 'gender')
+    blood_group = _text(record, 'blood_group')
+    values = {
+        'username': _text(record, 'username', required=True, max_length=80),
+        'email': _text(record, 'email', required=True, max_length=120),
+        'role': _choice(role, IMPORT_ROLES, 'role'),
+        'full_name': _text(record, 'full_name', 'name', required=True, max_length=100),
+        'phone': _text(record, 'phone', max_length=20),
+        'address': _text(record, 'address'),
+        'blood_group': _choice(blood_group.upper() if blood_group else None, BLOOD_GROUPS, 'blood_group'),
+        'date_of_birth': _date(record, 'date_of_birth'),
+        'gender': _choice(gender.lower() if gender else None, GENDERS, 'gender'),
+    }
+    if '@' not in values['email']:
+        raise RowError(f"invalid email {values['email']!r}")
+    return values, password
+
+
+def validate_donation(record):
+    """Return the ``donation`` column values for ``record``, keyed by donor username."""
+    blood_group = _text(record, 'blood_group')
+    status = (_text(record, 'status') or 'completed').lower()
+    units = _number(record, int, 'units_donated', 'units', default=1)
+    if units < 1:
+        raise RowError(f'invalid units_donated {units}')
+    return {
+        'username': _text(record, 'username', 'donor_username', required=True),
+        'donation_date': _date(record, 'donation_date', 'date', required=True),
+        'units_donated': units,
+        'blood_group': _choice(blood_group.upper() if blood_group else None, BLOOD_GROUPS, 'blood_group'),
+        'status': _choice(status, DONATION_STATUSES, 'status'),
+        'hemoglobin_level': _number(record, float, 'hemoglobin_level', 'hemoglobin'),
+        'notes': _text(record, 'notes'),
+    }
+
+
+class ErrorLog:
+    """CSV file of skipped rows, created on the first one."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def write(self, line_number, reason, record):
+        if self._writer is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['line', 'error', 'record'])
+        # Never leave plain-text passwords lying around in the error file
+        if record.get('password'):
+            record = dict(record, password='***')
+        self._writer.writerow([line_number, reason, json.dumps(record, default=str)])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def error_dir():
+    path = current_app.config.get('IMPORT_ERROR_DIR') or os.path.join(current_app.instance_path, 'imports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def error_file_path(kind):
+    return os.path.join(error_dir(), f'{kind}-{datetime.now().strftime("%Y%m%d-%H%M%S-%f")}-errors.csv')
+
+
+@contextmanager
+def _password_hasher(workers):
+    """Yield a ``map``-like callable that hashes passwords on ``workers`` processes."""
+    if workers <= 1:
+        yield lambda passwords: [generate_password_hash(password) for password in passwords]
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def hash_all(passwords):
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(executor.map(generate_password_hash, passwords, chunksize=chunksize))
+        yield hash_all
+
+
+def _chunks(records, size=CHUNK_SIZE):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_chunk(model, rows, errors):
+    """Insert ``rows`` (``(line, record, values)``) in one statement.
+
+    If a concurrent writer took one of the keys in the meantime the chunk is
+    retried row by row so only the conflicting rows are dropped. Returns the
+    inserted rows.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model), [values for _, _, values in rows])
+        return rows
+    except IntegrityError:
+        inserted = []
+        for line_number, record, values in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(model), [values])
+                inserted.append((line_number, record, values))
+            except IntegrityError:
+                errors.write(line_number, 'duplicate (inserted concurrently)', record)
+        return inserted
+
+
+def import_users(stream, fmt='csv', error_path=None, workers=None):
+    """Import donor/patient accounts from ``stream``; see the module docstring."""
+    workers = workers or current_app.config.get('IMPORT_WORKERS') or os.cpu_count() or 1
+    errors = ErrorLog(error_path or error_file_path('users'))
+    seen_usernames, seen_emails = set(), set()
+    total = imported = duplicates = failed = 0
+    started = time.perf_counter()
+
+    try:
+        with _password_hasher(workers) as hash_passwords:
+            for chunk in _chunks(read_records(stream, fmt)):
+                total += len(chunk)
+                valid = []
+                for line_number, record, error in chunk:
+                    try:
+                        if error:
+                            raise RowError(error)
+                        valid.append((line_number, record, *validate_user(record)))
+                    except RowError as exc:
+                        failed += 1
+                        errors.write(line_number, str(exc), record)
+
+                usernames = {values['username'] for _, _, values, _ in valid}
+                emails = {values['email'] for _, _, values, _ in valid}
+                taken_usernames = set(db.session.scalars(select(User.username).where(User.username.in_(usernames))))
+                taken_emails = set(db.session.scalars(select(User.email).where(User.email.in_(emails))))
+
+                fresh = []
+                for line_number, record, values, password in valid:
+                    if values['username'] in taken_usernames or values['username'] in seen_usernames:
+                        reason = 'username already exists'
+                    elif values['email'] in taken_emails or values['email'] in seen_emails:
+                        reason = 'email already exists'
+                    else:
+                        seen_usernames.add(values['username'])
+                        seen_emails.add(values['email'])
+                        fresh.append((line_number, record, values, password))
+                        continue
+                    duplicates += 1
+                    errors.write(line_number, reason, record)
+
+                hashes = hash_passwords([password for _, _, _, password in fresh])
+                rows = [(line_number, record, dict(values, password_hash=password_hash))
+                        for (line_number, record, values, _), password_hash in zip(fresh, hashes)]
+                inserted = _insert_chunk(User, rows, errors)
+                duplicates += len(rows) - len(inserted)
+
+                for role, count in Tally(values['role'] for _, _, values in inserted).items():
+                    increment(active_users_key(role), count)
+                db.session.commit()
+                imported += len(inserted)
+    finally:
+        errors.close()
+
+    return ImportResult('users', total, imported, duplicates, failed,
+                        time.perf_counter() - started, errors.path)
+
+
+def import_donations(stream, fmt='csv', error_path=None):
+    """Import historical donations from ``stream``, matched to donors by username.
+
+    Imported donations are added to the report rollups and to each donor's
+    eligibility fields but not to the current stock: legacy units have long
+    been used or expired.
+    """
+    errors = ErrorLog(error_path or error_file_path('donations'))
+    seen = set()
+    total = imported = duplicates = failed = 0
+    started = time.perf_counter()
+
+    try:
+        for chunk in _chunks(read_records(stream, fmt)):
+            total += len(chunk)
+            valid = []
+            for line_number, record, error in chunk:
+                try:
+                    if error:
+                        raise RowError(error)
+                    valid.append((line_number, record, validate_donation(record)))
+                except RowError as exc:
+                    failed += 1
+                    errors.write(line_number, str(exc), record)
+
+            usernames = {values['username'] for _, _, values in valid}
+            donors = {
+                username: (donor_id, blood_group)
+                for username, donor_id, blood_group in db.session.execute(
+                    select(User.username, User.id, User.blood_group)
+                    .where(User.username.in_(usernames), User.role == 'donor'))
+            }
+            # A donor gives at most once a day, so (donor, date) identifies a donation
+            keys = {(donors[values['username']][0], values['donation_date'])
+                    for _, _, values in valid if values['username'] in donors}
+            existing = set(db.session.execute(
+                select(Donation.donor_id, Donation.donation_date)
+                .where(tuple_(Donation.donor_id, Donation.donation_date).in_(keys))
+            ).tuples()) if keys else set()
+
+            rows = []
+            for line_number, record, values in valid:
+                donor = donors.get(values.pop('username'))
+                if donor is None:
+                    failed += 1
+                    errors.write(line_number, 'unknown donor username', record)
+                    continue
+                donor_id, blood_group = donor
+                key = (donor_id, values['donation_date'])
+                if key in existing or key in seen:
+                    duplicates += 1
+                    errors.write(line_number, 'donation already recorded', record)
+                    continue
+                seen.add(key)
+                values.update(donor_id=donor_id, blood_group=values['blood_group'] or blood_group)
+                if not values['blood_group']:
+                    failed += 1
+                    errors.write(line_number, 'missing blood_group (donor has none on file)', record)
+                    continue
+                rows.append((line_number, record, values))
+
+            inserted = _insert_chunk(Donation, rows, errors)
+            duplicates += len(rows) - len(inserted)
+
+            totals = defaultdict(lambda: (0, 0))
+            donor_totals = {}
+            for _, _, values in inserted:
+                count, units = totals[values['donation_date'], values['blood_group']]
+                totals[values['donation_date'], values['blood_group']] = (count + 1, units + values['units_donated'])
+                count, units, latest = donor_totals.get(values['donor_id'], (0, 0, values['donation_date']))
+                donor_totals[values['donor_id']] = (count + 1, units + values['units_donated'],
+                                                    max(latest, values['donation_date']))
+            if totals:
+                record_donation_totals(totals)
+            record_donor_totals(donor_totals)
+            db.session.commit()
+            imported += len(inserted)
+    finally:
+        errors.close()
+
+    return ImportResult('donations', total, imported, duplicates, failed,
+                        time.perf_counter() - started, errors.path)
+
+
+IMPORTERS = {
+    'users': import_users,
+    'donations': import_donations,
+}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bulk-import')
+    return _executor
+
+
+def _status_path(job_id):
+    return os.path.join(error_dir(), f'{job_id}.json')
+
+
+def _write_status(job_id, status, kind, result=None):
+    path = _status_path(job_id)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'status': status, 'kind': kind, 'result': result._asdict() if result else None}, f)
+    os.replace(tmp_path, path)
+
+
+def start_import(kind, file_storage, fmt):
+    """Save an uploaded file and import it on a background thread; returns the job id."""
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    path = os.path.join(error_dir(), f'{job_id}.upload')
+    file_storage.save(path)
+    _write_status(job_id, STATUS_RUNNING, kind)
+    options = {'workers': app.config.get('IMPORT_WEB_WORKERS') or DEFAULT_WEB_WORKERS} if kind == 'users' else {}
+    _get_executor().submit(_run_import, app, job_id, kind, path, fmt, options)
+    return job_id
+
+
+def _run_import(app, job_id, kind, path, fmt, options):
+    with app.app_context():
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as stream:
+                result = IMPORTERS[kind](stream, fmt, **options)
+            _write_status(job_id, STATUS_READY, kind, result)
+        except Exception:
+            app.logger.exception('Bulk import %s failed', job_id)
+            db.session.rollback()
+            _write_status(job_id, STATUS_FAILED, kind)
+        finally:
+            db.session.remove()
+            os.remove(path)
+
+
+def import_status(job_id):
+    """The ``ImportJob`` for ``job_id``, or ``None`` if there is no such job."""
+    try:
+        uuid.UUID(hex=job_id)
+        path = _status_path(job_id)
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (ValueError, FileNotFoundError):
+        return None
+    if data['status'] == STATUS_RUNNING and time.time() - os.path.getmtime(path) > JOB_TIMEOUT:
+        return ImportJob(STATUS_FAILED, data['kind'])
+    return ImportJob(data['status'], data['kind'], ImportResult(**data['result']) if data['result'] else None)
+
+
+@click.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--errors', 'error_path', type=click.Path(dir_okay=False), help='Where to write skipped rows.')
+@click.option('--workers', type=int, help='Password hashing processes (default: CPU count).')
+def import_users_command(path, fmt, error_path, workers):
+    """Import donor/patient accounts from a CSV or JSONL file."""
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        result = import_users(stream, fmt or format_for(path), error_path, workers)
+    click.echo(result.summary())
+
+
+@click.command('import-donations')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--errors', 'error_path', type=click.Path(dir_okay=False), help='Where to write skipped rows.')
+def import_donations_command(path, fmt, error_path):
+    """Import historical donations (matched to donors by username) from a CSV or JSONL file."""
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        result = import_donations(stream, fmt or format_for(path), error_path)
+    click.echo(result.summary())
@@ -0,0 +1,186 @@
+# camps.py
+"""
+Appointment slots at donation camps.
+
+``generate_slots()`` (``flask --app main generate-camp-slots``) splits every
+upcoming camp without slots into ``CAMP_SLOT_MINUTES`` windows between its
+start and end time, each with room for ``CAMP_DONORS_PER_SLOT`` donors.
+
+When a drive opens, many donors book at once, so a booking never reads the
+free places and then writes. ``book_slot()`` takes a place with one
+conditional UPDATE (``booked < capacity``) that only one transaction at a
+time can apply to a slot row, and records the booking with an INSERT that
+the unique ``(donor_id, camp_id)`` index rejects for a second booking by the
+same donor. The camp's ``capacity``/``booked_count`` counters are adjusted
+last in the same transaction, so the camp row is locked only until commit.
+``recompute_camp_counters()`` rebuilds the counters from the bookings.
+"""
+
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import bindparam, delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import CampBooking, CampSlot, DonationCamp
+
+DEFAULT_SLOT_MINUTES = 15
+DEFAULT_DONORS_PER_SLOT = 4
+
+# book_slot() outcomes
+BOOKED = 'booked'
+SLOT_FULL = 'full'
+ALREADY_BOOKED = 'already_booked'
+
+
+def slot_times(camp, minutes):
+    """``[(starts_at, ends_at), ...]`` of the whole ``minutes`` windows in ``camp``'s opening hours."""
+    current = datetime.combine(camp.camp_date, camp.start_time)
+    closing = datetime.combine(camp.camp_date, camp.end_time)
+    step = timedelta(minutes=minutes)
+    times = []
+    while current + step <= closing:
+        times.append((current.time(), (current + step).time()))
+        current += step
+    return times
+
+
+def bookable(camp, today=None):
+    return bool(camp.is_active) and camp.camp_date >= (today or date.today())
+
+
+def generate_slots(today=None, slot_minutes=None, donors_per_slot=None):
+    """Create slots for active camps from ``today`` on that have none; returns ``(camps, slots)``."""
+    today = today or date.today()
+    slot_minutes = slot_minutes or current_app.config.get('CAMP_SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+    donors_per_slot = donors_per_slot or current_app.config.get('CAMP_DONORS_PER_SLOT', DEFAULT_DONORS_PER_SLOT)
+    camps = DonationCamp.query.filter(
+        DonationCamp.is_active == True,
+        DonationCamp.camp_date >= today,
+        ~exists().where(CampSlot.camp_id == DonationCamp.id),
+    ).all()
+
+    slots, capacities = [], []
+    for camp in camps:
+        times = slot_times(camp, slot_minutes)
+        slots.extend({'camp_id': camp.id, 'starts_at': starts_at, 'ends_at': ends_at,
+                      'capacity': donors_per_slot, 'booked': 0} for starts_at, ends_at in times)
+        capacities.append({'b_camp_id': camp.id, 'b_capacity': len(times) * donors_per_slot})
+    if slots:
+        db.session.execute(insert(CampSlot), slots)
+        db.session.execute(
+            update(DonationCamp.__table__)
+            .where(DonationCamp.__table__.c.id == bindparam('b_camp_id'))
+            .values(capacity=bindparam('b_capacity'), booked_count=0,
+                    updated_at=DonationCamp.__table__.c.updated_at),
+            capacities,
+        )
+    db.session.commit()
+    return len(camps), len(slots)
+
+
+def book_slot(donor_id, camp_id, slot_id):
+    """Book ``slot_id`` at ``camp_id`` for a donor; returns ``BOOKED``, ``SLOT_FULL`` or ``ALREADY_BOOKED``.
+
+    Anything but ``BOOKED`` changes nothing. The caller commits.
+    """
+    savepoint = db.session.begin_nested()
+    taken = db.session.execute(
+        update(CampSlot)
+        .where(CampSlot.id == slot_id, CampSlot.camp_id == camp_id, CampSlot.booked < CampSlot.capacity)
+        .values(booked=CampSlot.booked + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not taken:
+        savepoint.rollback()
+        return SLOT_FULL
+    try:
+        db.session.execute(insert(CampBooking).values(camp_id=camp_id, slot_id=slot_id, donor_id=donor_id))
+    except IntegrityError:
+        savepoint.rollback()
+        return ALREADY_BOOKED
+    _adjust_camp(camp_id, 1)
+    savepoint.commit()
+    return BOOKED
+
+
+def cancel_booking(donor_id, booking_id):
+    """Cancel a donor's own booking and free its place; returns False (changing nothing) if there is none.
+
+    Locks are taken in the same order as ``book_slot()`` (slot, booking, camp).
+    """
+    booking = db.session.execute(
+        select(CampBooking.camp_id, CampBooking.slot_id)
+        .where(CampBooking.id == booking_id, CampBooking.donor_id == donor_id)
+    ).first()
+    if booking is None:
+        return False
+    savepoint = db.session.begin_nested()
+    db.session.execute(
+        update(CampSlot)
+        .where(CampSlot.id == booking.slot_id, CampSlot.booked > 0)
+        .values(booked=CampSlot.booked - 1)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = db.session.execute(
+        delete(CampBooking)
+        .where(CampBooking.id == booking_id, CampBooking.donor_id == donor_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not deleted:
+        # Cancelled concurrently
+        savepoint.rollback()
+        return False
+    _adjust_camp(booking.camp_id, -1)
+    savepoint.commit()
+    return True
+
+
+def _adjust_camp(camp_id, delta):
+    # Booking counters are not part of the camp's details: keep updated_at (the camps API validator)
+    db.session.execute(
+        update(DonationCamp)
+        .where(DonationCamp.id == camp_id)
+        .values(booked_count=DonationCamp.booked_count + delta, updated_at=DonationCamp.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recompute_camp_counters():
+    """Rebuild slot and camp booking counters from the camp_booking table; returns the camps updated."""
+    per_slot = Counter(dict(db.session.query(CampBooking.slot_id, func.count(CampBooking.id))
+                            .group_by(CampBooking.slot_id)))
+    per_camp, capacity = Counter(), Counter()
+    slots = db.session.query(CampSlot.id, CampSlot.camp_id, CampSlot.capacity).all()
+    for slot_id, camp_id, slot_capacity in slots:
+        per_camp[camp_id] += per_slot[slot_id]
+        capacity[camp_id] += slot_capacity
+
+    if slots:
+        slot_table = CampSlot.__table__
+        db.session.execute(
+            update(slot_table).where(slot_table.c.id == bindparam('b_slot_id')).values(booked=bindparam('b_booked')),
+            [{'b_slot_id': slot_id, 'b_booked': per_slot[slot_id]} for slot_id, _, _ in slots],
+        )
+    db.session.execute(update(DonationCamp).values(capacity=0, booked_count=0, updated_at=DonationCamp.updated_at))
+    if capacity:
+        camp_table = DonationCamp.__table__
+        db.session.execute(
+            update(camp_table).where(camp_table.c.id == bindparam('b_camp_id'))
+            .values(capacity=bindparam('b_capacity'), booked_count=bindparam('b_booked'),
+                    updated_at=camp_table.c.updated_at),
+            [{'b_camp_id': camp_id, 'b_capacity': capacity[camp_id], 'b_booked': per_camp[camp_id]}
+             for camp_id in capacity],
+        )
+    db.session.commit()
+    return len(capacity)
+
+
+@click.command('generate-camp-slots')
+def generate_camp_slots_command():
+    """Create appointment slots for upcoming camps that have none."""
+    camps, slots = generate_slots()
+    click.echo(f'Created {slots} slots for {camps} camps')
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Query plan regression check for Blood Bank Management System
+Requests every GET page as admin, donor and patient, runs EXPLAIN QUERY PLAN
+for each SELECT it issued and exits non-zero if any of them falls back to a
+full table scan. Run against a populated SQLite database (see init_db.py).
+"""
+
+import sys
+from sqlalchemy import event
+from app import create_app, db
+from models import User
+
+# Tables small enough that a full scan is the right plan
+SMALL_TABLES = {'blood_inventory'}
+
+ROLES = ('admin', 'donor', 'patient')
+
+
+def capture_statements(client, urls):
+    """Return the distinct (statement, parameters) pairs issued while fetching ``urls``."""
+    captured = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.setdefault(statement, parameters)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for url in urls:
+            response = client.get(url)
+            if response.status_code >= 400:
+                print(f"  {url}: HTTP {response.status_code}")
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return captured
+
+
+def full_scans(statement, parameters):
+    plan = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        words = detail.split()
+        # "SCAN user" is a full scan; "SCAN user USING INDEX ..." walks an index in order
+        if words[0] == 'SCAN' and 'USING' not in words and words[1] not in SMALL_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans():
+    """Return the number of queries that fall back to a full table scan"""
+    failures = 0
+    app = create_app()
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print("Query plan checks only support SQLite databases")
+            return 1
+
+        for role in ROLES:
+            user = User.query.filter_by(role=role, is_active=True).first()
+            if not user:
+                print(f"No active {role} user found - run init_db.py first")
+                return 1
+
+            urls = [
+                rule.rule for rule in app.url_map.iter_rules()
+                if rule.endpoint.startswith((f'{role}.', 'api.')) and 'GET' in rule.methods and not rule.arguments
+            ]
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user.id
+                sess['user_role'] = role
+
+            print(f"Checking {len(urls)} {role} pages...")
+            for statement, parameters in capture_statements(client, urls).items():
+                scans = full_scans(statement, parameters)
+                if scans:
+                    failures += 1
+                    print(f"  FULL SCAN ({', '.join(scans)}): {' '.join(statement.split())[:160]}")
+
+    print(f"{failures} queries with full table scans")
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if check_query_plans() else 0)
@@ -0,0 +1,116 @@
+# compatibility.py
+"""
+ABO/Rh red-cell compatibility as precomputed bitmasks.
+
+Each blood group is one bit. ``DONOR_MASK[recipient]`` has a bit set for
+every group the recipient can receive and ``RECIPIENT_MASK[donor]`` for every
+group the donor can give to; both tables are derived once from the antigens
+each group carries (a donor is compatible when it carries no antigen the
+recipient lacks), so a compatibility check is a single AND.
+
+``plan_allocation`` picks the groups to draw a request from: the exact group
+first, then compatible groups ordered by how few recipients they can serve,
+so the universal O- stock is only touched when nothing else can cover the
+request.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+
+UNIVERSAL_DONOR = 'O-'
+
+BIT = {group: 1 << index for index, group in enumerate(BLOOD_GROUPS)}
+
+
+def _antigens(group):
+    abo, rh = group[:-1], group[-1]
+    return set(abo.replace('O', '')) | ({'D'} if rh == '+' else set())
+
+
+def _build_masks():
+    antigens = {group: _antigens(group) for group in BLOOD_GROUPS}
+    donor_mask = {recipient: 0 for recipient in BLOOD_GROUPS}
+    recipient_mask = {donor: 0 for donor in BLOOD_GROUPS}
+    for donor in BLOOD_GROUPS:
+        for recipient in BLOOD_GROUPS:
+            if antigens[donor] <= antigens[recipient]:
+                donor_mask[recipient] |= BIT[donor]
+                recipient_mask[donor] |= BIT[recipient]
+    return donor_mask, recipient_mask
+
+
+DONOR_MASK, RECIPIENT_MASK = _build_masks()
+
+
+def groups_in(mask):
+    return tuple(group for group in BLOOD_GROUPS if mask & BIT[group])
+
+
+def can_receive(recipient, donor):
+    return bool(DONOR_MASK.get(recipient, 0) & BIT.get(donor, 0))
+
+
+def _preference(recipient):
+    """Compatible donor groups for ``recipient``, in the order stock should be drawn."""
+    return tuple(sorted(
+        groups_in(DONOR_MASK[recipient]),
+        # Exact match, then least versatile, then Rh-positive (Rh-negative stock is scarcer)
+        key=lambda donor: (donor != recipient, bin(RECIPIENT_MASK[donor]).count('1'), donor.endswith('-'))
+    ))
+
+
+ALLOCATION_ORDER = {recipient: _preference(recipient) for recipient in BLOOD_GROUPS}
+
+
+def compatible_donors(recipient):
+    return ALLOCATION_ORDER.get(recipient, ())
+
+
+def plan_allocation(recipient, units, stock, reserve=0):
+    """Return ``[(blood_group, units), ...]`` covering ``units`` for ``recipient``, or ``None``.
+
+    ``stock`` maps blood group to units available. ``reserve`` units of O- are
+    held back unless the recipient is O- (who can receive nothing else).
+    """
+    plan = []
+    remaining = units
+    for donor in compatible_donors(recipient):
+        available = stock.get(donor) or 0
+        if donor == UNIVERSAL_DONOR and recipient != UNIVERSAL_DONOR:
+            available -= reserve
+        take = min(available, remaining)
+        if take > 0:
+            plan.append((donor, take))
+            remaining -= take
+        if not remaining:
+            return plan
+    return None
+
+
+class Availability(NamedTuple):
+    blood_group: str
+    units: int
+    compatible_units: int
+
+
+@lru_cache(maxsize=4)
+def availability_matrix(inventory):
+    """Per recipient group, units in stock of that group and of every compatible group.
+
+    ``inventory`` is an ``inventory_snapshot()`` tuple; it is walked once,
+    each item adding its units to every recipient its group can serve.
+    """
+    exact = dict.fromkeys(BLOOD_GROUPS, 0)
+    compatible = dict.fromkeys(BLOOD_GROUPS, 0)
+    for item in inventory:
+        units = item.units_available or 0
+        if item.blood_group not in BIT:
+            continue
+        exact[item.blood_group] += units
+        mask = RECIPIENT_MASK[item.blood_group]
+        for recipient in BLOOD_GROUPS:
+            if mask & BIT[recipient]:
+                compatible[recipient] += units
+    return tuple(Availability(group, exact[group], compatible[group]) for group in BLOOD_GROUPS)
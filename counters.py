@@ -0,0 +1,98 @@
+# counters.py
+"""
+Incrementally maintained dashboard counters.
+
+Counts that dashboards show on every load (active users per role, requests
+per status, each patient's requests per status) are stored in the
+``counter`` table and adjusted in the same transaction as the writes they
+count, so reading them is a primary-key lookup instead of a COUNT(*).
+``recompute_counters()`` rebuilds them from the source tables.
+"""
+
+import click
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import BloodRequest, Counter, User
+
+
+def active_users_key(role):
+    return f'users:{role}:active'
+
+
+def requests_key(status, patient_id=None):
+    if patient_id is None:
+        return f'requests:{status}'
+    return f'requests:patient:{patient_id}:{status}'
+
+
+def increment(name, delta=1):
+    """Add ``delta`` to counter ``name`` in the current transaction."""
+    updated = db.session.execute(
+        update(Counter)
+        .where(Counter.name == name)
+        .values(value=Counter.value + delta)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(Counter(name=name, value=delta))
+        except IntegrityError:
+            increment(name, delta)
+
+
+def get_counts(*names):
+    """Return ``{name: value}`` for ``names``, with 0 for counters that do not exist yet."""
+    rows = db.session.query(Counter.name, Counter.value).filter(Counter.name.in_(names)).all()
+    counts = dict.fromkeys(names, 0)
+    counts.update(rows)
+    return counts
+
+
+def user_created(user):
+    if user.is_active is not False:
+        increment(active_users_key(user.role))
+
+
+def request_created(blood_request):
+    status = blood_request.status or 'pending'
+    increment(requests_key(status))
+    increment(requests_key(status, blood_request.patient_id))
+    increment(requests_key('total', blood_request.patient_id))
+
+
+def request_status_changed(patient_id, old_status, new_status):
+    for patient in (None, patient_id):
+        increment(requests_key(old_status, patient), -1)
+        increment(requests_key(new_status, patient))
+
+
+def recompute_counters():
+    """Rebuild every counter from the user and blood_request tables."""
+    counts = {}
+    for role, count in db.session.query(User.role, func.count(User.id)) \
+            .filter(User.is_active == True).group_by(User.role):
+        counts[active_users_key(role)] = count
+    for status, count in db.session.query(BloodRequest.status, func.count(BloodRequest.id)) \
+            .group_by(BloodRequest.status):
+        counts[requests_key(status)] = count
+    for patient_id, status, count in db.session.query(
+            BloodRequest.patient_id, BloodRequest.status, func.count(BloodRequest.id)) \
+            .group_by(BloodRequest.patient_id, BloodRequest.status):
+        counts[requests_key(status, patient_id)] = count
+        total_key = requests_key('total', patient_id)
+        counts[total_key] = counts.get(total_key, 0) + count
+
+    db.session.query(Counter).delete()
+    db.session.bulk_insert_mappings(Counter, [{'name': name, 'value': value} for name, value in counts.items()])
+    db.session.commit()
+    return len(counts)
+
+
+@click.command('repair-counters')
+def repair_counters_command():
+    """Recompute dashboard counters and camp booking counters from scratch."""
+    from camps import recompute_camp_counters
+    click.echo(f'Rebuilt {recompute_counters()} counters and the booking counts of {recompute_camp_counters()} camps')
@@ -19,13 +19,18 @@ CREATE TABLE IF NOT EXISTS user (
     date_of_birth DATE,
     gender VARCHAR(10),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    is_active BOOLEAN DEFAULT TRUE
+    is_active BOOLEAN DEFAULT TRUE,
+    -- Denormalized from the donor's donations (see eligibility.py)
+    last_donation_date DATE,
+    next_eligible_date DATE,
+    donation_count INTEGER DEFAULT 0,
+    lifetime_units INTEGER DEFAULT 0
 );
 
 -- Blood inventory table
 CREATE TABLE IF NOT EXISTS blood_inventory (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    blood_group VARCHAR(5) NOT NULL,
+    blood_group VARCHAR(5) UNIQUE NOT NULL,
     units_available INTEGER DEFAULT 0,
     last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
 );
@@ -59,10 +64,80 @@ CREATE TABLE IF NOT EXISTS blood_request (
     approved_date DATETIME,
     notes TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    priority INTEGER, -- triage rank from urgency: 0 urgent, 1 normal, 2 low
+    deadline DATE, -- required_by, or request_date + 1/7/14 days by urgency
     FOREIGN KEY (patient_id) REFERENCES user(id),
     FOREIGN KEY (approved_by) REFERENCES user(id)
 );
 
+-- Individual blood bags; blood_inventory.units_available counts the available ones per group
+CREATE TABLE IF NOT EXISTS blood_unit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    blood_group VARCHAR(5) NOT NULL,
+    donation_id INTEGER, -- NULL for stock added by adjustment
+    collection_date DATE NOT NULL,
+    expiry_date DATE NOT NULL, -- collection_date + 42 days
+    status VARCHAR(20) NOT NULL DEFAULT 'available', -- 'available', 'issued', 'expired', 'discarded'
+    request_id INTEGER, -- set when issued
+    status_changed_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (donation_id) REFERENCES donation(id),
+    FOREIGN KEY (request_id) REFERENCES blood_request(id)
+);
+
+-- Append-only ledger of inventory changes
+CREATE TABLE IF NOT EXISTS inventory_movement (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    blood_group VARCHAR(5) NOT NULL,
+    change INTEGER NOT NULL, -- positive = stock in, negative = stock out
+    reason VARCHAR(20) NOT NULL, -- 'donation', 'approval', 'adjustment', 'expiry'
+    donation_id INTEGER,
+    request_id INTEGER,
+    user_id INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (donation_id) REFERENCES donation(id),
+    FOREIGN KEY (request_id) REFERENCES blood_request(id),
+    FOREIGN KEY (user_id) REFERENCES user(id)
+);
+
+-- Per-dataset version counters used to invalidate in-process caches
+CREATE TABLE IF NOT EXISTS data_version (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Live-update events for Server-Sent Events, kept for a few minutes so reconnecting clients can catch up
+CREATE TABLE IF NOT EXISTS live_event (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel VARCHAR(50) NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    payload JSON,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Dashboard counters (active users by role, requests by status, per-patient request counts)
+CREATE TABLE IF NOT EXISTS counter (
+    name VARCHAR(100) PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+-- Daily per-blood-group rollups backing the date-range reports
+CREATE TABLE IF NOT EXISTS daily_donation_rollup (
+    day DATE NOT NULL,
+    blood_group VARCHAR(5) NOT NULL,
+    donations INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, blood_group)
+);
+
+CREATE TABLE IF NOT EXISTS daily_request_rollup (
+    day DATE NOT NULL,
+    blood_group VARCHAR(5) NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, blood_group)
+);
+
 -- Donation camp table
 CREATE TABLE IF NOT EXISTS donation_camp (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -75,19 +150,63 @@ CREATE TABLE IF NOT EXISTS donation_camp (
     contact_phone VARCHAR(20),
     description TEXT,
     is_active BOOLEAN DEFAULT TRUE,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    capacity INTEGER NOT NULL DEFAULT 0,
+    booked_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Appointment slots at camps (created by `flask --app main generate-camp-slots`)
+CREATE TABLE IF NOT EXISTS camp_slot (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    camp_id INTEGER NOT NULL,
+    starts_at TIME NOT NULL,
+    ends_at TIME NOT NULL,
+    capacity INTEGER NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (camp_id) REFERENCES donation_camp(id)
 );
 
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_user_role ON user(role);
+-- Donor appointments, at most one per donor per camp
+CREATE TABLE IF NOT EXISTS camp_booking (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    camp_id INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL,
+    donor_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (camp_id) REFERENCES donation_camp(id),
+    FOREIGN KEY (slot_id) REFERENCES camp_slot(id),
+    FOREIGN KEY (donor_id) REFERENCES user(id)
+);
+
+-- Create indexes for better performance (mirrors __table_args__ in models.py)
+CREATE INDEX IF NOT EXISTS idx_user_role_active ON user(role, is_active);
+CREATE INDEX IF NOT EXISTS idx_user_role_created ON user(role, created_at);
 CREATE INDEX IF NOT EXISTS idx_user_blood_group ON user(blood_group);
-CREATE INDEX IF NOT EXISTS idx_donation_donor_id ON donation(donor_id);
+CREATE INDEX IF NOT EXISTS idx_user_donor_eligibility ON user(role, is_active, blood_group, next_eligible_date, id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_blood_inventory_group ON blood_inventory(blood_group);
+CREATE INDEX IF NOT EXISTS idx_blood_unit_allocation ON blood_unit(blood_group, status, expiry_date, id);
+CREATE INDEX IF NOT EXISTS idx_inventory_movement_group_created ON inventory_movement(blood_group, created_at);
+CREATE INDEX IF NOT EXISTS idx_donation_donor_date ON donation(donor_id, donation_date);
 CREATE INDEX IF NOT EXISTS idx_donation_date ON donation(donation_date);
-CREATE INDEX IF NOT EXISTS idx_blood_request_patient_id ON blood_request(patient_id);
+CREATE INDEX IF NOT EXISTS idx_donation_created ON donation(created_at);
+CREATE INDEX IF NOT EXISTS idx_blood_request_patient_created ON blood_request(patient_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_blood_request_status ON blood_request(status);
-CREATE INDEX IF NOT EXISTS idx_blood_request_urgency ON blood_request(urgency);
-CREATE INDEX IF NOT EXISTS idx_blood_inventory_group ON blood_inventory(blood_group);
+CREATE INDEX IF NOT EXISTS idx_blood_request_created ON blood_request(created_at);
+CREATE INDEX IF NOT EXISTS idx_blood_request_date ON blood_request(request_date);
+CREATE INDEX IF NOT EXISTS idx_blood_request_triage ON blood_request(status, priority, deadline, id);
+CREATE INDEX IF NOT EXISTS idx_donation_camp_active_date ON donation_camp(is_active, camp_date);
 CREATE INDEX IF NOT EXISTS idx_donation_camp_date ON donation_camp(camp_date);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_camp_slot_start ON camp_slot(camp_id, starts_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_camp_booking_donor_camp ON camp_booking(donor_id, camp_id);
+CREATE INDEX IF NOT EXISTS idx_live_event_created ON live_event(created_at);
+
+-- Full-text user search (SQLite FTS5, mirrors USER_SEARCH_DDL in models.py; PostgreSQL uses the GIN
+-- index idx_user_search on USER_SEARCH_VECTOR instead)
+CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(full_name, username, email, phone, address, role, content='user', content_rowid='id', prefix='1 2 3 4');
+CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON user BEGIN INSERT INTO user_search(rowid, full_name, username, email, phone, address, role) VALUES (new.id, new.full_name, new.username, new.email, new.phone, new.address, new.role); END;
+CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON user BEGIN INSERT INTO user_search(user_search, rowid, full_name, username, email, phone, address, role) VALUES ('delete', old.id, old.full_name, old.username, old.email, old.phone, old.address, old.role); END;
+CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF full_name, username, email, phone, address, role ON user BEGIN INSERT INTO user_search(user_search, rowid, full_name, username, email, phone, address, role) VALUES ('delete', old.id, old.full_name, old.username, old.email, old.phone, old.address, old.role); INSERT INTO user_search(rowid, full_name, username, email, phone, address, role) VALUES (new.id, new.full_name, new.username, new.email, new.phone, new.address, new.role); END;
 
 -- Insert sample data
 
@@ -96,12 +215,12 @@ INSERT INTO user (username, email, password_hash, role, full_name, phone, addres
 ('admin', 'admin@bloodbank.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'admin', 'System Administrator', '123-456-7890', 'Blood Bank Headquarters', 'O+', '1980-01-01', 'male');
 
 -- Insert sample donors
-INSERT INTO user (username, email, password_hash, role, full_name, phone, address, blood_group, date_of_birth, gender) VALUES
-('john_doe', 'john@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'John Doe', '555-0101', '123 Main St, City, State', 'O+', '1990-05-15', 'male'),
-('jane_smith', 'jane@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'Jane Smith', '555-0102', '456 Oak Ave, City, State', 'A+', '1985-08-22', 'female'),
-('mike_johnson', 'mike@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'Mike Johnson', '555-0103', '789 Pine Rd, City, State', 'B+', '1992-03-10', 'male'),
-('sarah_wilson', 'sarah@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'Sarah Wilson', '555-0104', '321 Elm St, City, State', 'AB+', '1988-11-30', 'female'),
-('david_brown', 'david@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'David Brown', '555-0105', '654 Maple Dr, City, State', 'O-', '1995-07-08', 'male');
+INSERT INTO user (username, email, password_hash, role, full_name, phone, address, blood_group, date_of_birth, gender, last_donation_date, next_eligible_date, donation_count, lifetime_units) VALUES
+('john_doe', 'john@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'John Doe', '555-0101', '123 Main St, City, State', 'O+', '1990-05-15', 'male', '2024-07-15', '2024-09-09', 2, 2),
+('jane_smith', 'jane@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'Jane Smith', '555-0102', '456 Oak Ave, City, State', 'A+', '1985-08-22', 'female', '2024-07-18', '2024-09-12', 2, 2),
+('mike_johnson', 'mike@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'Mike Johnson', '555-0103', '789 Pine Rd, City, State', 'B+', '1992-03-10', 'male', '2024-07-20', '2024-09-14', 2, 2),
+('sarah_wilson', 'sarah@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'Sarah Wilson', '555-0104', '321 Elm St, City, State', 'AB+', '1988-11-30', 'female', '2024-07-22', '2024-09-16', 2, 2),
+('david_brown', 'david@email.com', 'scrypt:32768:8:1$2b2LoQPSxz5aGRaT$46d1c78c1c52e1c8a9e8b9f0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d1e2f3a4b5c6d7e8f9a0b1c2d3e4f5a6b7c8d9e0f', 'donor', 'David Brown', '555-0105', '654 Maple Dr, City, State', 'O-', '1995-07-08', 'male', '2024-07-25', '2024-09-19', 2, 2);
 
 -- Insert sample patients
 INSERT INTO user (username, email, password_hash, role, full_name, phone, address, blood_group, date_of_birth, gender) VALUES
@@ -114,6 +233,12 @@ INSERT INTO blood_inventory (blood_group, units_available) VALUES
 ('A+', 25), ('A-', 15), ('B+', 20), ('B-', 12),
 ('AB+', 8), ('AB-', 5), ('O+', 30), ('O-', 18);
 
+-- One bag per unit of stock above, collected over the last five weeks
+INSERT INTO blood_unit (blood_group, collection_date, expiry_date)
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < 29)
+SELECT bi.blood_group, date('now', '-' || (n.i % 35) || ' days'), date('now', '-' || (n.i % 35) || ' days', '+42 days')
+FROM blood_inventory bi JOIN n ON n.i < bi.units_available;
+
 -- Insert sample donations
 INSERT INTO donation (donor_id, donation_date, units_donated, blood_group, hemoglobin_level, notes) VALUES
 (2, '2024-07-15', 1, 'O+', 13.2, 'Regular donation - good health'),
@@ -128,15 +253,15 @@ INSERT INTO donation (donor_id, donation_date, units_donated, blood_group, hemog
 (6, '2024-06-30', 1, 'O-', 13.6, 'Emergency response donor');
 
 -- Insert sample blood requests
-INSERT INTO blood_request (patient_id, blood_group, units_required, urgency, reason, request_date, required_by, status) VALUES
-(7, 'A+', 2, 'urgent', 'Surgery scheduled for heart procedure', '2024-08-15', '2024-08-18', 'pending'),
-(8, 'B+', 1, 'normal', 'Planned surgical procedure', '2024-08-14', '2024-08-20', 'approved'),
-(9, 'O+', 3, 'urgent', 'Emergency surgery after accident', '2024-08-13', '2024-08-16', 'pending'),
-(7, 'A+', 1, 'low', 'Routine blood transfusion', '2024-08-10', '2024-08-25', 'approved'),
-(8, 'B+', 2, 'normal', 'Cancer treatment support', '2024-08-12', '2024-08-22', 'pending'),
-(9, 'O+', 1, 'normal', 'Anemia treatment', '2024-08-11', '2024-08-20', 'rejected'),
-(7, 'A+', 2, 'urgent', 'Trauma case blood loss', '2024-08-09', '2024-08-12', 'approved'),
-(8, 'B+', 1, 'low', 'Elective surgery preparation', '2024-08-08', '2024-08-30', 'pending');
+INSERT INTO blood_request (patient_id, blood_group, units_required, urgency, reason, request_date, required_by, status, priority, deadline) VALUES
+(7, 'A+', 2, 'urgent', 'Surgery scheduled for heart procedure', '2024-08-15', '2024-08-18', 'pending', 0, '2024-08-18'),
+(8, 'B+', 1, 'normal', 'Planned surgical procedure', '2024-08-14', '2024-08-20', 'approved', 1, '2024-08-20'),
+(9, 'O+', 3, 'urgent', 'Emergency surgery after accident', '2024-08-13', '2024-08-16', 'pending', 0, '2024-08-16'),
+(7, 'A+', 1, 'low', 'Routine blood transfusion', '2024-08-10', '2024-08-25', 'approved', 2, '2024-08-25'),
+(8, 'B+', 2, 'normal', 'Cancer treatment support', '2024-08-12', '2024-08-22', 'pending', 1, '2024-08-22'),
+(9, 'O+', 1, 'normal', 'Anemia treatment', '2024-08-11', '2024-08-20', 'rejected', 1, '2024-08-20'),
+(7, 'A+', 2, 'urgent', 'Trauma case blood loss', '2024-08-09', '2024-08-12', 'approved', 0, '2024-08-12'),
+(8, 'B+', 1, 'low', 'Elective surgery preparation', '2024-08-08', '2024-08-30', 'pending', 2, '2024-08-30');
 
 -- Insert sample donation camps
 INSERT INTO donation_camp (name, location, camp_date, start_time, end_time, organizer, contact_phone, description) VALUES
@@ -233,7 +358,8 @@ SELECT
     start_time,
     end_time,
     organizer,
-    contact_phone
+    contact_phone,
+    capacity - booked_count as places_left
 FROM donation_camp
 WHERE camp_date >= date('now') AND is_active = 1
 ORDER BY camp_date ASC;
@@ -271,18 +397,15 @@ LEFT JOIN donation d ON u.id = d.donor_id
 WHERE u.role = 'donor' AND u.is_active = 1
 GROUP BY donor_category;
 
--- 9. Blood waste tracking (expired inventory)
--- Note: This would require an expiration_date field in blood_inventory
--- For now, showing theoretical query structure
-/*
+-- 9. Blood waste tracking (expired units in the last 90 days)
 SELECT 
     blood_group,
-    SUM(units_available) as expired_units,
-    COUNT(*) as expired_batches
-FROM blood_inventory 
-WHERE expiration_date < date('now')
+    COUNT(*) as expired_units,
+    MIN(expiry_date) as first_expired,
+    MAX(expiry_date) as last_expired
+FROM blood_unit 
+WHERE status = 'expired' AND expiry_date >= date('now', '-90 days')
 GROUP BY blood_group;
-*/
 
 -- 10. System usage statistics
 SELECT 
@@ -0,0 +1,163 @@
+# eligibility.py
+"""
+Denormalized donor eligibility.
+
+Every donor row carries ``last_donation_date``, ``next_eligible_date``,
+``donation_count`` and ``lifetime_units``, folded in as donations are
+written, so the 56-day rule is a column comparison rather than a search of
+the donor's donation history. ``idx_user_donor_eligibility`` covers
+``(role, is_active, blood_group, next_eligible_date, id)``; listing who can
+donate now is one ordered index range scan per blood group, merged in
+Python when compatible groups are included, and paged with a keyset cursor.
+"""
+
+import heapq
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import click
+from sqlalchemy import and_, bindparam, case, func, or_, select, update
+
+from compatibility import compatible_donors
+from extensions import db
+from models import DONATION_INTERVAL_DAYS, Donation, User
+from pagination import decode_cursor, encode_cursor
+
+# Donors per executemany UPDATE when rebuilding from the donation table
+RECOMPUTE_BATCH_SIZE = 10000
+
+
+def next_eligible(last_donation_date):
+    return last_donation_date + timedelta(days=DONATION_INTERVAL_DAYS)
+
+
+def _later(column, param):
+    return case((or_(column.is_(None), column < bindparam(param)), bindparam(param)), else_=column)
+
+
+def _fold_statement():
+    # Core table UPDATE: the ORM form would treat a parameter list as bulk-by-primary-key
+    users = User.__table__.c
+    return (
+        update(User.__table__)
+        .where(users.id == bindparam('b_donor_id'))
+        .values(donation_count=func.coalesce(users.donation_count, 0) + bindparam('b_count'),
+                lifetime_units=func.coalesce(users.lifetime_units, 0) + bindparam('b_units'),
+                last_donation_date=_later(users.last_donation_date, 'b_last'),
+                next_eligible_date=_later(users.next_eligible_date, 'b_next'))
+    )
+
+
+def claim_donation(donor_id, day, units):
+    """Fold a donation on ``day`` into the donor row if the donor is eligible then.
+
+    The eligibility check and the update are one conditional UPDATE, so two
+    concurrent donations by the same donor cannot both pass. Returns False,
+    changing nothing, if the donor is not yet eligible.
+    """
+    next_eligible_date = User.__table__.c.next_eligible_date
+    statement = _fold_statement().where(or_(next_eligible_date.is_(None), next_eligible_date <= day))
+    return db.session.execute(statement, {
+        'b_donor_id': donor_id, 'b_count': 1, 'b_units': units,
+        'b_last': day, 'b_next': next_eligible(day),
+    }).rowcount == 1
+
+
+def record_donor_totals(totals):
+    """Fold pre-aggregated ``{donor_id: (donations, units, latest_date)}`` into donor rows (bulk imports)."""
+    if totals:
+        db.session.execute(_fold_statement(), [
+            {'b_donor_id': donor_id, 'b_count': count, 'b_units': units,
+             'b_last': latest, 'b_next': next_eligible(latest)}
+            for donor_id, (count, units, latest) in totals.items()
+        ])
+
+
+def recompute_donor_stats():
+    """Rebuild every donor's eligibility fields from the donation table."""
+    db.session.execute(
+        update(User)
+        .where(User.role == 'donor')
+        .values(last_donation_date=None, donation_count=0, lifetime_units=0,
+                next_eligible_date=func.coalesce(func.date(User.created_at), func.current_date()))
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.session.execute(
+        select(Donation.donor_id, func.count(Donation.id),
+               func.coalesce(func.sum(Donation.units_donated), 0), func.max(Donation.donation_date))
+        .group_by(Donation.donor_id)
+    )
+    updated = 0
+    while batch := rows.fetchmany(RECOMPUTE_BATCH_SIZE):
+        # Executemany UPDATE keyed on primary key
+        db.session.execute(update(User), [
+            {'id': donor_id, 'donation_count': count, 'lifetime_units': units,
+             'last_donation_date': latest, 'next_eligible_date': next_eligible(latest)}
+            for donor_id, count, units, latest in batch
+        ])
+        updated += len(batch)
+    db.session.commit()
+    return updated
+
+
+class EligibleDonor(NamedTuple):
+    id: int
+    full_name: str
+    phone: str
+    email: str
+    blood_group: str
+    last_donation_date: date
+    next_eligible_date: date
+    donation_count: int
+    lifetime_units: int
+
+    def to_dict(self):
+        data = self._asdict()
+        for field in ('last_donation_date', 'next_eligible_date'):
+            data[field] = data[field].isoformat() if data[field] else None
+        return data
+
+
+def donor_groups(blood_group, include_compatible=False):
+    """Donor blood groups to recall for a ``blood_group`` recipient."""
+    return compatible_donors(blood_group) if include_compatible else (blood_group,)
+
+
+def eligible_donors(blood_groups, on=None, cursor=None, limit=100):
+    """Active donors of ``blood_groups`` eligible on ``on`` (default today), longest rested first.
+
+    Returns ``(donors, next_cursor)``. Each group is an index range scan
+    ordered by ``(next_eligible_date, id)`` and limited to one page, so the
+    cost depends on the page size, not on how many donors are eligible.
+    """
+    on = on or date.today()
+    position = decode_cursor(cursor, User.next_eligible_date) if cursor else None
+    columns = [getattr(User, field) for field in EligibleDonor._fields]
+
+    per_group = []
+    for blood_group in blood_groups:
+        query = (
+            select(*columns)
+            .where(User.role == 'donor', User.is_active == True, User.blood_group == blood_group,
+                   User.next_eligible_date <= on)
+            .order_by(User.next_eligible_date, User.id)
+            .limit(limit + 1)
+        )
+        if position:
+            key_value, row_id = position
+            query = query.where(or_(User.next_eligible_date > key_value,
+                                    and_(User.next_eligible_date == key_value, User.id > row_id)))
+        per_group.append([EligibleDonor(*row) for row in db.session.execute(query)])
+
+    merged = list(heapq.merge(*per_group, key=lambda donor: (donor.next_eligible_date, donor.id)))
+    donors = merged[:limit]
+    next_cursor = None
+    if len(merged) > limit:
+        next_cursor = encode_cursor(donors[-1].next_eligible_date, donors[-1].id)
+    return donors, next_cursor
+
+
+@click.command('backfill-donor-stats')
+def backfill_donor_stats_command():
+    """Rebuild donor eligibility and lifetime totals from donation history."""
+    click.echo(f'Updated {recompute_donor_stats()} donors with donations')
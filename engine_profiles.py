@@ -0,0 +1,159 @@
+# engine_profiles.py
+"""
+Backend-aware engine settings and connection pool metrics.
+
+``engine_options()`` picks ``SQLALCHEMY_ENGINE_OPTIONS`` from the database
+URI:
+
+* SQLite: every new connection is switched to WAL journaling (readers and
+  the single writer no longer block each other), ``synchronous=NORMAL``
+  (no fsync per commit in WAL mode), a ``busy_timeout`` so a writer waits
+  for the lock instead of failing with "database is locked", and a larger
+  page cache and memory map. ``init_engine_profiles()`` installs the pragmas.
+* PostgreSQL: a sized pool with bounded overflow and checkout wait,
+  pre-ping and recycle, and server-side statement, lock and
+  idle-in-transaction timeouts so one stuck request cannot pin a connection
+  or hold row locks indefinitely.
+* Anything else: pre-ping and recycle only.
+
+``DB_ENGINE_PROFILE=basic`` uses those generic options for every backend
+(the write-concurrency benchmark's baseline).
+
+Every engine pools through ``MeteredQueuePool``, which counts checkouts,
+time spent acquiring a connection, overflow use and timeouts in this
+process; ``pool_stats()`` reports them per engine.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from extensions import db
+
+PROFILE_AUTO = 'auto'
+PROFILE_BASIC = 'basic'
+
+# Options every backend gets; also the whole of the basic profile
+BASIC_OPTIONS = {'pool_recycle': 300, 'pool_pre_ping': True}
+
+
+class MeteredQueuePool(QueuePool):
+    """A ``QueuePool`` that records checkouts, acquisition time, overflow and timeouts."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._peak_checked_out = 0
+        self._peak_overflow = 0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._peak_checked_out = max(self._peak_checked_out, self.checkedout())
+            self._peak_overflow = max(self._peak_overflow, self.overflow())
+        return connection
+
+    def stats(self):
+        with self._metrics_lock:
+            return {
+                'pool_size': self.size(),
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': max(self.overflow(), 0),
+                'max_overflow': self._max_overflow,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'wait_total_ms': round(self._wait_total * 1000, 3),
+                'wait_avg_ms': round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+                'peak_checked_out': self._peak_checked_out,
+                'peak_overflow': max(self._peak_overflow, 0),
+            }
+
+
+def _is_file_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(config, uri=None):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``uri`` (default ``SQLALCHEMY_DATABASE_URI``) under ``DB_ENGINE_PROFILE``."""
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    options = dict(BASIC_OPTIONS)
+    if backend == 'sqlite' and not _is_file_sqlite(url):
+        # In-memory databases keep Flask-SQLAlchemy's StaticPool
+        return options
+    options['poolclass'] = MeteredQueuePool
+    if config.get('DB_ENGINE_PROFILE', PROFILE_AUTO) == PROFILE_BASIC:
+        return options
+
+    if backend == 'sqlite':
+        # One local file: nothing to pre-ping or recycle; the driver's lock wait matches busy_timeout
+        return {'poolclass': MeteredQueuePool,
+                'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    if backend == 'postgresql':
+        timeouts = ' '.join(f'-c {setting}={config[key]}' for setting, key in (
+            ('statement_timeout', 'DB_STATEMENT_TIMEOUT_MS'),
+            ('lock_timeout', 'DB_LOCK_TIMEOUT_MS'),
+            ('idle_in_transaction_session_timeout', 'DB_IDLE_IN_TRANSACTION_TIMEOUT_MS'),
+        ))
+        options.update(pool_size=config['DB_POOL_SIZE'],
+                       max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'],
+                       connect_args={'options': timeouts})
+    return options
+
+
+def sqlite_pragmas(config):
+    return (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+    )
+
+
+def _install_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def init_engine_profiles(app):
+    """Install per-connection settings on the app's engines (call after ``db.init_app``)."""
+    if app.config.get('DB_ENGINE_PROFILE', PROFILE_AUTO) == PROFILE_BASIC:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if _is_file_sqlite(engine.url):
+                _install_pragmas(engine, sqlite_pragmas(app.config))
+
+
+def pool_stats():
+    """``{bind: stats}`` for every metered engine of the current app."""
+    return {bind or 'default': engine.pool.stats() for bind, engine in db.engines.items()
+            if isinstance(engine.pool, MeteredQueuePool)}
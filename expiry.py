@@ -0,0 +1,100 @@
+# expiry.py
+"""
+Blood unit expiry.
+
+A bag can be stored ``SHELF_LIFE_DAYS`` after collection. Allocation never
+issues a lapsed bag, but until it is retired it is still counted in
+``BloodInventory.units_available``. ``expire_units()`` (``flask --app main
+expire-blood-units``, run daily from cron or a systemd timer) retires lapsed
+bags one blood group at a time in batches of ``EXPIRY_BATCH_SIZE``, each
+batch a short transaction of one indexed UPDATE plus the matching count
+change, so the sweep never holds the inventory rows for long. Live
+dashboards are told after every batch.
+
+``backfill_blood_units()`` creates bags for databases whose stock predates
+per-unit tracking.
+"""
+
+from datetime import date, datetime
+
+import click
+from sqlalchemy import func, insert, select
+
+from broker import inventory_changed
+from compatibility import BLOOD_GROUPS
+from extensions import db
+from inventory import retire_expired
+from models import UNIT_AVAILABLE, BloodInventory, BloodUnit, Donation, unit_expiry
+
+# Bags retired per UPDATE (and per transaction)
+EXPIRY_BATCH_SIZE = 1000
+
+
+def expire_units(today=None, batch_size=EXPIRY_BATCH_SIZE):
+    """Retire every available bag that expired before ``today``; returns ``{blood_group: bags}``."""
+    today = today or date.today()
+    groups = set(BLOOD_GROUPS) | {group for group, in db.session.query(BloodInventory.blood_group)}
+    retired = {}
+    for blood_group in sorted(groups):
+        while True:
+            count = retire_expired(blood_group, today, limit=batch_size)
+            if not count:
+                break
+            inventory_changed()
+            db.session.commit()
+            retired[blood_group] = retired.get(blood_group, 0) + count
+            if count < batch_size:
+                break
+    db.session.commit()
+    return retired
+
+
+def backfill_blood_units():
+    """Track stock counted in ``BloodInventory`` but not yet held as bags (databases from before bags).
+
+    Bags are issued earliest-expiry first, so the stock left is taken to be
+    each group's most recent donations (without bags of their own); any
+    remainder is dated from the group's ``last_updated``. Bags that turn out
+    to have lapsed are left for the expiry sweep. Returns the bags created.
+    """
+    tracked = dict(db.session.query(BloodUnit.blood_group, func.count(BloodUnit.id))
+                   .filter(BloodUnit.status == UNIT_AVAILABLE).group_by(BloodUnit.blood_group))
+    with_bags = select(BloodUnit.donation_id).where(BloodUnit.donation_id.isnot(None))
+    created = 0
+    for blood_group, counted, last_updated in db.session.query(
+            BloodInventory.blood_group, BloodInventory.units_available, BloodInventory.last_updated).all():
+        missing = (counted or 0) - tracked.get(blood_group, 0)
+        if missing <= 0:
+            continue
+        rows = []
+        donations = db.session.query(Donation.id, Donation.donation_date, Donation.units_donated).filter(
+            Donation.blood_group == blood_group, Donation.status == 'completed', Donation.id.notin_(with_bags)
+        ).order_by(Donation.donation_date.desc(), Donation.id.desc()).limit(missing)
+        for donation_id, donation_date, donated in donations:
+            take = min(donated or 1, missing - len(rows))
+            rows += [{'blood_group': blood_group, 'donation_id': donation_id,
+                      'collection_date': donation_date, 'expiry_date': unit_expiry(donation_date)}
+                     for _ in range(take)]
+        collected_on = (last_updated or datetime.utcnow()).date()
+        rows += [{'blood_group': blood_group, 'donation_id': None,
+                  'collection_date': collected_on, 'expiry_date': unit_expiry(collected_on)}
+                 for _ in range(missing - len(rows))]
+        db.session.execute(insert(BloodUnit), rows)
+        created += len(rows)
+    db.session.commit()
+    return created
+
+
+@click.command('expire-blood-units')
+def expire_blood_units_command():
+    """Retire blood units past their expiry date and take them out of stock."""
+    retired = expire_units()
+    detail = ', '.join(f'{count} x {group}' for group, count in retired.items())
+    click.echo(f'Retired {sum(retired.values())} expired blood units' + (f' ({detail})' if detail else ''))
+
+
+@click.command('backfill-blood-units')
+def backfill_blood_units_command():
+    """Create blood units for stock counted before per-unit tracking."""
+    click.echo(f'Created {backfill_blood_units()} blood units; '
+               'run expire-blood-units to retire any that have lapsed')
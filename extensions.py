@@ -2,8 +2,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
+from replicas import RoutingSession
+
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+# RoutingSession sends dashboard and report reads to the replica bind when one is configured
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
@@ -0,0 +1,36 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings and hooks for multi-process Prometheus metrics (see metrics.py).
+
+Loaded automatically when gunicorn starts from this directory. Workers are
+threaded: every open ``/events/stream`` holds a thread for up to
+``EVENT_STREAM_TIMEOUT`` seconds, which with sync workers would leave a few
+open tabs holding every worker. ``GUNICORN_THREADS`` sets threads per worker.
+
+With
+``PROMETHEUS_MULTIPROC_DIR`` set, the master clears the previous run's
+sample files before forking workers, and marks each exiting worker dead so
+its live gauges drop out of the scrape (its counters and histograms keep
+counting towards the totals).
+"""
+
+import glob
+import os
+
+from prometheus_client import multiprocess
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 50))
+
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
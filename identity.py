@@ -0,0 +1,111 @@
+# identity.py
+"""
+Request-scoped identity loading and role checks.
+
+``current_user()`` loads the logged-in user at most once per request and
+keeps it on ``g``. Templates that only need the name and role (the navbar)
+use ``current_user_snapshot()``, which is served from a short-TTL in-process
+cache and avoids the database round-trip entirely on a cache hit.
+"""
+
+import threading
+import time
+from functools import wraps
+from typing import NamedTuple
+
+from flask import flash, g, jsonify, redirect, session, url_for
+
+from extensions import db
+from models import User
+
+# Seconds a cached user snapshot stays valid; profile edits invalidate it early
+SNAPSHOT_TTL = 30
+# Snapshots kept per process at most (oldest dropped first)
+MAX_SNAPSHOTS = 10000
+
+
+class UserSnapshot(NamedTuple):
+    id: int
+    full_name: str
+    role: str
+    blood_group: str
+
+
+# user id -> (expires_at, snapshot), in expiry order
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def current_user():
+    """Return the logged-in ``User`` (or ``None``), loading it at most once per request."""
+    if '_current_user' not in g:
+        user_id = session.get('user_id')
+        g._current_user = db.session.get(User, user_id) if user_id else None
+    return g._current_user
+
+
+def current_user_snapshot():
+    """Return a ``UserSnapshot`` of the logged-in user, from cache when possible."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+
+    if g.get('_current_user') is None:
+        cached = _snapshots.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+    user = current_user()
+    if user is None:
+        invalidate_user_snapshot(user_id)
+        return None
+    snapshot = UserSnapshot(user.id, user.full_name, user.role, user.blood_group)
+    _store_snapshot(user_id, snapshot)
+    return snapshot
+
+
+def _store_snapshot(user_id, snapshot):
+    now = time.monotonic()
+    with _snapshots_lock:
+        # Re-inserted at the end, so the dict stays in expiry order
+        _snapshots.pop(user_id, None)
+        _snapshots[user_id] = (now + SNAPSHOT_TTL, snapshot)
+        # Drop expired entries (and any over the cap) from the front, so users who
+        # never come back do not stay cached for the life of the worker
+        while _snapshots:
+            oldest_id, (expires_at, _) = next(iter(_snapshots.items()))
+            if expires_at > now and len(_snapshots) <= MAX_SNAPSHOTS:
+                break
+            del _snapshots[oldest_id]
+
+
+def invalidate_user_snapshot(user_id):
+    with _snapshots_lock:
+        _snapshots.pop(user_id, None)
+
+
+def role_required(role):
+    """Redirect to the login page unless the session belongs to a user with ``role``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if 'user_id' not in session or session.get('user_role') != role:
+                flash(f'Access denied. {role.title()} privileges required.', 'error')
+                return redirect(url_for('auth.login'))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def api_role_required(*roles):
+    """JSON counterpart of ``role_required``: 401 without a session, 403 for other roles (any role if none given)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if 'user_id' not in session:
+                return jsonify({'error': 'authentication required'}), 401
+            if roles and session.get('user_role') not in roles:
+                return jsonify({'error': 'forbidden'}), 403
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
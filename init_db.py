@@ -2,16 +2,28 @@
 """
 Initialize database with sample data for Blood Bank Management System
 Run this script to populate the database with test data
+
+Pass --scale to add production-sized synthetic data on top of the samples,
+e.g. `python init_db.py --scale 10` for ~1.2M users and ~3M donations
 """
 
+import argparse
 import os
 import sys
 from datetime import datetime, date, timedelta
-from app import app, db
+from app import create_app, db
 from models import User, BloodInventory, Donation, BloodRequest, DonationCamp
+from camps import generate_slots
+from counters import recompute_counters
+from eligibility import recompute_donor_stats
+from expiry import backfill_blood_units, expire_units
+from reports import backfill_rollups
+from synthetic_data import DEFAULT_SEED, generate
+
+app = create_app()
 
-def init_database():
-    """Initialize database with sample data"""
+def init_database(scale=0, seed=DEFAULT_SEED):
+    """Initialize database with sample data, plus ``scale`` x synthetic data if given"""
     with app.app_context():
         # Clear existing data
         db.drop_all()
@@ -269,6 +281,26 @@ def init_database():
         
         db.session.commit()
         
+        if scale:
+            print(f"Generating synthetic data (scale {scale}, seed {seed})...")
+            generate(scale, seed, admin_id=admin.id)
+        
+        print("Opening camp appointment slots...")
+        generate_slots()
+        
+        print("Tracking blood units...")
+        backfill_blood_units()
+        expire_units()
+        
+        print("Computing dashboard counters...")
+        recompute_counters()
+        
+        print("Computing donor eligibility...")
+        recompute_donor_stats()
+        
+        print("Building report rollups...")
+        backfill_rollups()
+        
         print("Database initialized successfully!")
         print("\nSample login credentials:")
         print("Admin: username='admin', password='admin123'")
@@ -277,4 +309,9 @@ def init_database():
         print("\nOther test users follow the same pattern with password='password123'")
 
 if __name__ == '__main__':
-    init_database()
+    parser = argparse.ArgumentParser(description='Reset the database and load sample data')
+    parser.add_argument('--scale', type=float, default=0,
+                        help='add synthetic data; 1.0 = 100k donors, 20k patients, ~300k donations')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='random seed for synthetic data')
+    args = parser.parse_args()
+    init_database(args.scale, args.seed)
@@ -0,0 +1,115 @@
+# instrumentation.py
+"""
+Per-request SQL instrumentation.
+
+Counts and times every statement executed while a Flask request is being
+handled, flags statements that repeat with only different parameters (the
+classic N+1 lazy-load pattern) and enforces optional per-endpoint query
+budgets declared with the ``query_budget`` decorator.
+"""
+
+import logging
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Statements repeated at least this many times in one request are reported
+N_PLUS_ONE_THRESHOLD = 5
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (in testing mode) when an endpoint runs more queries than its budget."""
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Statements executed ``threshold`` or more times with different parameters."""
+        return [(stmt, n) for stmt, n in self.statements.most_common() if n >= threshold]
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL statements an endpoint may execute."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def current_query_stats():
+    if has_app_context():
+        return g.get('_query_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['_query_start'].pop()
+    stats = current_query_stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_failed_query_start(context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    # so the pooled connection's next statement pairs with its own
+    if context.connection is not None and context.statement is not None:
+        starts = context.connection.info.get('_query_start')
+        if starts:
+            starts.pop()
+
+
+def init_query_instrumentation(app):
+    # None: follow app.debug at request time (it is set by app.run(), after the app is created)
+    app.config.setdefault('SQL_DEBUG_HEADERS', None)
+    app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+
+    @app.before_request
+    def start_query_stats():
+        g._query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = current_query_stats()
+        if stats is None:
+            return response
+
+        endpoint = request.endpoint or request.path
+        for statement, count in stats.repeated(app.config['SQL_N_PLUS_ONE_THRESHOLD']):
+            logger.warning('Possible N+1 on %s: statement executed %d times: %s',
+                           endpoint, count, ' '.join(statement.split())[:200])
+
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and stats.count > budget:
+            message = f'{endpoint} executed {stats.count} queries (budget {budget})'
+            if app.testing:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        debug_headers = app.config['SQL_DEBUG_HEADERS']
+        if debug_headers is None:
+            debug_headers = app.debug
+        if debug_headers:
+            response.headers['X-SQL-Queries'] = f'{stats.count}; time={stats.total_time * 1000:.1f}ms'
+        return response
@@ -0,0 +1,307 @@
+# inventory.py
+"""
+Atomic blood inventory mutations.
+
+Stock is tracked per bag in ``BloodUnit`` (collection and expiry date,
+status) and counted per blood group in ``BloodInventory.units_available``.
+The count is kept in step incrementally: every change moves units between
+statuses and applies the same delta to the count in the caller's
+transaction, so reads never rescan the unit table. Neither is read into
+Python, adjusted and written back. Each change is a conditional UPDATE, so
+concurrent donations and approvals cannot lose updates, issue a bag twice or
+drive ``units_available`` negative, and every change is appended to the
+``InventoryMovement`` ledger. Callers own the commit.
+
+``receive_units()`` adds bags (donations, manual corrections).
+``allocate()`` draws a request from the exact and compatible blood groups
+(see ``compatibility.plan_allocation``), issuing the earliest-expiring
+unexpired bags of each group first; ``withdraw_batch()`` applies many
+already-planned allocations at once. ``retire_expired()`` takes lapsed bags
+out of stock; the sweeper in expiry.py runs it in batches, and allocation
+runs it for a group that comes up short.
+
+Reads go through ``inventory_snapshot()``, an in-process copy of the (small)
+inventory table that is reloaded only when the ``inventory`` data version
+changes.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from compatibility import availability_matrix, plan_allocation
+from extensions import db
+from models import (UNIT_AVAILABLE, UNIT_DISCARDED, UNIT_EXPIRED, UNIT_ISSUED, BloodInventory, BloodUnit,
+                    InventoryMovement, unit_expiry)
+from versions import VersionedCache, bump_version
+
+REASON_DONATION = 'donation'
+REASON_APPROVAL = 'approval'
+REASON_ADJUSTMENT = 'adjustment'
+REASON_EXPIRY = 'expiry'
+
+INVENTORY_VERSION = 'inventory'
+
+# Re-plans of an allocation that lost a race with a concurrent withdrawal
+ALLOCATION_ATTEMPTS = 3
+
+
+class InventoryItem(NamedTuple):
+    blood_group: str
+    units_available: int
+    last_updated: datetime
+
+
+def _load_inventory():
+    rows = db.session.query(
+        BloodInventory.blood_group, BloodInventory.units_available, BloodInventory.last_updated
+    ).order_by(BloodInventory.id).all()
+    return tuple(InventoryItem(*row) for row in rows)
+
+
+_inventory_cache = VersionedCache(INVENTORY_VERSION, _load_inventory)
+
+
+def inventory_snapshot():
+    """Return every blood group's stock as a tuple of ``InventoryItem``."""
+    return _inventory_cache.get()
+
+
+def versioned_inventory_snapshot():
+    """Return ``(version, snapshot)``: the ``inventory`` data version the snapshot was loaded at."""
+    return _inventory_cache.get_versioned()
+
+
+def invalidate_inventory_snapshot():
+    """Make the next ``inventory_snapshot()`` re-check the data version (another worker wrote)."""
+    _inventory_cache.invalidate()
+
+
+def total_units():
+    return sum(item.units_available or 0 for item in inventory_snapshot())
+
+
+def inventory_summary(snapshot):
+    """JSON-ready stock per blood group, with the units each group can receive from compatible groups."""
+    updated = {item.blood_group: item.last_updated for item in snapshot}
+    last_updated = max(filter(None, updated.values()), default=None)
+    return {
+        'inventory': [{'blood_group': row.blood_group,
+                       'units_available': row.units,
+                       'compatible_units': row.compatible_units,
+                       'last_updated': updated[row.blood_group].isoformat() if updated.get(row.blood_group) else None}
+                      for row in availability_matrix(snapshot)],
+        'total_units': sum(item.units_available or 0 for item in snapshot),
+        'last_updated': last_updated.isoformat() if last_updated else None,
+    }
+
+
+def record_movement(blood_group, change, reason, **refs):
+    bump_version(INVENTORY_VERSION)
+    db.session.add(InventoryMovement(blood_group=blood_group, change=change, reason=reason, **refs))
+
+
+def _available_units(blood_group, today=None):
+    """Available bags of ``blood_group``, earliest expiry first (unexpired on ``today`` only, if given)."""
+    query = select(BloodUnit.id).where(BloodUnit.blood_group == blood_group, BloodUnit.status == UNIT_AVAILABLE)
+    if today is not None:
+        query = query.where(BloodUnit.expiry_date >= today)
+    return query.order_by(BloodUnit.expiry_date, BloodUnit.id)
+
+
+def unexpired_unit_counts(blood_groups, today=None):
+    """Available bags still in date on ``today``, per blood group in ``blood_groups``."""
+    today = today or date.today()
+    return dict(db.session.execute(
+        select(BloodUnit.blood_group, func.count())
+        .where(BloodUnit.blood_group.in_(blood_groups), BloodUnit.status == UNIT_AVAILABLE,
+               BloodUnit.expiry_date >= today)
+        .group_by(BloodUnit.blood_group)
+    ).all())
+
+
+def _take_units(blood_group, units, status, today=None, request_id=None):
+    """Move up to ``units`` of the earliest-expiring available bags to ``status``; returns how many moved."""
+    return db.session.execute(
+        update(BloodUnit)
+        .where(BloodUnit.id.in_(_available_units(blood_group, today).limit(units)),
+               BloodUnit.status == UNIT_AVAILABLE)
+        .values(status=status, request_id=request_id, status_changed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def receive_units(blood_group, units, reason, collected_on=None, **refs):
+    """Add ``units`` bags of ``blood_group`` collected on ``collected_on`` (default today) to stock."""
+    collected_on = collected_on or date.today()
+    db.session.execute(insert(BloodUnit), [
+        {'blood_group': blood_group, 'donation_id': refs.get('donation_id'),
+         'collection_date': collected_on, 'expiry_date': unit_expiry(collected_on)}
+        for _ in range(units)
+    ])
+    _adjust_count(blood_group, units, reason, **refs)
+
+
+def _adjust_count(blood_group, change, reason, **refs):
+    """Add ``change`` (negative to withdraw) to the ``blood_group`` count and record it in the ledger.
+
+    Returns False, changing nothing, if a withdrawal would take the count
+    below zero or the blood group has no inventory row.
+    """
+    if not _apply_change(blood_group, change):
+        if change <= 0 or not _create_stock(blood_group, change):
+            return False
+    record_movement(blood_group, change, reason, **refs)
+    return True
+
+
+def _apply_change(blood_group, change):
+    """Conditionally add ``change`` to an existing row; False if missing or it would go negative."""
+    return db.session.execute(
+        update(BloodInventory)
+        .where(BloodInventory.blood_group == blood_group,
+               BloodInventory.units_available + change >= 0)
+        .values(units_available=BloodInventory.units_available + change,
+                last_updated=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _issue(blood_group, units, reason, today, **refs):
+    """Issue the ``units`` earliest-expiring unexpired bags of ``blood_group``; False if there are fewer."""
+    return (_take_units(blood_group, units, UNIT_ISSUED, today, refs.get('request_id')) == units
+            and _adjust_count(blood_group, -units, reason, **refs))
+
+
+def retire_expired(blood_group, today=None, limit=None):
+    """Mark available bags of ``blood_group`` that expired before ``today`` as expired; returns how many.
+
+    At most ``limit`` bags (earliest expiry first) are retired per call.
+    """
+    today = today or date.today()
+    expired = _available_units(blood_group).where(BloodUnit.expiry_date < today)
+    if limit:
+        expired = expired.limit(limit)
+    retired = db.session.execute(
+        update(BloodUnit)
+        .where(BloodUnit.id.in_(expired), BloodUnit.status == UNIT_AVAILABLE)
+        .values(status=UNIT_EXPIRED, status_changed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if retired and not _adjust_count(blood_group, -retired, REASON_EXPIRY):
+        # The count was behind the bags (stock changed outside the app): floor it at zero
+        db.session.execute(
+            update(BloodInventory)
+            .where(BloodInventory.blood_group == blood_group)
+            .values(units_available=case((BloodInventory.units_available > retired,
+                                          BloodInventory.units_available - retired), else_=0),
+                    last_updated=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        record_movement(blood_group, -retired, REASON_EXPIRY)
+    return retired
+
+
+def withdraw_batch(allocations, reason, user_id=None):
+    """Apply many request allocations with one conditional UPDATE per blood group.
+
+    ``allocations`` is ``[(request_id, [(blood_group, units), ...]), ...]``.
+    Each group's earliest-expiring unexpired bags are issued in allocation
+    order with one executemany UPDATE, and every part still gets its own
+    ledger row. Returns False, leaving the caller to roll back, if any blood
+    group would go negative or has too few unexpired bags.
+    """
+    totals = defaultdict(int)
+    movements = []
+    for request_id, plan in allocations:
+        for blood_group, units in plan:
+            totals[blood_group] += units
+            movements.append({'blood_group': blood_group, 'change': -units, 'reason': reason,
+                              'request_id': request_id, 'user_id': user_id})
+    if not all(_apply_change(blood_group, -units) for blood_group, units in totals.items()):
+        return False
+
+    today = date.today()
+    bags = {}
+    for blood_group, units in totals.items():
+        ids = db.session.scalars(_available_units(blood_group, today).limit(units).with_for_update()).all()
+        if len(ids) < units:
+            return False
+        bags[blood_group] = iter(ids)
+    issued = [{'b_unit_id': next(bags[blood_group]), 'b_request_id': request_id}
+              for request_id, plan in allocations
+              for blood_group, units in plan
+              for _ in range(units)]
+
+    if movements:
+        bump_version(INVENTORY_VERSION)
+        db.session.execute(insert(InventoryMovement), movements)
+        # Core table UPDATE: the ORM form would treat a parameter list as bulk-by-primary-key
+        columns = BloodUnit.__table__.c
+        db.session.execute(
+            update(BloodUnit.__table__)
+            .where(columns.id == bindparam('b_unit_id'))
+            .values(status=UNIT_ISSUED, request_id=bindparam('b_request_id'), status_changed_at=datetime.utcnow()),
+            issued
+        )
+    return True
+
+
+def allocate(blood_group, units, reason, reserve=0, **refs):
+    """Withdraw ``units`` for a ``blood_group`` recipient from compatible stock.
+
+    Returns the ``[(blood_group, units), ...]`` actually taken, or ``None``
+    (changing nothing) if compatible stock cannot cover the request. Stock is
+    planned from a fresh read and every part issues the earliest-expiring
+    bags with conditional UPDATEs; if a concurrent withdrawal gets there
+    first, or a group's count still includes bags that have since expired,
+    the whole plan is undone and re-planned.
+    """
+    today = date.today()
+    for _ in range(ALLOCATION_ATTEMPTS):
+        stock = dict(db.session.query(BloodInventory.blood_group, BloodInventory.units_available))
+        plan = plan_allocation(blood_group, units, stock, reserve)
+        if plan is None:
+            return None
+        savepoint = db.session.begin_nested()
+        if all(_issue(group, taken, reason, today, **refs) for group, taken in plan):
+            savepoint.commit()
+            return plan
+        savepoint.rollback()
+        # Bags that expired since the last sweep are still counted: retire them before re-planning
+        for group, _ in plan:
+            retire_expired(group, today)
+    return None
+
+
+def set_stock(blood_group, units, **refs):
+    """Set ``blood_group`` to exactly ``units`` by adding fresh bags or discarding the earliest-expiring ones."""
+    inventory = BloodInventory.query.filter_by(blood_group=blood_group).with_for_update().first()
+    change = units - ((inventory.units_available or 0) if inventory else 0)
+    if change > 0:
+        receive_units(blood_group, change, REASON_ADJUSTMENT, **refs)
+    elif change < 0:
+        # Lapsed bags expire first, so a correction removes those before usable stock
+        _take_units(blood_group, -change, UNIT_DISCARDED)
+        _adjust_count(blood_group, change, REASON_ADJUSTMENT, **refs)
+
+
+def _create_stock(blood_group, units):
+    """Create the inventory row for a blood group seen for the first time."""
+    try:
+        with db.session.begin_nested():
+            db.session.add(BloodInventory(blood_group=blood_group, units_available=units))
+        return True
+    except IntegrityError:
+        # Another worker created the row first; add to it instead
+        return db.session.execute(
+            update(BloodInventory)
+            .where(BloodInventory.blood_group == blood_group)
+            .values(units_available=BloodInventory.units_available + units,
+                    last_updated=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+
@@ -0,0 +1,125 @@
+# metrics.py
+"""
+Prometheus metrics, served in text format at ``/admin/metrics``.
+
+Every request observes its duration (per endpoint, method and status) and
+adds the SQL statement count and time already gathered by instrumentation.py,
+a handful of microseconds on the hot path. Report and raw XLSX exports
+observe how long ReportLab and openpyxl took to render. Stock per blood group
+and pending requests are gauges read at scrape time from the inventory
+snapshot and the dashboard counters, so they are the same whichever worker
+answers.
+
+Under gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory shared
+by the workers (gunicorn.conf.py clears it at start-up): each process then
+writes its samples to its own memory-mapped file there and a scrape sums all
+of them, including those of workers that have since exited. Without it,
+metrics cover only the process that answers the scrape.
+"""
+
+import hmac
+import os
+import time
+
+from flask import Response, current_app, g, request, session
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+                               multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+from counters import get_counts, requests_key
+from instrumentation import current_query_stats
+from inventory import inventory_snapshot
+
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_DURATION = Histogram(
+    'bloodbank_http_request_duration_seconds',
+    'Time from the start of a request until its response is ready (streamed bodies excluded)',
+    ['endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+SQL_STATEMENTS = Counter(
+    'bloodbank_sql_statements', 'SQL statements executed while handling requests', ['endpoint'])
+SQL_DURATION = Counter(
+    'bloodbank_sql_duration_seconds', 'Time spent executing SQL statements while handling requests', ['endpoint'])
+EXPORT_RENDER = Histogram(
+    'bloodbank_export_render_seconds',
+    'Time to render an export with ReportLab (pdf) or openpyxl (xlsx)',
+    ['format', 'export'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+def observe_export_render(fmt, export, seconds):
+    EXPORT_RENDER.labels(fmt, export).observe(seconds)
+
+
+class StockCollector:
+    """Inventory and pending-request gauges, read from the database when scraped."""
+
+    def collect(self):
+        units = GaugeMetricFamily('bloodbank_inventory_units', 'Available blood units per blood group',
+                                  labels=['blood_group'])
+        for item in inventory_snapshot():
+            units.add_metric([item.blood_group], item.units_available or 0)
+        yield units
+
+        pending = requests_key('pending')
+        yield GaugeMetricFamily('bloodbank_pending_requests', 'Blood requests awaiting a decision',
+                                value=get_counts(pending)[pending])
+
+
+def render_metrics():
+    """The text exposition of every worker's metrics (or this process's) plus the stock gauges."""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(StockCollector())
+
+
+def metrics_response():
+    """``render_metrics()`` as a response in the Prometheus text exposition format."""
+    return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
+def scrape_authorized():
+    """An admin session, or ``Authorization: Bearer <METRICS_TOKEN>`` for a Prometheus scraper."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return session.get('user_role') == 'admin'
+
+
+def _observe_request(status):
+    started = g.pop('_request_started', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_DURATION.labels(endpoint, request.method, status).observe(time.perf_counter() - started)
+    stats = current_query_stats()
+    if stats is not None and stats.count:
+        SQL_STATEMENTS.labels(endpoint).inc(stats.count)
+        SQL_DURATION.labels(endpoint).inc(stats.total_time)
+
+
+def init_metrics(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        _observe_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        # after_request is skipped when the view raised
+        if exc is not None:
+            _observe_request(500)
@@ -1,8 +1,39 @@
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import DDL, event
 from extensions import db
+
+# Minimum days between two whole-blood donations by the same donor
+DONATION_INTERVAL_DAYS = 56
+
+def _default_next_eligible(context):
+    # A donor who has never given is eligible from the day they register
+    params = context.get_current_parameters()
+    if params.get('role') != 'donor':
+        return None
+    created_at = params.get('created_at')
+    return created_at.date() if isinstance(created_at, datetime) else date.today()
+
+# Weighted PostgreSQL search document over the searchable user columns; search.py
+# queries this exact expression so the planner can use idx_user_search
+USER_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(full_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(username, '') || ' ' || coalesce(email, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(phone, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(address, '')), 'D')"
+)
+
 class User(db.Model):
+    __table_args__ = (
+        db.Index('idx_user_role_active', 'role', 'is_active'),
+        db.Index('idx_user_role_created', 'role', 'created_at'),
+        db.Index('idx_user_blood_group', 'blood_group'),
+        db.Index('idx_user_donor_eligibility', 'role', 'is_active', 'blood_group', 'next_eligible_date', 'id'),
+        db.Index('idx_user_search', db.text(f'({USER_SEARCH_VECTOR})'),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -16,6 +47,11 @@ class User(db.Model):
     gender = db.Column(db.String(10))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Denormalized from the donor's donations, see eligibility.py
+    last_donation_date = db.Column(db.Date)
+    next_eligible_date = db.Column(db.Date, default=_default_next_eligible)
+    donation_count = db.Column(db.Integer, default=0)
+    lifetime_units = db.Column(db.Integer, default=0)
     
     # Relationships
     donations = db.relationship('Donation', foreign_keys='Donation.donor_id', backref='donor', lazy=True)
@@ -27,9 +63,38 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# SQLite full-text index over the same columns: an external-content FTS5 table
+# kept in sync by triggers (only on changes to the indexed columns), with prefix
+# indexes so short prefix queries read one doclist instead of merging many. The
+# role is indexed too, so a role filter is a doclist intersection inside FTS5
+USER_SEARCH_COLUMNS = ('full_name', 'username', 'email', 'phone', 'address')
+
+def _user_search_ddl():
+    indexed = USER_SEARCH_COLUMNS + ('role',)
+    columns = ', '.join(indexed)
+    new = ', '.join(f'new.{column}' for column in indexed)
+    old = ', '.join(f'old.{column}' for column in indexed)
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+        f"{columns}, content='user', content_rowid='id', prefix='1 2 3 4')",
+        f"CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON user BEGIN "
+        f"INSERT INTO user_search(rowid, {columns}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON user BEGIN "
+        f"INSERT INTO user_search(user_search, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF {columns} ON user BEGIN "
+        f"INSERT INTO user_search(user_search, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO user_search(rowid, {columns}) VALUES (new.id, {new}); END",
+    )
+
+USER_SEARCH_DDL = _user_search_ddl()
+
+for _statement in USER_SEARCH_DDL:
+    event.listen(User.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(User.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS user_search').execute_if(dialect='sqlite'))
+
 class BloodInventory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    blood_group = db.Column(db.String(5), nullable=False)
+    blood_group = db.Column(db.String(5), unique=True, nullable=False)
     units_available = db.Column(db.Integer, default=0)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -37,6 +102,12 @@ class BloodInventory(db.Model):
         return f'<BloodInventory {self.blood_group}: {self.units_available} units>'
 
 class Donation(db.Model):
+    __table_args__ = (
+        db.Index('idx_donation_donor_date', 'donor_id', 'donation_date'),
+        db.Index('idx_donation_date', 'donation_date'),
+        db.Index('idx_donation_created', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     donor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     donation_date = db.Column(db.Date, nullable=False)
@@ -47,7 +118,67 @@ class Donation(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Days a unit of whole blood can be stored after collection
+SHELF_LIFE_DAYS = 42
+
+# BloodUnit.status values
+UNIT_AVAILABLE = 'available'
+UNIT_ISSUED = 'issued'
+UNIT_EXPIRED = 'expired'
+UNIT_DISCARDED = 'discarded'
+
+def unit_expiry(collection_date):
+    return collection_date + timedelta(days=SHELF_LIFE_DAYS)
+
+def _default_expiry(context):
+    return unit_expiry(context.get_current_parameters()['collection_date'])
+
+class BloodUnit(db.Model):
+    """One bag of blood from collection until it is issued, expires or is discarded (see inventory.py)"""
+    __table_args__ = (
+        # Earliest-expiring available units of a group first, for allocation and the expiry sweep
+        db.Index('idx_blood_unit_allocation', 'blood_group', 'status', 'expiry_date', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    blood_group = db.Column(db.String(5), nullable=False)
+    donation_id = db.Column(db.Integer, db.ForeignKey('donation.id'))  # None for stock added by adjustment
+    collection_date = db.Column(db.Date, nullable=False)
+    expiry_date = db.Column(db.Date, nullable=False, default=_default_expiry)
+    status = db.Column(db.String(20), nullable=False, default=UNIT_AVAILABLE)  # available, issued, expired, discarded
+    request_id = db.Column(db.Integer, db.ForeignKey('blood_request.id'))  # set when issued
+    status_changed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Triage order: lower priority value first, then earliest deadline
+URGENCY_PRIORITY = {'urgent': 0, 'normal': 1, 'low': 2}
+# Deadline for requests without a required_by date, in days after the request
+DEFAULT_DEADLINE_DAYS = {'urgent': 1, 'normal': 7, 'low': 14}
+
+def triage_priority(urgency):
+    return URGENCY_PRIORITY.get(urgency or 'normal', URGENCY_PRIORITY['normal'])
+
+def triage_deadline(urgency, request_date, required_by=None):
+    if required_by or not request_date:
+        return required_by
+    return request_date + timedelta(days=DEFAULT_DEADLINE_DAYS.get(urgency or 'normal', 7))
+
+def _default_priority(context):
+    return triage_priority(context.get_current_parameters().get('urgency'))
+
+def _default_deadline(context):
+    params = context.get_current_parameters()
+    return triage_deadline(params.get('urgency'), params.get('request_date'), params.get('required_by'))
+
 class BloodRequest(db.Model):
+    __table_args__ = (
+        db.Index('idx_blood_request_patient_created', 'patient_id', 'created_at'),
+        db.Index('idx_blood_request_status', 'status'),
+        db.Index('idx_blood_request_created', 'created_at'),
+        db.Index('idx_blood_request_date', 'request_date'),
+        db.Index('idx_blood_request_triage', 'status', 'priority', 'deadline', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     blood_group = db.Column(db.String(5), nullable=False)
@@ -61,10 +192,73 @@ class BloodRequest(db.Model):
     approved_date = db.Column(db.DateTime)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized from urgency / required_by so the triage queue is one index range scan
+    priority = db.Column(db.Integer, default=_default_priority)
+    deadline = db.Column(db.Date, default=_default_deadline)
     
     approver = db.relationship('User', foreign_keys=[approved_by], post_update=True)
 
+class InventoryMovement(db.Model):
+    """Append-only ledger of every change to BloodInventory.units_available"""
+    __table_args__ = (
+        db.Index('idx_inventory_movement_group_created', 'blood_group', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    blood_group = db.Column(db.String(5), nullable=False)
+    change = db.Column(db.Integer, nullable=False)  # positive = stock in, negative = stock out
+    reason = db.Column(db.String(20), nullable=False)  # donation, approval, adjustment, expiry
+    donation_id = db.Column(db.Integer, db.ForeignKey('donation.id'))
+    request_id = db.Column(db.Integer, db.ForeignKey('blood_request.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<InventoryMovement {self.blood_group}: {self.change:+d} ({self.reason})>'
+
+class DataVersion(db.Model):
+    """Per-dataset version counters, bumped on every write so worker caches can detect changes"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class LiveEvent(db.Model):
+    """Short-lived outbox of live-update events, polled by every worker's broker (see broker.py)"""
+    __table_args__ = (
+        db.Index('idx_live_event_created', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(50), nullable=False)  # inventory, role:<role>, user:<id>
+    kind = db.Column(db.String(20), nullable=False)  # inventory, request
+    payload = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Counter(db.Model):
+    """Dashboard counters kept up to date in the same transaction as the writes they count"""
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyDonationRollup(db.Model):
+    """Donations per day and blood group, maintained on write for date-range reports"""
+    day = db.Column(db.Date, primary_key=True)
+    blood_group = db.Column(db.String(5), primary_key=True)
+    donations = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyRequestRollup(db.Model):
+    """Blood requests per day and blood group, maintained on write for date-range reports"""
+    day = db.Column(db.Date, primary_key=True)
+    blood_group = db.Column(db.String(5), primary_key=True)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
 class DonationCamp(db.Model):
+    __table_args__ = (
+        db.Index('idx_donation_camp_active_date', 'is_active', 'camp_date'),
+        # The camps API validator covers active and inactive camps alike
+        db.Index('idx_donation_camp_date', 'camp_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(200), nullable=False)
@@ -76,3 +270,41 @@ class DonationCamp(db.Model):
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Stamped on every UPDATE through the app; the camps API uses it as a cache validator
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Appointment places over all slots and places booked, kept by camps.py
+    capacity = db.Column(db.Integer, nullable=False, default=0)
+    booked_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def places_left(self):
+        return max((self.capacity or 0) - (self.booked_count or 0), 0)
+
+class CampSlot(db.Model):
+    """An appointment window at a camp, with room for ``capacity`` donors (see camps.py)"""
+    __table_args__ = (
+        db.Index('idx_camp_slot_start', 'camp_id', 'starts_at', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    camp_id = db.Column(db.Integer, db.ForeignKey('donation_camp.id'), nullable=False)
+    starts_at = db.Column(db.Time, nullable=False)
+    ends_at = db.Column(db.Time, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def places_left(self):
+        return max(self.capacity - (self.booked or 0), 0)
+
+class CampBooking(db.Model):
+    """A donor's appointment; the unique index allows one booking per donor per camp"""
+    __table_args__ = (
+        db.Index('idx_camp_booking_donor_camp', 'donor_id', 'camp_id', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    camp_id = db.Column(db.Integer, db.ForeignKey('donation_camp.id'), nullable=False)
+    slot_id = db.Column(db.Integer, db.ForeignKey('camp_slot.id'), nullable=False)
+    donor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
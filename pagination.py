@@ -0,0 +1,105 @@
+# pagination.py
+"""
+Keyset (cursor) pagination for list views.
+
+Rows are ordered by ``(key, id)`` descending and each page is fetched with a
+``WHERE (key, id) < cursor`` predicate instead of OFFSET, so the cost of a
+page does not grow with how deep into the table it is.
+"""
+
+import base64
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from sqlalchemy.types import DateTime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(key_value, row_id):
+    raw = f'{key_value.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key_column):
+    """Return ``(key_value, row_id)`` or ``None`` for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key_raw, row_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        key_value = datetime.fromisoformat(key_raw)
+        if not isinstance(key_column.type, DateTime):
+            key_value = key_value.date()
+        return key_value, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(query, key_column, id_column, cursor=None, direction='next', per_page=None):
+    """Fetch one page of ``query`` ordered newest first by ``(key_column, id_column)``.
+
+    ``direction='prev'`` walks backwards from ``cursor`` towards newer rows.
+    """
+    per_page = per_page or DEFAULT_PAGE_SIZE
+    position = decode_cursor(cursor, key_column) if cursor else None
+    backwards = direction == 'prev' and position is not None
+
+    if position is not None:
+        key_value, row_id = position
+        if backwards:
+            query = query.filter(or_(key_column > key_value,
+                                     and_(key_column == key_value, id_column > row_id)))
+        else:
+            query = query.filter(or_(key_column < key_value,
+                                     and_(key_column == key_value, id_column < row_id)))
+
+    if backwards:
+        query = query.order_by(key_column.asc(), id_column.asc())
+    else:
+        query = query.order_by(key_column.desc(), id_column.desc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows, per_page)
+
+    key_attr, id_attr = key_column.key, id_column.key
+    first = encode_cursor(getattr(rows[0], key_attr), getattr(rows[0], id_attr))
+    last = encode_cursor(getattr(rows[-1], key_attr), getattr(rows[-1], id_attr))
+    if backwards:
+        return KeysetPage(rows, per_page, next_cursor=last, prev_cursor=first if has_more else None)
+    return KeysetPage(rows, per_page,
+                      next_cursor=last if has_more else None,
+                      prev_cursor=first if position is not None else None)
+
+
+def paginate_request(query, key_column, id_column):
+    """Paginate ``query`` using the ``cursor``, ``dir`` and ``per_page`` query parameters."""
+    default_size = current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    per_page = request.args.get('per_page', default_size, type=int)
+    per_page = max(1, min(per_page, current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)))
+    return keyset_paginate(query, key_column, id_column,
+                           cursor=request.args.get('cursor'),
+                           direction=request.args.get('dir', 'next'),
+                           per_page=per_page)
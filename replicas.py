@@ -0,0 +1,145 @@
+# replicas.py
+"""
+Read-replica routing for dashboards and reports.
+
+With ``REPLICA_DATABASE_URL`` set, the replica is the ``replica`` bind and
+views decorated with ``replica_reads`` send their plain ``SELECT``s to it.
+Everything else stays on the primary:
+
+* every other view, so POST handlers and their redirects read what they
+  just wrote;
+* writes, ``SELECT ... FOR UPDATE`` and anything after the first write (or
+  flush) in a transaction, so a transaction never mixes its own changes with
+  the replica's older state;
+* work outside a request (CLI commands, the live-event broker).
+
+Replication lag is bounded for the writer by a staleness guard: a request
+that commits a write pins the user's session to the primary for
+``REPLICA_STALENESS_SECONDS``, so the dashboard they are redirected to shows
+their own change even if the replica has not caught up yet.
+
+Locally the replica can be a second SQLite file refreshed with
+``flask --app main sync-replica``.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import click
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+
+DEFAULT_STALENESS_SECONDS = 5
+
+# Flask session key: reads go to the primary until this time.time()
+PRIMARY_UNTIL = 'primary_until'
+
+
+class RoutingSession(FlaskSession):
+    """A session that sends replica-eligible reads to the ``replica`` bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._is_replica_read(clause):
+                return self._db.engines[REPLICA_BIND]
+            if self._flushing or not isinstance(clause, Select):
+                # A write (or something that might be one): stay on the primary from here on
+                self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _is_replica_read(self, clause):
+        return (isinstance(clause, Select)
+                and clause._for_update_arg is None
+                and not self._flushing
+                and not self.info.get('wrote')
+                and has_app_context()
+                and g.get('_read_replica', False)
+                and REPLICA_BIND in self._db.engines)
+
+
+def _engines():
+    # extensions.py builds ``db`` with RoutingSession, so it cannot be imported here
+    return current_app.extensions['sqlalchemy'].engines
+
+
+def replica_enabled():
+    return REPLICA_BIND in _engines()
+
+
+def primary_pinned():
+    return session.get(PRIMARY_UNTIL, 0) > time.time()
+
+
+def replica_reads(view):
+    """Serve ``view``'s reads from the replica, unless the user wrote something moments ago."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if replica_enabled() and not primary_pinned():
+            g._read_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, even in a ``replica_reads`` view."""
+    previous = g.get('_read_replica', False)
+    g._read_replica = False
+    try:
+        yield
+    finally:
+        g._read_replica = previous
+
+
+@event.listens_for(Session, 'after_commit')
+def _note_committed_write(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g._wrote = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_write(session):
+    session.info.pop('wrote', None)
+
+
+def init_replica_routing(app):
+    @app.after_request
+    def pin_writer_to_primary(response):
+        if g.get('_wrote') and REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            window = app.config.get('REPLICA_STALENESS_SECONDS', DEFAULT_STALENESS_SECONDS)
+            session[PRIMARY_UNTIL] = time.time() + window
+        return response
+
+
+def sync_replica():
+    """Copy the primary SQLite database onto the replica file (local testing only)."""
+    engines = _engines()
+    source, target = engines[None].url, engines[REPLICA_BIND].url
+    if source.get_backend_name() != 'sqlite' or target.get_backend_name() != 'sqlite':
+        raise click.ClickException('sync-replica only copies SQLite files; '
+                                   "use the database's own replication elsewhere")
+    # Drop pooled replica connections so none reads the file while it is rewritten
+    engines[REPLICA_BIND].dispose()
+    src = sqlite3.connect(source.database)
+    dst = sqlite3.connect(target.database)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    return target.database
+
+
+@click.command('sync-replica')
+def sync_replica_command():
+    """Copy the primary SQLite database to the replica file."""
+    if not replica_enabled():
+        raise click.ClickException('No replica configured (set REPLICA_DATABASE_URL)')
+    click.echo(f'Replica refreshed: {sync_replica()}')
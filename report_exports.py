@@ -0,0 +1,296 @@
+# report_exports.py
+"""
+Background PDF/Excel report generation with content-addressed artifacts.
+
+Rendering runs on a local process pool so it never blocks a web worker.
+Each artifact is stored on disk under a key derived from the format, the
+date range and the report data version, so once a report has been built any
+worker can serve it (with an ETag) until the underlying data changes. When a
+build finishes, older artifacts of the same format and date range are
+deleted, as is any artifact not rebuilt for ``REPORT_ARTIFACT_MAX_AGE``
+seconds.
+
+ReportLab and openpyxl are imported inside the renderers, so they are only
+loaded by the processes that actually build an artifact.
+"""
+
+import glob
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from metrics import observe_export_render
+from reports import report_data, report_data_version
+
+FORMATS = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# A build marker older than this is treated as abandoned (e.g. the worker died)
+BUILD_TIMEOUT = 300
+# Seconds an artifact is kept after it was built, unless REPORT_ARTIFACT_MAX_AGE is set
+DEFAULT_ARTIFACT_MAX_AGE = 7 * 24 * 3600
+
+STATUS_READY = 'ready'
+STATUS_RUNNING = 'running'
+STATUS_FAILED = 'failed'
+
+_executor = None
+_jobs = {}
+
+
+def render_pdf(report):
+    """Render ``report`` (a ``reports.ReportData``) as PDF bytes."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    # Create PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = []
+    
+    # Title
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.darkblue,
+        alignment=1  # Center alignment
+    )
+    title = Paragraph(f"Blood Bank Management Report<br/>({report.start_date} to {report.end_date})", title_style)
+    story.append(title)
+    story.append(Spacer(1, 20))
+    
+    # Current Inventory Section
+    inventory_title = Paragraph("Current Blood Inventory", styles['Heading2'])
+    story.append(inventory_title)
+    story.append(Spacer(1, 10))
+    
+    inventory_data = [['Blood Group', 'Units Available', 'Status']]
+    for item in report.inventory:
+        status = 'Critical' if item.units_available < 10 else 'Low' if item.units_available < 20 else 'Good'
+        inventory_data.append([item.blood_group, str(item.units_available), status])
+    
+    inventory_table = Table(inventory_data, colWidths=[2*inch, 2*inch, 2*inch])
+    inventory_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(inventory_table)
+    story.append(Spacer(1, 20))
+    
+    # Donations Section
+    donations_title = Paragraph("Donations Summary", styles['Heading2'])
+    story.append(donations_title)
+    story.append(Spacer(1, 10))
+    
+    donations_data = [['Blood Group', 'Total Donations', 'Total Units']]
+    for donation in report.donations:
+        donations_data.append([donation.blood_group, str(donation.total_donations), str(donation.total_units)])
+    
+    donations_table = Table(donations_data, colWidths=[2*inch, 2*inch, 2*inch])
+    donations_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(donations_table)
+    story.append(Spacer(1, 20))
+    
+    # Requests Section
+    requests_title = Paragraph("Blood Requests Summary", styles['Heading2'])
+    story.append(requests_title)
+    story.append(Spacer(1, 10))
+    
+    requests_data = [['Blood Group', 'Total Requests', 'Total Units Required']]
+    for req in report.requests:
+        requests_data.append([req.blood_group, str(req.total_requests), str(req.total_units)])
+    
+    requests_table = Table(requests_data, colWidths=[2*inch, 2*inch, 2*inch])
+    requests_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightcoral),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(requests_table)
+    
+    # Add footer
+    story.append(Spacer(1, 30))
+    footer = Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
+    story.append(footer)
+    
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_excel(report):
+    """Render ``report`` (a ``reports.ReportData``) as XLSX bytes."""
+    from openpyxl import Workbook
+
+    # Write-only workbook: rows go straight to the sheet XML, nothing is kept per cell
+    workbook = Workbook(write_only=True)
+    
+    # Inventory sheet
+    sheet = workbook.create_sheet('Current Inventory')
+    sheet.append(['Blood Group', 'Units Available', 'Status'])
+    for item in report.inventory:
+        status = 'Critical' if item.units_available < 10 else 'Low' if item.units_available < 20 else 'Good'
+        sheet.append([item.blood_group, item.units_available, status])
+    
+    # Donations summary sheet
+    sheet = workbook.create_sheet('Donations Summary')
+    sheet.append(['Blood Group', 'Total Donations', 'Total Units'])
+    for donation in report.donations:
+        sheet.append([donation.blood_group, donation.total_donations, donation.total_units])
+    
+    # Requests summary sheet
+    sheet = workbook.create_sheet('Requests Summary')
+    sheet.append(['Blood Group', 'Total Requests', 'Total Units Required'])
+    for req in report.requests:
+        sheet.append([req.blood_group, req.total_requests, req.total_units])
+    
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {'pdf': render_pdf, 'xlsx': render_excel}
+
+
+def build_artifact(fmt, report, path):
+    """Render ``report`` and atomically write it to ``path``; returns the render time. Runs in a pool process."""
+    started = time.perf_counter()
+    content = RENDERERS[fmt](report)
+    rendered = time.perf_counter() - started
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return rendered
+
+
+def artifact_dir():
+    path = current_app.config.get('REPORT_ARTIFACT_DIR') or os.path.join(current_app.instance_path, 'reports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _digest(raw):
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def artifact_key(fmt, start_date, end_date):
+    # Report first, data version second: every build of one report shares the prefix
+    return f'{_digest(f"{fmt}:{start_date}:{end_date}")}-{_digest(str(report_data_version()))}'
+
+
+def artifact_path(key, fmt):
+    return os.path.join(artifact_dir(), f'{key}.{fmt}')
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=current_app.config.get('REPORT_WORKERS', 2))
+    return _executor
+
+
+def _claim_build(path):
+    """Create the build marker for ``path``; False if another worker is already building it."""
+    marker = f'{path}.building'
+    try:
+        fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(marker) < BUILD_TIMEOUT:
+                return False
+            os.remove(marker)
+        except FileNotFoundError:
+            pass
+        return _claim_build(path)
+    os.close(fd)
+    return True
+
+
+def _build_finished(fmt, path, max_age, future):
+    _release_build(path)
+    # Observed in the web worker: samples taken in a pool process would be lost without a metrics directory
+    if future.exception() is None:
+        observe_export_render(fmt, 'report', future.result())
+        _remove_stale_artifacts(path, max_age)
+
+
+def _remove_stale_artifacts(path, max_age):
+    """Delete the artifacts ``path`` supersedes and any built more than ``max_age`` seconds ago."""
+    directory, name = os.path.split(path)
+    report_prefix = name.split('-', 1)[0]
+    expires = time.time() - max_age
+    for fmt in FORMATS:
+        for other in glob.glob(os.path.join(directory, f'*.{fmt}')):
+            if other == path:
+                continue
+            try:
+                if (os.path.basename(other).startswith(f'{report_prefix}-')
+                        or os.path.getmtime(other) < expires):
+                    os.remove(other)
+            except FileNotFoundError:
+                pass
+
+
+def _release_build(path):
+    try:
+        os.remove(f'{path}.building')
+    except FileNotFoundError:
+        pass
+
+
+def export_status(fmt, start_date, end_date):
+    """Return ``(status, key)`` for a report, starting a background build if none exists."""
+    key = artifact_key(fmt, start_date, end_date)
+    path = artifact_path(key, fmt)
+    if os.path.exists(path):
+        return STATUS_READY, key
+
+    future = _jobs.get(key)
+    if future is not None:
+        if not future.done():
+            return STATUS_RUNNING, key
+        _jobs.pop(key)
+        if future.exception() is not None or not os.path.exists(path):
+            current_app.logger.error('Report export %s failed: %s', key, future.exception())
+            return STATUS_FAILED, key
+        return STATUS_READY, key
+
+    if _claim_build(path):
+        report = report_data(start_date, end_date)
+        future = _get_executor().submit(build_artifact, fmt, report, path)
+        max_age = current_app.config.get('REPORT_ARTIFACT_MAX_AGE', DEFAULT_ARTIFACT_MAX_AGE)
+        future.add_done_callback(lambda f: _build_finished(fmt, path, max_age, f))
+        _jobs[key] = future
+    return STATUS_RUNNING, key
@@ -0,0 +1,158 @@
+# reports.py
+"""
+Date-range report data backed by daily rollups.
+
+Donations and blood requests are folded into per-day, per-blood-group
+rollup rows as they are written, so a report over any range reads at most
+(days x 8) small rows instead of scanning the raw tables. ``report_data``
+is the single source for the reports page and both exports.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+import click
+from flask import request
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from inventory import INVENTORY_VERSION, inventory_snapshot
+from models import BloodRequest, DailyDonationRollup, DailyRequestRollup, Donation
+from versions import bump_version, get_version
+
+DEFAULT_REPORT_DAYS = 30
+
+REPORTS_VERSION = 'reports'
+
+
+class DonationTotal(NamedTuple):
+    blood_group: str
+    total_units: int
+    total_donations: int
+
+
+class RequestTotal(NamedTuple):
+    blood_group: str
+    total_units: int
+    total_requests: int
+
+
+class ReportData(NamedTuple):
+    start_date: date
+    end_date: date
+    donations: list
+    requests: list
+    inventory: tuple
+
+
+def _add_to_rollup(model, count_column, day, blood_group, units, count=1):
+    updated = db.session.execute(
+        update(model)
+        .where(model.day == day, model.blood_group == blood_group)
+        .values({count_column: getattr(model, count_column) + count, 'units': model.units + units})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(model(day=day, blood_group=blood_group, units=units, **{count_column: count}))
+        except IntegrityError:
+            _add_to_rollup(model, count_column, day, blood_group, units, count)
+
+
+def record_donation(donation):
+    bump_version(REPORTS_VERSION)
+    _add_to_rollup(DailyDonationRollup, 'donations', donation.donation_date,
+                   donation.blood_group, donation.units_donated or 0)
+
+
+def record_donation_totals(totals):
+    """Fold pre-aggregated ``{(day, blood_group): (donations, units)}`` into the rollups (bulk imports)."""
+    bump_version(REPORTS_VERSION)
+    for (day, blood_group), (count, units) in totals.items():
+        _add_to_rollup(DailyDonationRollup, 'donations', day, blood_group, units, count)
+
+
+def record_request(blood_request):
+    bump_version(REPORTS_VERSION)
+    _add_to_rollup(DailyRequestRollup, 'requests', blood_request.request_date,
+                   blood_request.blood_group, blood_request.units_required)
+
+
+def report_date_range():
+    """Read ``start``/``end`` (YYYY-MM-DD) from the query string, defaulting to the last 30 days."""
+    def parse(name):
+        try:
+            return datetime.strptime(request.args.get(name, ''), '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+    end_date = parse('end') or date.today()
+    start_date = parse('start') or end_date - timedelta(days=DEFAULT_REPORT_DAYS)
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    return start_date, end_date
+
+
+def report_data_version():
+    """A token that changes whenever any report's rollups or the inventory change."""
+    return f'{get_version(REPORTS_VERSION)}.{get_version(INVENTORY_VERSION)}'
+
+
+def report_data(start_date, end_date):
+    """Per-blood-group donation and request totals for ``start_date``..``end_date`` plus current stock."""
+    donations = db.session.query(
+        DailyDonationRollup.blood_group,
+        func.sum(DailyDonationRollup.units).label('total_units'),
+        func.sum(DailyDonationRollup.donations).label('total_donations')
+    ).filter(
+        DailyDonationRollup.day >= start_date,
+        DailyDonationRollup.day <= end_date
+    ).group_by(DailyDonationRollup.blood_group)
+
+    requests = db.session.query(
+        DailyRequestRollup.blood_group,
+        func.sum(DailyRequestRollup.units).label('total_units'),
+        func.sum(DailyRequestRollup.requests).label('total_requests')
+    ).filter(
+        DailyRequestRollup.day >= start_date,
+        DailyRequestRollup.day <= end_date
+    ).group_by(DailyRequestRollup.blood_group)
+
+    # Plain tuples so the report can be handed to an export worker process
+    return ReportData(start_date, end_date,
+                      [DonationTotal(*row) for row in donations],
+                      [RequestTotal(*row) for row in requests],
+                      inventory_snapshot())
+
+
+def backfill_rollups():
+    """Rebuild both rollup tables from the raw donation and blood_request rows."""
+    db.session.query(DailyDonationRollup).delete()
+    db.session.query(DailyRequestRollup).delete()
+    db.session.execute(insert(DailyDonationRollup).from_select(
+        ['day', 'blood_group', 'donations', 'units'],
+        select(
+            Donation.donation_date, Donation.blood_group,
+            func.count(Donation.id), func.coalesce(func.sum(Donation.units_donated), 0)
+        ).group_by(Donation.donation_date, Donation.blood_group)
+    ))
+    db.session.execute(insert(DailyRequestRollup).from_select(
+        ['day', 'blood_group', 'requests', 'units'],
+        select(
+            BloodRequest.request_date, BloodRequest.blood_group,
+            func.count(BloodRequest.id), func.coalesce(func.sum(BloodRequest.units_required), 0)
+        ).group_by(BloodRequest.request_date, BloodRequest.blood_group)
+    ))
+    bump_version(REPORTS_VERSION)
+    db.session.commit()
+    return (db.session.query(DailyDonationRollup).count(),
+            db.session.query(DailyRequestRollup).count())
+
+
+@click.command('backfill-rollups')
+def backfill_rollups_command():
+    """Rebuild the daily report rollups from raw donations and requests."""
+    donation_days, request_days = backfill_rollups()
+    click.echo(f'Rebuilt {donation_days} donation and {request_days} request rollup rows')
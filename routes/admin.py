@@ -1,43 +1,55 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response, send_file
-from extensions import db         # <-- changed her
-from models import User, BloodInventory, BloodRequest, Donation, DonationCamp
-from datetime import datetime, date, timedelta
-from sqlalchemy import func
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import pandas as pd
-import io
 import os
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, session, jsonify, send_file, send_from_directory, abort
+from extensions import db         # <-- changed her
+from models import User, BloodRequest, Donation, DonationCamp
+from datetime import datetime, date
+from sqlalchemy import update
+from sqlalchemy.orm import contains_eager, joinedload
+from broker import inventory_changed, requests_changed
+from bulk_import import IMPORTERS, STATUS_READY as IMPORT_READY, error_dir, format_for, import_status, start_import
+from compatibility import BLOOD_GROUPS
+from counters import active_users_key, get_counts, request_status_changed, requests_key
+from eligibility import donor_groups, eligible_donors
+from engine_profiles import pool_stats
+from identity import role_required
+from instrumentation import query_budget
+from inventory import REASON_APPROVAL, allocate, inventory_snapshot, set_stock, total_units
+from metrics import metrics_response, scrape_authorized
+from pagination import MAX_PAGE_SIZE, paginate_request
+from raw_exports import DATASETS, stream_csv, stream_xlsx
+from replicas import replica_reads
+from report_exports import FORMATS, STATUS_FAILED, STATUS_READY, artifact_path, export_status
+from reports import report_data, report_date_range
+from search import search_users
+from triage import BatchApprovalError, batch_approve, preview_batch, triage_queue
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-def require_admin():
-    if 'user_id' not in session or session.get('user_role') != 'admin':
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('auth.login'))
-    return None
+# URL name -> artifact file extension
+EXPORT_FORMATS = {'pdf': 'pdf', 'excel': 'xlsx'}
+
+# Pending requests listed on the triage page
+TRIAGE_QUEUE_SIZE = 50
 
 @bp.route('/dashboard')
+@query_budget(8)
+@role_required('admin')
+@replica_reads
 def dashboard():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
     # Get statistics
-    total_donors = User.query.filter_by(role='donor', is_active=True).count()
-    total_patients = User.query.filter_by(role='patient', is_active=True).count()
-    pending_requests = BloodRequest.query.filter_by(status='pending').count()
-    total_inventory = db.session.query(func.sum(BloodInventory.units_available)).scalar() or 0
+    counts = get_counts(active_users_key('donor'), active_users_key('patient'), requests_key('pending'))
+    total_donors = counts[active_users_key('donor')]
+    total_patients = counts[active_users_key('patient')]
+    pending_requests = counts[requests_key('pending')]
+    total_inventory = total_units()
     
     # Recent donations
-    recent_donations = db.session.query(Donation).join(User).order_by(Donation.created_at.desc()).limit(5).all()
+    recent_donations = db.session.query(Donation).join(Donation.donor).options(
+        contains_eager(Donation.donor)
+    ).order_by(Donation.created_at.desc()).limit(5).all()
     
     # Blood group inventory
-    inventory = BloodInventory.query.all()
+    inventory = inventory_snapshot()
     
     return render_template('admin/dashboard.html', 
                          total_donors=total_donors,
@@ -48,348 +60,359 @@ def dashboard():
                          inventory=inventory)
 
 @bp.route('/inventory')
+@query_budget(3)
+@role_required('admin')
 def inventory():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
-    inventory = BloodInventory.query.all()
+    inventory = inventory_snapshot()
     return render_template('admin/inventory.html', inventory=inventory)
 
 @bp.route('/inventory/update', methods=['POST'])
+@role_required('admin')
 def update_inventory():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
     blood_group = request.form['blood_group']
     units = int(request.form['units'])
     
-    inventory_item = BloodInventory.query.filter_by(blood_group=blood_group).first()
-    if inventory_item:
-        inventory_item.units_available = units
-    else:
-        inventory_item = BloodInventory()
-        inventory_item.blood_group = blood_group
-        inventory_item.units_available = units
-        db.session.add(inventory_item)
+    set_stock(blood_group, units, user_id=session['user_id'])
+    inventory_changed()
     
     db.session.commit()
     flash(f'Inventory updated for blood group {blood_group}', 'success')
     return redirect(url_for('admin.inventory'))
 
 @bp.route('/requests')
+@query_budget(3)
+@role_required('admin')
 def requests():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
-    requests = BloodRequest.query.order_by(BloodRequest.created_at.desc()).all()
-    return render_template('admin/requests.html', requests=requests)
+    page = paginate_request(
+        BloodRequest.query.options(joinedload(BloodRequest.patient)),
+        BloodRequest.created_at, BloodRequest.id
+    )
+    return render_template('admin/requests.html', requests=page.items, page=page)
 
 @bp.route('/requests/<int:request_id>/approve', methods=['POST'])
+@role_required('admin')
 def approve_request(request_id):
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
     blood_request = BloodRequest.query.get_or_404(request_id)
     
-    # Check if enough blood is available
-    inventory = BloodInventory.query.filter_by(blood_group=blood_request.blood_group).first()
-    if inventory and inventory.units_available >= blood_request.units_required:
-        blood_request.status = 'approved'
-        blood_request.approved_by = session['user_id']
-        blood_request.approved_date = datetime.utcnow()
-        
-        # Update inventory
-        inventory.units_available -= blood_request.units_required
-        
-        db.session.commit()
-        flash('Blood request approved successfully', 'success')
+    # Claim the request and take the stock with conditional UPDATEs, so two
+    # concurrent approvals can neither double-approve nor oversell a group
+    claimed = db.session.execute(
+        update(BloodRequest)
+        .where(BloodRequest.id == blood_request.id, BloodRequest.status == 'pending')
+        .values(status='approved', approved_by=session['user_id'], approved_date=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    
+    if not claimed:
+        db.session.rollback()
+        flash('This request has already been processed', 'error')
     else:
-        flash('Insufficient blood units available', 'error')
+        # Draw from compatible groups when the exact group is short; urgent
+        # requests may also use the O- reserve
+        reserve = 0 if blood_request.urgency == 'urgent' else current_app.config['UNIVERSAL_DONOR_RESERVE']
+        allocation = allocate(blood_request.blood_group, blood_request.units_required, REASON_APPROVAL,
+                              reserve=reserve, request_id=blood_request.id, user_id=session['user_id'])
+        if allocation:
+            request_status_changed(blood_request.patient_id, 'pending', 'approved')
+            requests_changed([(blood_request, 'approved')])
+            inventory_changed()
+            db.session.commit()
+            if allocation == [(blood_request.blood_group, blood_request.units_required)]:
+                flash('Blood request approved successfully', 'success')
+            else:
+                used = ', '.join(f'{units} x {group}' for group, units in allocation)
+                flash(f'Blood request approved using compatible stock: {used}', 'success')
+        else:
+            db.session.rollback()
+            flash('Insufficient compatible blood units available', 'error')
     
     return redirect(url_for('admin.requests'))
 
 @bp.route('/requests/<int:request_id>/reject', methods=['POST'])
+@role_required('admin')
 def reject_request(request_id):
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
     blood_request = BloodRequest.query.get_or_404(request_id)
-    blood_request.status = 'rejected'
-    blood_request.approved_by = session['user_id']
-    blood_request.approved_date = datetime.utcnow()
-    blood_request.notes = request.form.get('notes', '')
     
-    db.session.commit()
-    flash('Blood request rejected', 'info')
+    # Only pending requests can be rejected; the conditional UPDATE keeps the
+    # status counters exact when two admins act on the same request
+    claimed = db.session.execute(
+        update(BloodRequest)
+        .where(BloodRequest.id == blood_request.id, BloodRequest.status == 'pending')
+        .values(status='rejected', approved_by=session['user_id'], approved_date=datetime.utcnow(),
+                notes=request.form.get('notes', ''))
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    
+    if claimed:
+        request_status_changed(blood_request.patient_id, 'pending', 'rejected')
+        requests_changed([(blood_request, 'rejected')])
+        db.session.commit()
+        flash('Blood request rejected', 'info')
+    else:
+        db.session.rollback()
+        flash('This request has already been processed', 'error')
     return redirect(url_for('admin.requests'))
 
+@bp.route('/triage')
+@query_budget(5)
+@role_required('admin')
+def triage():
+    queue = triage_queue(TRIAGE_QUEUE_SIZE)
+    approved, unfilled = preview_batch()
+    # Request id -> planned groups, for the queue rows a batch would fill
+    plans = {pending.id: plan for pending, plan in approved}
+    return render_template('admin/triage.html', queue=queue, plans=plans,
+                           fillable=len(approved), unfilled=len(unfilled))
+
+@bp.route('/triage/approve', methods=['POST'])
+@role_required('admin')
+def triage_approve():
+    limit = request.form.get('limit', type=int)
+    try:
+        result = batch_approve(session['user_id'], limit=limit if limit and limit > 0 else None)
+    except BatchApprovalError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.triage'))
+    if result.approved:
+        flash(f'Approved {len(result.approved)} requests ({result.units_allocated} units) '
+              f'in {result.elapsed:.2f}s', 'success')
+    else:
+        flash('No pending request can be filled from current stock', 'info')
+    if result.unfilled:
+        flash(f'{len(result.unfilled)} requests could not be filled and remain pending', 'warning')
+    return redirect(url_for('admin.triage'))
+
 @bp.route('/donors')
+@query_budget(4)
+@role_required('admin')
 def donors():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
-    donors = User.query.filter_by(role='donor').all()
-    return render_template('admin/donors.html', donors=donors)
+    page, search = _list_users('donor')
+    return render_template('admin/donors.html', donors=page.items, page=page, search=search,
+                           blood_groups=BLOOD_GROUPS)
+
+@bp.route('/api/eligible-donors')
+@query_budget(10)
+@role_required('admin')
+def eligible_donors_api():
+    """Donors who can give now, for recall during shortages (``compatible=1`` adds compatible groups)."""
+    blood_group = request.args.get('blood_group', '')
+    if blood_group not in BLOOD_GROUPS:
+        return jsonify({'error': 'blood_group must be one of ' + ', '.join(BLOOD_GROUPS)}), 400
+    try:
+        on = date.fromisoformat(request.args['on']) if request.args.get('on') else None
+    except ValueError:
+        return jsonify({'error': 'on must be a YYYY-MM-DD date'}), 400
+    limit = request.args.get('limit', current_app.config.get('PAGE_SIZE', 50), type=int)
+    limit = max(1, min(limit, current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)))
+    
+    groups = donor_groups(blood_group, request.args.get('compatible') == '1')
+    donors, next_cursor = eligible_donors(groups, on=on, cursor=request.args.get('cursor'), limit=limit)
+    return jsonify({'blood_group': blood_group,
+                    'donor_groups': list(groups),
+                    'donors': [donor.to_dict() for donor in donors],
+                    'next_cursor': next_cursor})
+
+@bp.route('/api/pool-stats')
+@query_budget(0)
+@role_required('admin')
+def pool_stats_api():
+    """This worker's connection pool usage per database engine (checkouts, wait time, overflow)."""
+    return jsonify({'pid': os.getpid(), 'engines': pool_stats()})
+
+@bp.route('/metrics')
+@query_budget(3)
+def metrics():
+    """Prometheus text-format metrics for every worker (admin session or METRICS_TOKEN bearer)."""
+    if not scrape_authorized():
+        return Response('authentication required\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+    return metrics_response()
 
 @bp.route('/patients')
+@query_budget(4)
+@role_required('admin')
 def patients():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
-    patients = User.query.filter_by(role='patient').all()
-    return render_template('admin/patients.html', patients=patients)
+    page, search = _list_users('patient')
+    return render_template('admin/patients.html', patients=page.items, page=page, search=search,
+                           blood_groups=BLOOD_GROUPS)
+
+# ``status`` query parameter -> is_active filter
+USER_STATUS_FILTERS = {'active': True, 'inactive': False}
+
+def _search_args():
+    """The ``q``/``blood_group``/``status`` search parameters, unknown values dropped."""
+    return {
+        'q': request.args.get('q', '').strip(),
+        'blood_group': request.args.get('blood_group') if request.args.get('blood_group') in BLOOD_GROUPS else '',
+        'status': request.args.get('status') if request.args.get('status') in USER_STATUS_FILTERS else '',
+    }
+
+def _per_page():
+    per_page = request.args.get('per_page', current_app.config.get('PAGE_SIZE', 50), type=int)
+    return max(1, min(per_page, current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)))
+
+def _list_users(role):
+    """Newest users with ``role`` (and the blood group/status filters), or ranked full-text matches when ``q`` is given."""
+    search = _search_args()
+    if not search['q']:
+        query = User.query.filter_by(role=role)
+        if search['blood_group']:
+            query = query.filter_by(blood_group=search['blood_group'])
+        if search['status']:
+            query = query.filter_by(is_active=USER_STATUS_FILTERS[search['status']])
+        return paginate_request(query, User.created_at, User.id), search
+    page = search_users(search['q'], role=role, blood_group=search['blood_group'] or None,
+                        is_active=USER_STATUS_FILTERS.get(search['status']),
+                        cursor=request.args.get('cursor'), per_page=_per_page())
+    return page, search
+
+@bp.route('/api/users/search')
+@query_budget(4)
+@role_required('admin')
+def search_users_api():
+    """Ranked prefix search over names, usernames, emails, phones and addresses."""
+    search = _search_args()
+    role = request.args.get('role')
+    page = search_users(search['q'], role=role if role in ('admin', 'donor', 'patient') else None,
+                        blood_group=search['blood_group'] or None,
+                        is_active=USER_STATUS_FILTERS.get(search['status']),
+                        cursor=request.args.get('cursor'), per_page=_per_page())
+    return jsonify({'query': search['q'],
+                    'users': [{'id': user.id, 'username': user.username, 'full_name': user.full_name,
+                               'email': user.email, 'phone': user.phone, 'role': user.role,
+                               'blood_group': user.blood_group, 'is_active': user.is_active}
+                              for user in page.items],
+                    'next_cursor': page.next_cursor})
 
 @bp.route('/reports')
+@query_budget(5)
+@role_required('admin')
+@replica_reads
 def reports():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
     # Get date range from query parameters
-    end_date = date.today()
-    start_date = end_date - timedelta(days=30)
-    
-    # Donations in date range
-    donations = db.session.query(
-        Donation.blood_group,
-        func.sum(Donation.units_donated).label('total_units'),
-        func.count(Donation.id).label('total_donations')
-    ).filter(
-        Donation.donation_date >= start_date,
-        Donation.donation_date <= end_date
-    ).group_by(Donation.blood_group).all()
+    start_date, end_date = report_date_range()
+    data = report_data(start_date, end_date)
     
-    # Requests in date range
-    requests = db.session.query(
-        BloodRequest.blood_group,
-        func.sum(BloodRequest.units_required).label('total_units'),
-        func.count(BloodRequest.id).label('total_requests')
-    ).filter(
-        BloodRequest.request_date >= start_date,
-        BloodRequest.request_date <= end_date
-    ).group_by(BloodRequest.blood_group).all()
-    
-    # Current inventory
-    inventory = BloodInventory.query.all()
+    # An export that is still being generated, for the page to poll
+    pending_export = request.args.get('pending')
+    if pending_export not in EXPORT_FORMATS:
+        pending_export = None
     
     return render_template('admin/reports.html', 
-                         donations=donations,
-                         requests=requests,
-                         inventory=inventory,
+                         donations=data.donations,
+                         requests=data.requests,
+                         inventory=data.inventory,
                          start_date=start_date,
-                         end_date=end_date)
+                         end_date=end_date,
+                         pending_export=pending_export)
+
+def _export_report(export_format):
+    start_date, end_date = report_date_range()
+    fmt = EXPORT_FORMATS[export_format]
+    status, key = export_status(fmt, start_date, end_date)
+    
+    if status == STATUS_READY:
+        return send_file(artifact_path(key, fmt),
+                         mimetype=FORMATS[fmt],
+                         as_attachment=True,
+                         download_name=f'blood_bank_report_{start_date}_{end_date}.{fmt}',
+                         etag=key,
+                         conditional=True,
+                         max_age=0)
+    
+    if status == STATUS_FAILED:
+        flash('Report export failed, please try again', 'error')
+        return redirect(url_for('admin.reports', start=start_date, end=end_date))
+    
+    flash('Your report is being generated and will download automatically when ready.', 'info')
+    return redirect(url_for('admin.reports', start=start_date, end=end_date, pending=export_format))
 
 @bp.route('/reports/export/pdf')
+@query_budget(5)
+@role_required('admin')
+@replica_reads
 def export_reports_pdf():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
-    # Get the same data as reports page
-    end_date = date.today()
-    start_date = end_date - timedelta(days=30)
-    
-    donations = db.session.query(
-        Donation.blood_group,
-        func.sum(Donation.units_donated).label('total_units'),
-        func.count(Donation.id).label('total_donations')
-    ).filter(
-        Donation.donation_date >= start_date,
-        Donation.donation_date <= end_date
-    ).group_by(Donation.blood_group).all()
-    
-    requests = db.session.query(
-        BloodRequest.blood_group,
-        func.sum(BloodRequest.units_required).label('total_units'),
-        func.count(BloodRequest.id).label('total_requests')
-    ).filter(
-        BloodRequest.request_date >= start_date,
-        BloodRequest.request_date <= end_date
-    ).group_by(BloodRequest.blood_group).all()
-    
-    inventory = BloodInventory.query.all()
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.darkblue,
-        alignment=1  # Center alignment
-    )
-    title = Paragraph(f"Blood Bank Management Report<br/>({start_date} to {end_date})", title_style)
-    story.append(title)
-    story.append(Spacer(1, 20))
-    
-    # Current Inventory Section
-    inventory_title = Paragraph("Current Blood Inventory", styles['Heading2'])
-    story.append(inventory_title)
-    story.append(Spacer(1, 10))
-    
-    inventory_data = [['Blood Group', 'Units Available', 'Status']]
-    for item in inventory:
-        status = 'Critical' if item.units_available < 10 else 'Low' if item.units_available < 20 else 'Good'
-        inventory_data.append([item.blood_group, str(item.units_available), status])
-    
-    inventory_table = Table(inventory_data, colWidths=[2*inch, 2*inch, 2*inch])
-    inventory_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(inventory_table)
-    story.append(Spacer(1, 20))
-    
-    # Donations Section
-    donations_title = Paragraph("Donations Summary", styles['Heading2'])
-    story.append(donations_title)
-    story.append(Spacer(1, 10))
-    
-    donations_data = [['Blood Group', 'Total Donations', 'Total Units']]
-    for donation in donations:
-        donations_data.append([donation.blood_group, str(donation.total_donations), str(donation.total_units)])
-    
-    donations_table = Table(donations_data, colWidths=[2*inch, 2*inch, 2*inch])
-    donations_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(donations_table)
-    story.append(Spacer(1, 20))
-    
-    # Requests Section
-    requests_title = Paragraph("Blood Requests Summary", styles['Heading2'])
-    story.append(requests_title)
-    story.append(Spacer(1, 10))
-    
-    requests_data = [['Blood Group', 'Total Requests', 'Total Units Required']]
-    for req in requests:
-        requests_data.append([req.blood_group, str(req.total_requests), str(req.total_units)])
-    
-    requests_table = Table(requests_data, colWidths=[2*inch, 2*inch, 2*inch])
-    requests_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightcoral),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(requests_table)
-    
-    # Add footer
-    story.append(Spacer(1, 30))
-    footer = Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
-    story.append(footer)
-    
-    doc.build(story)
-    buffer.seek(0)
-    
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=blood_bank_report_{end_date}.pdf'
-    
-    return response
+    return _export_report('pdf')
 
 @bp.route('/reports/export/excel')
+@query_budget(5)
+@role_required('admin')
+@replica_reads
 def export_reports_excel():
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
-    # Get the same data as reports page
-    end_date = date.today()
-    start_date = end_date - timedelta(days=30)
-    
-    # Create a simple Excel file using pandas
-    buffer = io.BytesIO()
-    
-    # Get inventory data
-    inventory = BloodInventory.query.all()
-    inventory_data = []
-    for item in inventory:
-        status = 'Critical' if item.units_available < 10 else 'Low' if item.units_available < 20 else 'Good'
-        inventory_data.append({
-            'Blood Group': item.blood_group,
-            'Units Available': item.units_available,
-            'Status': status
-        })
-    
-    # Get donations summary
-    donations = db.session.query(
-        Donation.blood_group,
-        func.sum(Donation.units_donated).label('total_units'),
-        func.count(Donation.id).label('total_donations')
-    ).filter(
-        Donation.donation_date >= start_date,
-        Donation.donation_date <= end_date
-    ).group_by(Donation.blood_group).all()
-    
-    donations_data = []
-    for donation in donations:
-        donations_data.append({
-            'Blood Group': donation.blood_group,
-            'Total Donations': donation.total_donations,
-            'Total Units': donation.total_units
-        })
-    
-    # Get requests summary
-    requests = db.session.query(
-        BloodRequest.blood_group,
-        func.sum(BloodRequest.units_required).label('total_units'),
-        func.count(BloodRequest.id).label('total_requests')
-    ).filter(
-        BloodRequest.request_date >= start_date,
-        BloodRequest.request_date <= end_date
-    ).group_by(BloodRequest.blood_group).all()
-    
-    requests_data = []
-    for req in requests:
-        requests_data.append({
-            'Blood Group': req.blood_group,
-            'Total Requests': req.total_requests,
-            'Total Units Required': req.total_units
-        })
-    
-    # Create DataFrame and export to Excel
-    with pd.ExcelWriter(buffer, engine='openpyxl', mode='w') as writer:
-        if inventory_data:
-            pd.DataFrame(inventory_data).to_excel(writer, sheet_name='Current Inventory', index=False)
-        if donations_data:
-            pd.DataFrame(donations_data).to_excel(writer, sheet_name='Donations Summary', index=False)
-        if requests_data:
-            pd.DataFrame(requests_data).to_excel(writer, sheet_name='Requests Summary', index=False)
-    
-    buffer.seek(0)
-    
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=blood_bank_report_{end_date}.xlsx'
-    
-    return response
+    return _export_report('excel')
+
+@bp.route('/reports/export/<export_format>/status')
+@query_budget(5)
+@role_required('admin')
+@replica_reads
+def export_status_view(export_format):
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unknown export format'}), 404
+    
+    start_date, end_date = report_date_range()
+    status, key = export_status(EXPORT_FORMATS[export_format], start_date, end_date)
+    download_url = None
+    if status == STATUS_READY:
+        download_url = url_for(f'admin.export_reports_{export_format}', start=start_date, end=end_date)
+    return jsonify({'status': status, 'download_url': download_url})
+
+@bp.route('/export/<dataset>.<any(csv, xlsx):fmt>')
+@query_budget(3)
+@role_required('admin')
+@replica_reads
+def export_raw(dataset, fmt):
+    if dataset not in DATASETS:
+        abort(404)
+    
+    # Raw exports cover everything unless a date range is given
+    start_date = end_date = None
+    if request.args.get('start') or request.args.get('end'):
+        start_date, end_date = report_date_range()
+    
+    if fmt == 'csv':
+        return stream_csv(dataset, start_date, end_date)
+    return stream_xlsx(dataset, start_date, end_date)
+
+@bp.route('/import', methods=['GET', 'POST'])
+@role_required('admin')
+def bulk_import():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in IMPORTERS or not upload or not upload.filename:
+            flash('Choose what to import and a CSV or JSONL file', 'error')
+            return redirect(url_for('admin.bulk_import'))
+        
+        fmt = format_for(upload.filename, default=None)
+        if fmt is None:
+            flash('Unsupported file type, upload a .csv or .jsonl file', 'error')
+            return redirect(url_for('admin.bulk_import'))
+        # Large files take minutes: the import runs in the background and this page follows it
+        job_id = start_import(kind, upload, fmt)
+        flash('Import started, this page will update when it finishes.', 'info')
+        return redirect(url_for('admin.bulk_import', job=job_id))
+    
+    job_id = request.args.get('job')
+    job = import_status(job_id) if job_id else None
+    result = error_file = None
+    if job and job.status == IMPORT_READY:
+        result = job.result
+        if result.failed or result.duplicates:
+            error_file = os.path.basename(result.error_file)
+    return render_template('admin/import.html', job=job, job_id=job_id, result=result, error_file=error_file)
+
+@bp.route('/import/<job_id>/status')
+@role_required('admin')
+def import_status_view(job_id):
+    job = import_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown import'}), 404
+    return jsonify({'status': job.status})
+
+@bp.route('/import/errors/<path:filename>')
+@role_required('admin')
+def import_errors(filename):
+    # The directory also holds pending uploads (with passwords) and job status files
+    if not filename.endswith('-errors.csv'):
+        abort(404)
+    return send_from_directory(error_dir(), filename, as_attachment=True)
@@ -0,0 +1,170 @@
+"""
+Versioned, cacheable JSON read API (``/api/v1``) for integrations.
+
+Every response carries an ``ETag`` (and ``Last-Modified`` where a timestamp
+exists) computed from cheap validators: the inventory data version and
+``BloodInventory.last_updated``, a one-row aggregate over upcoming camps
+(including their ``updated_at``), or
+a request's status columns. A matching ``If-None-Match`` (or a fresh enough
+``If-Modified-Since``) is answered with ``304 Not Modified`` before any full
+rows are loaded or serialized, so polling clients cost one small query.
+"""
+
+import hashlib
+from datetime import date, timezone
+
+from flask import Blueprint, Response, jsonify, request, session
+from sqlalchemy import case, func
+
+from extensions import db
+from identity import api_role_required
+from instrumentation import query_budget
+from inventory import inventory_summary, versioned_inventory_snapshot
+from models import BloodRequest, DonationCamp
+from pagination import paginate_request
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _etag(*validators):
+    return hashlib.sha1('|'.join(map(str, validators)).encode()).hexdigest()[:20]
+
+
+def _not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        # HTTP dates have whole-second precision
+        modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= request.if_modified_since
+    return False
+
+
+def conditional_json(etag, last_modified, build):
+    """A JSON response from ``build()``, or an empty 304 if the client's copy is current.
+
+    ``build`` is only called when the body is actually needed.
+    """
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Session-authenticated data: shared caches must not keep it, clients revalidate every time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def request_to_dict(blood_request):
+    return {
+        'id': blood_request.id,
+        'blood_group': blood_request.blood_group,
+        'units_required': blood_request.units_required,
+        'urgency': blood_request.urgency,
+        'status': blood_request.status,
+        'reason': blood_request.reason,
+        'notes': blood_request.notes,
+        'request_date': _isoformat(blood_request.request_date),
+        'required_by': _isoformat(blood_request.required_by),
+        'approved_date': _isoformat(blood_request.approved_date),
+        'created_at': _isoformat(blood_request.created_at),
+    }
+
+
+def camp_to_dict(camp):
+    return {
+        'id': camp.id,
+        'name': camp.name,
+        'location': camp.location,
+        'camp_date': _isoformat(camp.camp_date),
+        'start_time': _isoformat(camp.start_time),
+        'end_time': _isoformat(camp.end_time),
+        'organizer': camp.organizer,
+        'contact_phone': camp.contact_phone,
+        'description': camp.description,
+    }
+
+
+@bp.route('/inventory')
+@query_budget(3)
+@api_role_required()
+def inventory():
+    """Stock per blood group, with the units each group can receive from compatible donors."""
+    # Served from the in-process snapshot: usually no query at all
+    version, snapshot = versioned_inventory_snapshot()
+    last_modified = max((item.last_updated for item in snapshot if item.last_updated), default=None)
+    return conditional_json(_etag('inventory', version, last_modified), last_modified,
+                            lambda: inventory_summary(snapshot))
+
+
+@bp.route('/camps')
+@query_budget(3)
+@api_role_required()
+def camps():
+    """Active donation camps from today on, soonest first."""
+    today = date.today()
+    upcoming = (DonationCamp.is_active == True, DonationCamp.camp_date >= today)
+    # Over active and inactive camps, so an edit or a deactivation moves updated_at;
+    # count and newest id cover rows inserted with an explicit older timestamp
+    active = case((DonationCamp.is_active == True, DonationCamp.id))
+    count, newest_id, last_modified = db.session.query(
+        func.count(active), func.max(active),
+        func.max(func.coalesce(DonationCamp.updated_at, DonationCamp.created_at))
+    ).filter(DonationCamp.camp_date >= today).one()
+
+    def build():
+        rows = DonationCamp.query.filter(*upcoming) \
+            .order_by(DonationCamp.camp_date, DonationCamp.start_time, DonationCamp.id).all()
+        return {'camps': [camp_to_dict(camp) for camp in rows]}
+
+    return conditional_json(_etag('camps', today, count, newest_id, last_modified), last_modified, build)
+
+
+@bp.route('/requests')
+@query_budget(3)
+@api_role_required('patient')
+def request_list():
+    """The logged-in patient's blood requests, newest first, keyset paginated (``cursor``, ``per_page``)."""
+    patient_id = session['user_id']
+    # Requests are created and change status (which stamps approved_date), never edited in place
+    count, newest, last_decision = db.session.query(
+        func.count(BloodRequest.id), func.max(BloodRequest.created_at), func.max(BloodRequest.approved_date)
+    ).filter(BloodRequest.patient_id == patient_id).one()
+    last_modified = max(filter(None, (newest, last_decision)), default=None)
+
+    def build():
+        page = paginate_request(BloodRequest.query.filter_by(patient_id=patient_id),
+                                BloodRequest.created_at, BloodRequest.id)
+        return {'requests': [request_to_dict(blood_request) for blood_request in page.items],
+                'next_cursor': page.next_cursor}
+
+    etag = _etag('requests', patient_id, count, newest, last_decision, request.query_string)
+    return conditional_json(etag, last_modified, build)
+
+
+@bp.route('/requests/<int:request_id>')
+@query_budget(3)
+@api_role_required('patient', 'admin')
+def request_status(request_id):
+    """One blood request's status; patients may only see their own."""
+    validators = db.session.query(
+        BloodRequest.patient_id, BloodRequest.status, BloodRequest.approved_date, BloodRequest.created_at
+    ).filter(BloodRequest.id == request_id).first()
+    if validators is None or (session.get('user_role') == 'patient' and validators.patient_id != session['user_id']):
+        return jsonify({'error': 'not found'}), 404
+    last_modified = validators.approved_date or validators.created_at
+
+    def build():
+        return {'request': request_to_dict(db.session.get(BloodRequest, request_id))}
+
+    etag = _etag('request', request_id, validators.status, validators.approved_date, validators.created_at)
+    return conditional_json(etag, last_modified, build)
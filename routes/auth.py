@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from werkzeug.security import generate_password_hash
 from extensions import db         # <-- changed her
 from models import User
+from counters import user_created
 from datetime import datetime
 
 bp = Blueprint('auth', __name__)
@@ -64,6 +65,7 @@ def register():
         user.set_password(password)
         
         db.session.add(user)
+        user_created(user)
         db.session.commit()
         
         flash('Registration successful! Please login.', 'success')
@@ -1,40 +1,38 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from extensions import db         # <-- changed her
-from models import User, Donation, DonationCamp, BloodInventory
+from models import Donation, DonationCamp, CampBooking, CampSlot
 from datetime import datetime, date
+from broker import inventory_changed
+from camps import ALREADY_BOOKED, BOOKED, bookable, book_slot, cancel_booking
+from eligibility import claim_donation
+from identity import current_user, invalidate_user_snapshot, role_required
+from instrumentation import query_budget
+from inventory import REASON_DONATION, receive_units
+from pagination import paginate_request
+from replicas import replica_reads
+from reports import record_donation
 
 bp = Blueprint('donor', __name__, url_prefix='/donor')
 
-def require_donor():
-    if 'user_id' not in session or session.get('user_role') != 'donor':
-        flash('Access denied. Donor privileges required.', 'error')
-        return redirect(url_for('auth.login'))
-    return None
-
 @bp.route('/dashboard')
+@query_budget(4)
+@role_required('donor')
+@replica_reads
 def dashboard():
-    auth_check = require_donor()
-    if auth_check:
-        return auth_check
-    
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     # Get donation statistics
-    total_donations = Donation.query.filter_by(donor_id=user.id).count()
+    total_donations = user.donation_count or 0
     recent_donations = Donation.query.filter_by(donor_id=user.id).order_by(Donation.donation_date.desc()).limit(3).all()
     
     # Get upcoming camps
     upcoming_camps = DonationCamp.query.filter(
         DonationCamp.camp_date >= date.today(),
         DonationCamp.is_active == True
-    ).order_by(DonationCamp.camp_date).limit(3).all()
+    ).order_by(DonationCamp.camp_date, DonationCamp.start_time, DonationCamp.id).limit(3).all()
     
-    # Calculate next eligible donation date (56 days after last donation)
-    last_donation = Donation.query.filter_by(donor_id=user.id).order_by(Donation.donation_date.desc()).first()
-    next_eligible_date = None
-    if last_donation:
-        from datetime import timedelta
-        next_eligible_date = last_donation.donation_date + timedelta(days=56)
+    # Next eligible donation date (56 days after last donation), kept on the donor row
+    next_eligible_date = user.next_eligible_date if user.last_donation_date else None
     
     return render_template('donor/dashboard.html',
                          user=user,
@@ -45,12 +43,10 @@ def dashboard():
                          date=date)
 
 @bp.route('/profile', methods=['GET', 'POST'])
+@query_budget(3)
+@role_required('donor')
 def profile():
-    auth_check = require_donor()
-    if auth_check:
-        return auth_check
-    
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     if request.method == 'POST':
         user.full_name = request.form['full_name']
@@ -60,43 +56,43 @@ def profile():
         user.blood_group = request.form['blood_group']
         
         db.session.commit()
+        invalidate_user_snapshot(user.id)
         flash('Profile updated successfully', 'success')
         return redirect(url_for('donor.profile'))
     
     return render_template('donor/profile.html', user=user)
 
 @bp.route('/history')
+@query_budget(3)
+@role_required('donor')
 def history():
-    auth_check = require_donor()
-    if auth_check:
-        return auth_check
-    
-    user = User.query.get(session['user_id'])
-    donations = Donation.query.filter_by(donor_id=user.id).order_by(Donation.donation_date.desc()).all()
-    
-    return render_template('donor/history.html', donations=donations)
+    user = current_user()
+    page = paginate_request(Donation.query.filter_by(donor_id=user.id),
+                            Donation.donation_date, Donation.id)
+    
+    # Totals cover the whole history, not just the current page
+    return render_template('donor/history.html',
+                         donations=page.items,
+                         page=page,
+                         total_donations=user.donation_count or 0,
+                         total_units=user.lifetime_units or 0)
 
 @bp.route('/donate', methods=['POST'])
+@role_required('donor')
 def donate():
-    auth_check = require_donor()
-    if auth_check:
-        return auth_check
+    user = current_user()
     
-    user = User.query.get(session['user_id'])
-    
-    # Check if user is eligible (last donation was at least 56 days ago)
-    last_donation = Donation.query.filter_by(donor_id=user.id).order_by(Donation.donation_date.desc()).first()
-    if last_donation:
-        from datetime import timedelta
-        days_since_last = (date.today() - last_donation.donation_date).days
-        if days_since_last < 56:
-            flash(f'You can donate again in {56 - days_since_last} days', 'error')
-            return redirect(url_for('donor.dashboard'))
+    # Check and record eligibility in one conditional UPDATE (last donation at least 56 days ago)
+    today = date.today()
+    if not claim_donation(user.id, today, 1):
+        db.session.rollback()
+        flash(f'You can donate again in {(user.next_eligible_date - today).days} days', 'error')
+        return redirect(url_for('donor.dashboard'))
     
     # Create donation record
     donation = Donation(
         donor_id=user.id,
-        donation_date=date.today(),
+        donation_date=today,
         units_donated=1,
         blood_group=user.blood_group,
         hemoglobin_level=float(request.form.get('hemoglobin', 12.5)),
@@ -104,15 +100,85 @@ def donate():
     )
     
     db.session.add(donation)
+    db.session.flush()
+    record_donation(donation)
     
-    # Update blood inventory
-    inventory = BloodInventory.query.filter_by(blood_group=user.blood_group).first()
-    if inventory:
-        inventory.units_available += 1
-    else:
-        inventory = BloodInventory(blood_group=user.blood_group, units_available=1)
-        db.session.add(inventory)
+    # Add the collected bags to blood inventory
+    receive_units(user.blood_group, donation.units_donated, REASON_DONATION, collected_on=donation.donation_date,
+                  donation_id=donation.id, user_id=user.id)
+    inventory_changed()
     
     db.session.commit()
     flash('Thank you for your donation!', 'success')
     return redirect(url_for('donor.dashboard'))
+
+# Upcoming camps listed on the camps page
+CAMP_LIST_LIMIT = 50
+
+@bp.route('/camps')
+@query_budget(3)
+@role_required('donor')
+def camps():
+    today = date.today()
+    upcoming_camps = DonationCamp.query.filter(
+        DonationCamp.camp_date >= today,
+        DonationCamp.is_active == True
+    ).order_by(DonationCamp.camp_date, DonationCamp.start_time, DonationCamp.id).limit(CAMP_LIST_LIMIT).all()
+    
+    # The donor's own upcoming appointments
+    bookings = db.session.query(CampBooking.id, DonationCamp.name, DonationCamp.location, DonationCamp.camp_date,
+                                CampSlot.starts_at, CampSlot.ends_at) \
+        .join(CampSlot, CampSlot.id == CampBooking.slot_id) \
+        .join(DonationCamp, DonationCamp.id == CampBooking.camp_id) \
+        .filter(CampBooking.donor_id == session['user_id'], DonationCamp.camp_date >= today) \
+        .order_by(DonationCamp.camp_date, CampSlot.starts_at).all()
+    
+    return render_template('donor/camps.html', camps=upcoming_camps, bookings=bookings)
+
+@bp.route('/camps/<int:camp_id>')
+@query_budget(4)
+@role_required('donor')
+def camp(camp_id):
+    camp = db.get_or_404(DonationCamp, camp_id)
+    slots = CampSlot.query.filter_by(camp_id=camp.id).order_by(CampSlot.starts_at).all()
+    booking = CampBooking.query.filter_by(donor_id=session['user_id'], camp_id=camp.id).first()
+    return render_template('donor/camp.html', camp=camp, slots=slots, booking=booking,
+                         open_for_booking=bookable(camp))
+
+@bp.route('/camps/<int:camp_id>/book', methods=['POST'])
+@role_required('donor')
+def book(camp_id):
+    user = current_user()
+    camp = db.get_or_404(DonationCamp, camp_id)
+    if not bookable(camp):
+        flash('This camp is no longer taking appointments', 'error')
+        return redirect(url_for('donor.camps'))
+    if user.next_eligible_date and user.next_eligible_date > camp.camp_date:
+        flash(f'You can donate again from {user.next_eligible_date.strftime("%Y-%m-%d")}, after this camp', 'error')
+        return redirect(url_for('donor.camp', camp_id=camp.id))
+    
+    # One conditional UPDATE takes the place; the unique index stops a second booking at the same camp
+    outcome = book_slot(user.id, camp.id, request.form.get('slot_id', type=int))
+    if outcome != BOOKED:
+        db.session.rollback()
+        if outcome == ALREADY_BOOKED:
+            flash('You already have an appointment at this camp', 'error')
+        else:
+            flash('That slot has just been filled, please choose another', 'error')
+        return redirect(url_for('donor.camp', camp_id=camp.id))
+    
+    db.session.commit()
+    flash('Your appointment is booked', 'success')
+    return redirect(url_for('donor.camp', camp_id=camp.id))
+
+@bp.route('/bookings/<int:booking_id>/cancel', methods=['POST'])
+@role_required('donor')
+def cancel(booking_id):
+    if not cancel_booking(session['user_id'], booking_id):
+        db.session.rollback()
+        flash('Appointment not found', 'error')
+        return redirect(url_for('donor.camps'))
+    
+    db.session.commit()
+    flash('Your appointment has been cancelled', 'success')
+    return redirect(url_for('donor.camps'))
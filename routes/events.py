@@ -0,0 +1,54 @@
+import time
+
+from flask import Blueprint, Response, current_app, request, session, stream_with_context
+
+from broker import broker, channels_for, inventory_message, latest_event_id, replay
+from extensions import db
+from identity import api_role_required
+
+bp = Blueprint('events', __name__, url_prefix='/events')
+
+# Seconds between keep-alive comments, so proxies do not close an idle stream
+HEARTBEAT_INTERVAL = 15
+# Milliseconds the browser waits before reconnecting a closed stream
+RECONNECT_DELAY = 3000
+
+@bp.route('/stream')
+@api_role_required()
+def stream():
+    """Server-Sent Events: current stock first, then inventory and request-status changes.
+
+    Each stream is closed after ``EVENT_STREAM_TIMEOUT`` seconds (or when the
+    client falls too far behind); the browser reconnects with
+    ``Last-Event-ID`` and picks up where it left off.
+    """
+    app = current_app._get_current_object()
+    channels = channels_for(session['user_id'], session['user_role'])
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = latest_event_id()
+    timeout = app.config.get('EVENT_STREAM_TIMEOUT', 300)
+
+    def generate():
+        subscription = broker.subscribe(app, channels, last_id)
+        try:
+            yield f'retry: {RECONNECT_DELAY}\n\n'
+            yield inventory_message().to_sse()
+            for message in replay(channels, last_id):
+                subscription.mark_replayed(message.id)
+                yield message.to_sse()
+            # Do not hold a pooled connection for the life of the stream
+            db.session.remove()
+
+            deadline = time.monotonic() + timeout
+            while not subscription.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = subscription.get(min(HEARTBEAT_INTERVAL, remaining))
+                yield message.to_sse() if message else ': keep-alive\n\n'
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
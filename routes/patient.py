@@ -1,49 +1,55 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from extensions import db         # <-- changed her
-from models import User, BloodRequest, BloodInventory
+from models import BloodRequest
 from datetime import datetime, date
+from broker import requests_changed
+from compatibility import DONOR_MASK, availability_matrix, groups_in
+from counters import get_counts, request_created, requests_key
+from identity import current_user, invalidate_user_snapshot, role_required
+from instrumentation import query_budget
+from inventory import inventory_snapshot
+from pagination import paginate_request
+from replicas import replica_reads
+from reports import record_request
 
 bp = Blueprint('patient', __name__, url_prefix='/patient')
 
-def require_patient():
-    if 'user_id' not in session or session.get('user_role') != 'patient':
-        flash('Access denied. Patient privileges required.', 'error')
-        return redirect(url_for('auth.login'))
-    return None
+def patient_request_counts(patient_id):
+    counts = get_counts(*(requests_key(status, patient_id) for status in ('total', 'pending', 'approved')))
+    return {
+        'total_requests': counts[requests_key('total', patient_id)],
+        'pending_requests': counts[requests_key('pending', patient_id)],
+        'approved_requests': counts[requests_key('approved', patient_id)],
+    }
 
 @bp.route('/dashboard')
+@query_budget(7)
+@role_required('patient')
+@replica_reads
 def dashboard():
-    auth_check = require_patient()
-    if auth_check:
-        return auth_check
-    
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     # Get request statistics
-    total_requests = BloodRequest.query.filter_by(patient_id=user.id).count()
-    pending_requests = BloodRequest.query.filter_by(patient_id=user.id, status='pending').count()
-    approved_requests = BloodRequest.query.filter_by(patient_id=user.id, status='approved').count()
+    counts = patient_request_counts(user.id)
     
     # Get recent requests
     recent_requests = BloodRequest.query.filter_by(patient_id=user.id).order_by(BloodRequest.created_at.desc()).limit(5).all()
     
-    # Get blood availability
-    inventory = BloodInventory.query.all()
+    # Get blood availability, including stock of groups the patient can receive
+    availability = availability_matrix(inventory_snapshot())
     
     return render_template('patient/dashboard.html',
                          user=user,
-                         total_requests=total_requests,
-                         pending_requests=pending_requests,
-                         approved_requests=approved_requests,
                          recent_requests=recent_requests,
-                         inventory=inventory)
+                         availability=availability,
+                         compatible_groups=groups_in(DONOR_MASK.get(user.blood_group, 0)),
+                         **counts)
 
 @bp.route('/request', methods=['GET', 'POST'])
+# POST also maintains counters and rollups, each of which may need to create its row
+@query_budget(20)
+@role_required('patient')
 def request_blood():
-    auth_check = require_patient()
-    if auth_check:
-        return auth_check
-    
     if request.method == 'POST':
         blood_group = request.form['blood_group']
         units_required = int(request.form['units_required'])
@@ -65,34 +71,39 @@ def request_blood():
         )
         
         db.session.add(blood_request)
+        db.session.flush()
+        request_created(blood_request)
+        record_request(blood_request)
+        requests_changed([(blood_request, 'pending')])
         db.session.commit()
         
         flash('Blood request submitted successfully', 'success')
         return redirect(url_for('patient.requests'))
     
     # Get available blood groups from inventory
-    inventory = BloodInventory.query.filter(BloodInventory.units_available > 0).all()
+    inventory = [item for item in inventory_snapshot() if item.units_available > 0]
     
     return render_template('patient/request.html', inventory=inventory)
 
 @bp.route('/requests')
+@query_budget(4)
+@role_required('patient')
 def requests():
-    auth_check = require_patient()
-    if auth_check:
-        return auth_check
+    user = current_user()
+    page = paginate_request(BloodRequest.query.filter_by(patient_id=user.id),
+                            BloodRequest.created_at, BloodRequest.id)
     
-    user = User.query.get(session['user_id'])
-    requests = BloodRequest.query.filter_by(patient_id=user.id).order_by(BloodRequest.created_at.desc()).all()
-    
-    return render_template('patient/requests.html', requests=requests)
+    # Totals cover every request, not just the current page
+    return render_template('patient/requests.html',
+                         requests=page.items,
+                         page=page,
+                         **patient_request_counts(user.id))
 
 @bp.route('/profile', methods=['GET', 'POST'])
+@query_budget(3)
+@role_required('patient')
 def profile():
-    auth_check = require_patient()
-    if auth_check:
-        return auth_check
-    
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     if request.method == 'POST':
         user.full_name = request.form['full_name']
@@ -102,6 +113,7 @@ def profile():
         user.blood_group = request.form['blood_group']
         
         db.session.commit()
+        invalidate_user_snapshot(user.id)
         flash('Profile updated successfully', 'success')
         return redirect(url_for('patient.profile'))
     
@@ -0,0 +1,183 @@
+# search.py
+"""
+Full-text search over users.
+
+Matches every term of the query as a prefix against ``full_name``,
+``username``, ``email``, ``phone`` and ``address``, best matches first. The
+backend is picked from ``SQLALCHEMY_DATABASE_URI``:
+
+* SQLite: the ``user_search`` FTS5 table (external content, kept in sync by
+  triggers, see models.py), ranked with column-weighted bm25.
+* PostgreSQL: ``USER_SEARCH_VECTOR`` @@ ``to_tsquery``, served by the
+  ``idx_user_search`` GIN index and ranked with ``ts_rank_cd``.
+* Anything else: a LIKE scan, correct but unranked.
+
+Results are paged with a keyset cursor on ``(score, id)``, lower score
+first, so later pages cost the same as the first. Ranking has to score every
+match, so a query matching more than ``RANK_LIMIT`` users is listed in id
+order instead, which the index can serve one page at a time.
+"""
+
+import base64
+import re
+
+import click
+from flask import current_app
+from sqlalchemy import func, literal, or_, text
+from sqlalchemy.engine import make_url
+
+from extensions import db
+from models import USER_SEARCH_COLUMNS, USER_SEARCH_DDL, USER_SEARCH_VECTOR, User
+from pagination import KeysetPage
+
+# Letters and digits; everything else (spaces, @, -, _, .) separates terms
+TERM = re.compile(r'[^\W_]+')
+MAX_TERMS = 8
+
+# Queries matching more users than this are listed in id order rather than ranked
+RANK_LIMIT = 2000
+
+# bm25 weight per USER_SEARCH_COLUMNS entry: names beat contact details beat
+# addresses; the trailing role column only filters
+SQLITE_WEIGHTS = (10.0, 5.0, 5.0, 2.0, 1.0, 0.0)
+
+
+def search_backend():
+    return make_url(current_app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+
+
+def search_terms(query):
+    return TERM.findall((query or '').lower())[:MAX_TERMS]
+
+
+def encode_cursor(score, row_id):
+    raw = f'{score!r}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(score, row_id)`` or ``None`` for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, row_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        return float(score), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _filters(blood_group, is_active, params):
+    clauses = []
+    for column, value in (('blood_group', blood_group), ('is_active', is_active)):
+        if value is not None:
+            clauses.append(f'u.{column} = :{column}')
+            params[column] = value
+    return ''.join(f' AND {clause}' for clause in clauses)
+
+
+def _match_sql(backend, terms, role, params):
+    """FROM/WHERE matching every term as a prefix, and the backend's relevance expression."""
+    if backend == 'sqlite':
+        columns = '{' + ' '.join(USER_SEARCH_COLUMNS) + '}'
+        clauses = [f'{columns} : "{term}"*' for term in terms]
+        if role is not None:
+            escaped = role.replace('"', '""')
+            clauses.append(f'role : "{escaped}"')
+        params['match'] = ' AND '.join(clauses)
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        return ('FROM user_search JOIN user u ON u.id = user_search.rowid WHERE user_search MATCH :match',
+                f'bm25(user_search, {weights})')
+    params['match'] = ' & '.join(f'{term}:*' for term in terms)
+    matches = f"FROM \"user\" u WHERE ({USER_SEARCH_VECTOR}) @@ to_tsquery('simple', :match)"
+    if role is not None:
+        params['role'] = role
+        matches += ' AND u.role = :role'
+    return matches, f"-ts_rank_cd({USER_SEARCH_VECTOR}, to_tsquery('simple', :match))"
+
+
+def _ranked_ids(backend, terms, role, blood_group, is_active, position, limit):
+    params = {'limit': limit, 'cap': RANK_LIMIT + 1}
+    matches, relevance = _match_sql(backend, terms, role, params)
+    # Ranking costs a few microseconds per match; a broad query ("j", a shared
+    # area code) is listed in id order instead, which stops after one page
+    broad = db.session.execute(
+        text(f'SELECT count(*) FROM (SELECT 1 {matches} LIMIT :cap) AS m'), params
+    ).scalar() > RANK_LIMIT
+    matches += _filters(blood_group, is_active, params)
+
+    if broad:
+        if position:
+            params['after_id'] = position[1]
+            matches += ' AND u.id > :after_id'
+        # FTS5 yields matches in rowid order, so SQLite stops after one page
+        order = 'user_search.rowid' if backend == 'sqlite' else 'u.id'
+        return db.session.execute(
+            text(f'SELECT u.id, 0.0 AS score {matches} ORDER BY {order} LIMIT :limit'), params
+        ).all()
+
+    after = ''
+    if position:
+        params['after_score'], params['after_id'] = position
+        after = 'WHERE s.score > :after_score OR (s.score = :after_score AND s.id > :after_id) '
+    return db.session.execute(
+        text(f'SELECT s.id, s.score FROM (SELECT u.id AS id, {relevance} AS score {matches}) AS s '
+             f'{after}ORDER BY s.score, s.id LIMIT :limit'),
+        params
+    ).all()
+
+
+def _like_ids(terms, role, blood_group, is_active, position, limit):
+    query = db.session.query(User.id, literal(0.0))
+    for term in terms:
+        query = query.filter(or_(*(getattr(User, column).ilike(f'%{term}%') for column in USER_SEARCH_COLUMNS)))
+    for column, value in (('role', role), ('blood_group', blood_group), ('is_active', is_active)):
+        if value is not None:
+            query = query.filter(getattr(User, column) == value)
+    if position:
+        query = query.filter(User.id > position[1])
+    return query.order_by(User.id).limit(limit).all()
+
+
+def search_users(query, role=None, blood_group=None, is_active=None, cursor=None, per_page=50):
+    """One page of users matching every term of ``query`` as a prefix, best first.
+
+    Returns a ``KeysetPage`` of ``User`` rows; filters left as ``None`` are
+    not applied.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return KeysetPage([], per_page)
+    position = decode_cursor(cursor) if cursor else None
+
+    backend = search_backend()
+    if backend in ('sqlite', 'postgresql'):
+        rows = _ranked_ids(backend, terms, role, blood_group, is_active, position, per_page + 1)
+    else:
+        rows = _like_ids(terms, role, blood_group, is_active, position, per_page + 1)
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    users = {user.id: user for user in User.query.filter(User.id.in_([row[0] for row in rows]))} if rows else {}
+    items = [users[row_id] for row_id, _ in rows if row_id in users]
+    next_cursor = encode_cursor(float(rows[-1][1]), rows[-1][0]) if has_more else None
+    return KeysetPage(items, per_page, next_cursor=next_cursor)
+
+
+def build_search_index():
+    """Create the search index on an existing database and fill it from the user table."""
+    backend = search_backend()
+    if backend == 'sqlite':
+        for statement in USER_SEARCH_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO user_search(user_search) VALUES ('rebuild')"))
+    elif backend == 'postgresql':
+        for index in User.__table__.indexes:
+            if index.name == 'idx_user_search':
+                index.create(db.session.connection(), checkfirst=True)
+    db.session.commit()
+    return db.session.query(func.count(User.id)).scalar()
+
+
+@click.command('build-search-index')
+def build_search_index_command():
+    """Create and fill the user full-text search index (existing databases)."""
+    click.echo(f'Indexed {build_search_index()} users for search ({search_backend()})')
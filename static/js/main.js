@@ -36,6 +36,9 @@ document.addEventListener('DOMContentLoaded', function() {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
 
+    // Live stock and request-status updates for pages that show them
+    startLiveUpdates();
+
     // Confirmation dialogs for important actions
     const confirmButtons = document.querySelectorAll('[data-confirm]');
     confirmButtons.forEach(function(button) {
@@ -64,10 +67,86 @@ function showBloodCompatibility(bloodGroup) {
     console.log(`Blood group ${bloodGroup} compatibility:`, compatibility[bloodGroup]);
 }
 
-// Function to update blood inventory display
-function updateInventoryDisplay() {
-    // This can be used for real-time inventory updates
-    console.log('Updating inventory display...');
+// Widgets that live updates patch in place
+const LIVE_SELECTOR = '[data-live-units], [data-live-compatible], [data-live-total-units], ' +
+    '[data-live-pending-requests], [data-live-request-status]';
+
+const STATUS_BADGES = { pending: 'bg-warning', approved: 'bg-success', rejected: 'bg-danger' };
+
+// Subscribe to the server's event stream when the page has live widgets
+function startLiveUpdates() {
+    const streamUrl = document.body.dataset.eventStream;
+    if (!streamUrl || !window.EventSource || !document.querySelector(LIVE_SELECTOR)) {
+        return;
+    }
+    // The browser reconnects on its own, resuming from the last event id
+    const source = new EventSource(streamUrl);
+    source.addEventListener('inventory', function(event) {
+        updateInventoryDisplay(JSON.parse(event.data));
+    });
+    source.addEventListener('request', function(event) {
+        updateRequestStatus(JSON.parse(event.data));
+    });
+}
+
+function setLiveText(selector, value) {
+    document.querySelectorAll(selector).forEach(function(element) {
+        element.textContent = value;
+    });
+}
+
+// Patch stock figures in place from an inventory summary
+function updateInventoryDisplay(summary) {
+    summary.inventory.forEach(function(item) {
+        const group = CSS.escape(item.blood_group);
+        setLiveText(`[data-live-units="${group}"]`, item.units_available);
+        setLiveText(`[data-live-compatible="${group}"]`, item.compatible_units);
+        if (item.last_updated) {
+            setLiveText(`[data-live-updated="${group}"]`, item.last_updated.slice(0, 16).replace('T', ' '));
+        }
+    });
+    setLiveText('[data-live-total-units]', summary.total_units);
+}
+
+// Replace a request's status badge, and the admin pending count
+function updateRequestStatus(change) {
+    document.querySelectorAll(`[data-live-request-status="${change.id}"]`).forEach(function(cell) {
+        const badge = document.createElement('span');
+        badge.className = 'badge ' + (STATUS_BADGES[change.status] || 'bg-info');
+        badge.textContent = change.status.charAt(0).toUpperCase() + change.status.slice(1);
+        cell.replaceChildren(badge);
+    });
+    if (change.pending_requests !== undefined) {
+        setLiveText('[data-live-pending-requests]', change.pending_requests);
+    }
+}
+
+// Poll a report export status URL and start the download once it is ready
+function pollReportExport(statusUrl, interval = 1500) {
+    fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(function(response) { return response.json(); })
+        .then(function(job) {
+            if (job.status === 'ready') {
+                window.location = job.download_url;
+            } else if (job.status === 'running') {
+                setTimeout(function() { pollReportExport(statusUrl, interval); }, interval);
+            } else {
+                console.error('Report export failed');
+            }
+        });
+}
+
+// Reload the import page once its background job has finished
+function pollImportJob(statusUrl, interval = 2000) {
+    fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(function(response) { return response.json(); })
+        .then(function(job) {
+            if (job.status === 'running') {
+                setTimeout(function() { pollImportJob(statusUrl, interval); }, interval);
+            } else {
+                window.location.reload();
+            }
+        });
 }
 
 // Function to format dates consistently
@@ -0,0 +1,300 @@
+# synthetic_data.py
+"""
+Seeded synthetic data at production scale, for load tests and plan checks.
+
+``generate(scale, seed)`` adds donors, patients, donations, blood requests
+and donation camps on top of the sample data from ``init_db.py``. At scale
+1.0 that is 100k donors, 20k patients, ~300k donations, ~60k requests and
+500 camps; the row counts grow linearly with ``scale``. Blood groups follow
+population frequencies, donations respect the 56-day interval and lean
+towards weekdays and away from holiday periods, and recent requests are
+still pending while older ones have been decided. The same seed always
+produces the same data.
+
+Rows are written with multi-row Core INSERTs in batches, and every account
+shares one pre-computed password hash, so generation is bound by the
+database rather than by Python or by password hashing.
+"""
+
+import random
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as clock
+from itertools import accumulate
+
+from sqlalchemy import func, select, text
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import BloodRequest, Donation, DonationCamp, User
+
+DEFAULT_SEED = 42
+
+BATCH_SIZE = 10000
+
+# Rows generated per 1.0 of scale (donations and requests on average)
+PER_SCALE = {
+    'donors': 100000,
+    'patients': 20000,
+    'donations': 300000,
+    'requests': 60000,
+    'camps': 500,
+}
+
+# Share (%) of each blood group in the population
+BLOOD_GROUP_FREQUENCIES = {
+    'O+': 37.4, 'A+': 35.7, 'B+': 8.5, 'O-': 6.6,
+    'A-': 6.3, 'AB+': 3.4, 'B-': 1.5, 'AB-': 0.6,
+}
+
+URGENCY_WEIGHTS = {'normal': 60, 'urgent': 25, 'low': 15}
+# Days from request to required-by date for each urgency
+REQUIRED_WITHIN = {'urgent': 1, 'normal': 7, 'low': 14}
+UNITS_WEIGHTS = {1: 50, 2: 30, 3: 15, 4: 5}
+
+# Relative activity Monday..Sunday: busiest mid-week and Saturday, quiet on Sunday
+WEEKDAY_WEIGHTS = (1.0, 1.1, 1.1, 1.0, 0.9, 1.2, 0.4)
+# Summer holidays and the end of the year are quiet
+MONTH_WEIGHTS = (1.0, 1.0, 1.0, 1.0, 1.0, 0.9, 0.75, 0.75, 1.0, 1.0, 1.0, 0.7)
+
+HISTORY_DAYS = 3 * 365
+REQUEST_HISTORY_DAYS = 2 * 365
+MIN_DONATION_INTERVAL = 56
+# Share of donors who registered but never gave
+NEVER_DONATED = 0.2
+# Requests younger than this are mostly still pending
+PENDING_WINDOW = 14
+
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas',
+               'Sarah', 'Daniel', 'Karen', 'Aisha', 'Wei', 'Priya', 'Carlos', 'Fatima', 'Ivan', 'Yuki')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Taylor', 'Thomas', 'Moore',
+              'Patel', 'Nguyen', 'Kim', 'Okafor', 'Ivanova', 'Tanaka', 'Silva', 'Khan', 'Cohen')
+STREETS = ('Main St', 'Oak Ave', 'Pine Rd', 'Elm St', 'Maple Dr', 'Cedar Ln', 'Lake View', 'Hill Rd')
+REASONS = ('Scheduled surgery', 'Accident trauma', 'Anemia treatment', 'Childbirth complications',
+           'Cancer treatment', 'Thalassemia transfusion', 'Cardiac surgery', 'Organ transplant')
+ORGANIZERS = ('Red Cross', 'City Hospital', 'University Health Services', 'Rotary Club',
+              'Community Health Trust', 'St. Mary Medical Center')
+VENUES = ('Community Center', 'Town Hall', 'University Campus', 'Shopping Mall', 'Sports Arena',
+          'Public Library', 'Tech Park', 'High School Gym')
+
+
+class Generator:
+    def __init__(self, scale, seed=DEFAULT_SEED, admin_id=None, today=None):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.admin_id = admin_id
+        self.today = today or date.today()
+        self.password_hash = generate_password_hash('password123')
+        self.counts = dict.fromkeys(('donors', 'patients', 'donations', 'requests', 'camps'), 0)
+
+        self.blood_groups = list(BLOOD_GROUP_FREQUENCIES)
+        self.blood_group_weights = list(accumulate(BLOOD_GROUP_FREQUENCIES.values()))
+        self.donation_days, self.donation_day_weights = self._day_distribution(HISTORY_DAYS)
+        self.request_days, self.request_day_weights = self._day_distribution(REQUEST_HISTORY_DAYS, growth=0.5)
+
+    def _day_distribution(self, days, growth=0.3):
+        """Days in the last ``days`` with cumulative weights for weekday, season and growth."""
+        history = [self.today - timedelta(days=offset) for offset in range(days, -1, -1)]
+        weights = [
+            WEEKDAY_WEIGHTS[day.weekday()] * MONTH_WEIGHTS[day.month - 1] * (1 - growth + growth * index / days)
+            for index, day in enumerate(history)
+        ]
+        return history, list(accumulate(weights))
+
+    def _blood_group(self):
+        return self.rng.choices(self.blood_groups, cum_weights=self.blood_group_weights)[0]
+
+    def _person(self, user_id, role, min_age, max_age, created_on):
+        rng = self.rng
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return {
+            'id': user_id,
+            'username': f'{role}{user_id:07d}',
+            'email': f'{first.lower()}.{last.lower()}.{user_id}@example.org',
+            'password_hash': self.password_hash,
+            'role': role,
+            'full_name': f'{first} {last}',
+            'phone': f'555-{rng.randrange(10000):04d}',
+            'address': f'{rng.randrange(1, 9999)} {rng.choice(STREETS)}, City, State',
+            'blood_group': self._blood_group(),
+            'date_of_birth': self.today - timedelta(days=rng.randrange(min_age * 365, max_age * 365)),
+            'gender': rng.choice(('male', 'female')),
+            'created_at': self._moment(created_on),
+            'is_active': rng.random() > 0.02,
+        }
+
+    def _moment(self, day, first_hour=8, last_hour=18):
+        """A datetime on ``day`` during opening hours."""
+        seconds = self.rng.randrange(first_hour * 3600, last_hour * 3600)
+        return datetime.combine(day, clock()) + timedelta(seconds=seconds)
+
+    def _visit_dates(self, count, days, weights):
+        """``count`` weighted days in ascending order, at least the donation interval apart.
+
+        A day too close to the previous one is pushed back past the interval;
+        visits that would then fall in the future are dropped.
+        """
+        chosen = sorted(self.rng.choices(days, cum_weights=weights, k=count))
+        dates = []
+        for day in chosen:
+            if dates and (day - dates[-1]).days < MIN_DONATION_INTERVAL:
+                day = dates[-1] + timedelta(days=MIN_DONATION_INTERVAL + self.rng.randrange(30))
+                if day > self.today:
+                    break
+            dates.append(day)
+        return dates
+
+    def donors(self, first_id, count):
+        """Yield ``(user_row, donation_rows)`` per donor."""
+        rng = self.rng
+        mean = PER_SCALE['donations'] / PER_SCALE['donors'] / (1 - NEVER_DONATED)
+        for user_id in range(first_id, first_id + count):
+            visits = 0 if rng.random() < NEVER_DONATED else 1 + round(rng.expovariate(1 / (mean - 1)))
+            dates = self._visit_dates(visits, self.donation_days, self.donation_day_weights)
+            joined = (dates[0] if dates else rng.choices(self.donation_days,
+                                                         cum_weights=self.donation_day_weights)[0])
+            joined -= timedelta(days=rng.randrange(0, 120))
+            user = self._person(user_id, 'donor', 18, 65, joined)
+            donations = [{
+                'donor_id': user_id,
+                'donation_date': day,
+                'units_donated': 1,
+                'blood_group': user['blood_group'],
+                'status': 'completed' if rng.random() > 0.01 else 'cancelled',
+                'hemoglobin_level': round(rng.gauss(14.0, 1.2), 1),
+                'notes': None,
+                'created_at': self._moment(day),
+            } for day in dates]
+            yield user, donations
+
+    def patients(self, first_id, count):
+        """Yield ``(user_row, request_rows)`` per patient."""
+        rng = self.rng
+        mean = PER_SCALE['requests'] / PER_SCALE['patients']
+        urgencies, urgency_weights = list(URGENCY_WEIGHTS), list(URGENCY_WEIGHTS.values())
+        units, units_weights = list(UNITS_WEIGHTS), list(UNITS_WEIGHTS.values())
+        for user_id in range(first_id, first_id + count):
+            visits = max(1, round(rng.expovariate(1 / mean)))
+            dates = sorted(rng.choices(self.request_days, cum_weights=self.request_day_weights, k=visits))
+            user = self._person(user_id, 'patient', 1, 90, dates[0] - timedelta(days=rng.randrange(0, 30)))
+            requests = []
+            for day in dates:
+                urgency = rng.choices(urgencies, urgency_weights)[0]
+                row = {
+                    'patient_id': user_id,
+                    'blood_group': user['blood_group'],
+                    'units_required': rng.choices(units, units_weights)[0],
+                    'urgency': urgency,
+                    'reason': rng.choice(REASONS),
+                    'status': 'pending',
+                    'request_date': day,
+                    'required_by': day + timedelta(days=REQUIRED_WITHIN[urgency]),
+                    'approved_by': None,
+                    'approved_date': None,
+                    'notes': None,
+                    'created_at': self._moment(day, 0, 24),
+                }
+                pending_share = 0.7 if (self.today - day).days < PENDING_WINDOW else 0.0
+                decision = rng.random()
+                if decision >= pending_share:
+                    approved = decision < pending_share + (1 - pending_share) * 0.85
+                    row.update(status='approved' if approved else 'rejected',
+                               approved_by=self.admin_id,
+                               approved_date=row['created_at'] + timedelta(hours=rng.expovariate(1 / 6)))
+                    if not approved:
+                        row['notes'] = 'Insufficient blood available at the time'
+                requests.append(row)
+            yield user, requests
+
+    def camps(self, count):
+        rng = self.rng
+        horizon = 90
+        for _ in range(count):
+            day = self.today + timedelta(days=rng.randrange(-HISTORY_DAYS, horizon))
+            # Camps are mostly held at weekends
+            if rng.random() < 0.7:
+                day += timedelta(days=(5 - day.weekday()) % 7 + rng.randrange(2))
+            venue, organizer = rng.choice(VENUES), rng.choice(ORGANIZERS)
+            start = rng.choice((8, 9, 10))
+            yield {
+                'name': f'{organizer} Blood Drive - {venue}',
+                'location': f'{venue}, {rng.randrange(1, 999)} {rng.choice(STREETS)}',
+                'camp_date': day,
+                'start_time': clock(start),
+                'end_time': clock(start + rng.choice((6, 7, 8))),
+                'organizer': organizer,
+                'contact_phone': f'555-{rng.randrange(10000):04d}',
+                'description': 'Walk-in blood donation drive, all blood groups welcome',
+                'is_active': day >= self.today or rng.random() < 0.1,
+                'created_at': self._moment(day - timedelta(days=rng.randrange(14, 60))),
+            }
+
+
+def _insert(table, rows):
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def _load_people(generator, people, first_id, count, user_rows, child_table, child_key):
+    """Insert ``count`` users from ``people`` with their child rows, batch by batch."""
+    users, children = [], []
+    for user, rows in people(first_id, count):
+        users.append(user)
+        children.extend(rows)
+        if len(users) >= BATCH_SIZE:
+            _insert(User.__table__, users)
+            _insert(child_table, children)
+            db.session.commit()
+            generator.counts[child_key] += len(children)
+            users, children = [], []
+    _insert(User.__table__, users)
+    _insert(child_table, children)
+    db.session.commit()
+    generator.counts[child_key] += len(children)
+    generator.counts[user_rows] += count
+
+
+def generate(scale, seed=DEFAULT_SEED, admin_id=None):
+    """Add ``scale`` x ``PER_SCALE`` synthetic rows to the current database; returns the row counts."""
+    generator = Generator(scale, seed, admin_id)
+    dialect = db.engine.dialect.name
+    started = time.perf_counter()
+
+    if dialect == 'sqlite':
+        # Throwaway load data: skip the fsync on every batch commit, then put back the
+        # connection's own setting (the engine profile's, on a pooled connection)
+        synchronous = db.session.scalar(text('PRAGMA synchronous'))
+        db.session.execute(text('PRAGMA synchronous = OFF'))
+
+    # Explicit ids, so child rows can reference users without reading them back
+    first_id = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+    donors = int(PER_SCALE['donors'] * scale)
+    patients = int(PER_SCALE['patients'] * scale)
+
+    _load_people(generator, generator.donors, first_id, donors, 'donors', Donation.__table__, 'donations')
+    print(f"  {generator.counts['donors']} donors, {generator.counts['donations']} donations "
+          f"({time.perf_counter() - started:.0f}s)")
+
+    _load_people(generator, generator.patients, first_id + donors, patients, 'patients',
+                 BloodRequest.__table__, 'requests')
+    print(f"  {generator.counts['patients']} patients, {generator.counts['requests']} requests "
+          f"({time.perf_counter() - started:.0f}s)")
+
+    camps = list(generator.camps(int(PER_SCALE['camps'] * scale)))
+    for start in range(0, len(camps), BATCH_SIZE):
+        _insert(DonationCamp.__table__, camps[start:start + BATCH_SIZE])
+    generator.counts['camps'] = len(camps)
+
+    if dialect == 'postgresql':
+        # Move the id sequence past the explicitly numbered users
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), (SELECT MAX(id) FROM \"user\"))"
+        ))
+    db.session.commit()
+    if dialect == 'sqlite':
+        db.session.execute(text(f'PRAGMA synchronous = {int(synchronous)}'))
+        db.session.commit()
+    print(f"  {generator.counts['camps']} camps ({time.perf_counter() - started:.0f}s)")
+    return generator.counts
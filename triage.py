@@ -0,0 +1,191 @@
+# triage.py
+"""
+Triage queue and batch approval for pending blood requests.
+
+Pending requests are served in need order (urgency, then deadline, then
+age) straight from the ``idx_blood_request_triage`` index. ``batch_approve``
+pops pending requests off a priority heap, plans each one against an
+in-memory copy of the stock (compatible groups included, see
+``compatibility.plan_allocation``) and writes every approval, stock change
+and counter update in a single transaction, issuing each group's
+earliest-expiring bags first. Requests that cannot be filled are reported
+back and stay pending. If a group's count runs ahead of its unexpired bags
+the batch is re-planned against the bags actually on the shelf.
+"""
+
+import heapq
+import time
+from collections import Counter as Tally
+from datetime import date, datetime
+from typing import NamedTuple
+
+import click
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+
+from broker import inventory_changed, requests_changed
+from compatibility import BLOOD_GROUPS, plan_allocation
+from counters import increment, requests_key
+from extensions import db
+from inventory import REASON_APPROVAL, retire_expired, unexpired_unit_counts, withdraw_batch
+from models import BloodInventory, BloodRequest, triage_deadline, triage_priority
+
+# Rows per claiming UPDATE (keeps the IN list under driver parameter limits)
+CLAIM_CHUNK_SIZE = 500
+
+# Re-runs when a concurrent approval claimed one of the planned requests first,
+# or a planned group had fewer unexpired bags than its count
+BATCH_ATTEMPTS = 3
+
+
+class BatchApprovalError(Exception):
+    """Batch approval could not get a consistent plan written; nothing was approved."""
+
+
+class PendingRequest(NamedTuple):
+    priority: int
+    deadline: object
+    id: int
+    patient_id: int
+    blood_group: str
+    units_required: int
+    urgency: str
+
+
+class BatchResult(NamedTuple):
+    approved: list
+    unfilled: list
+    elapsed: float
+
+    @property
+    def units_allocated(self):
+        return sum(units for _, plan in self.approved for _, units in plan)
+
+
+def triage_order():
+    return (BloodRequest.priority, BloodRequest.deadline, BloodRequest.id)
+
+
+def triage_queue(limit):
+    """The first ``limit`` pending requests in triage order, patients loaded."""
+    return (BloodRequest.query.options(joinedload(BloodRequest.patient)).filter_by(status='pending')
+            .order_by(*triage_order()).limit(limit).all())
+
+
+def _pending_requests():
+    rows = db.session.execute(
+        select(BloodRequest.priority, BloodRequest.deadline, BloodRequest.id, BloodRequest.patient_id,
+               BloodRequest.blood_group, BloodRequest.units_required, BloodRequest.urgency)
+        .where(BloodRequest.status == 'pending')
+    )
+    return [PendingRequest(*row) for row in rows]
+
+
+def plan_batch(pending, stock, limit=None, reserve=0):
+    """Walk ``pending`` in triage order and allocate from ``stock`` (mutated in place).
+
+    Returns ``(approved, unfilled)``: ``[(request, plan), ...]`` and the
+    requests compatible stock could not cover. A request that cannot be
+    filled does not block smaller or other-group requests behind it.
+    """
+    # Rows not yet backfilled sort as their urgency would and after any dated deadline
+    heap = [(request.priority if request.priority is not None else triage_priority(request.urgency),
+             request.deadline or date.max, request.id, request) for request in pending]
+    heapq.heapify(heap)
+    approved, unfilled = [], []
+    while heap and (limit is None or len(approved) < limit):
+        request = heapq.heappop(heap)[-1]
+        plan = plan_allocation(request.blood_group, request.units_required, stock,
+                               0 if request.urgency == 'urgent' else reserve)
+        if plan is None:
+            unfilled.append(request)
+            continue
+        for blood_group, units in plan:
+            stock[blood_group] -= units
+        approved.append((request, plan))
+    return approved, unfilled
+
+
+def preview_batch(limit=None):
+    """What ``batch_approve`` would do right now, without writing anything."""
+    stock = dict(db.session.query(BloodInventory.blood_group, BloodInventory.units_available))
+    return plan_batch(_pending_requests(), stock, limit, current_app.config['UNIVERSAL_DONOR_RESERVE'])
+
+
+def _claim(request_ids, approver_id, approved_at):
+    """Mark ``request_ids`` approved; False if any of them is no longer pending."""
+    claimed = 0
+    for start in range(0, len(request_ids), CLAIM_CHUNK_SIZE):
+        chunk = request_ids[start:start + CLAIM_CHUNK_SIZE]
+        claimed += db.session.execute(
+            update(BloodRequest)
+            .where(BloodRequest.id.in_(chunk), BloodRequest.status == 'pending')
+            .values(status='approved', approved_by=approver_id, approved_date=approved_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return claimed == len(request_ids)
+
+
+def batch_approve(approver_id, limit=None):
+    """Approve as many pending requests as stock allows, most urgent first, in one transaction."""
+    reserve = current_app.config['UNIVERSAL_DONOR_RESERVE']
+    started = time.perf_counter()
+    # Groups whose planned units were not all on the shelf last attempt
+    short_groups = set()
+    for _ in range(BATCH_ATTEMPTS):
+        # Bags that lapsed since the last expiry sweep must not be planned against
+        expired = sum(retire_expired(blood_group) for blood_group in BLOOD_GROUPS)
+        # Lock the stock rows so no other approval can take units mid-batch
+        stock = dict(db.session.query(BloodInventory.blood_group, BloodInventory.units_available)
+                     .with_for_update())
+        if short_groups:
+            # The count is ahead of the bags (stock changed outside the app): plan from the bags
+            bags = unexpired_unit_counts(short_groups)
+            for blood_group in short_groups:
+                stock[blood_group] = min(stock.get(blood_group, 0), bags.get(blood_group, 0))
+        approved, unfilled = plan_batch(_pending_requests(), stock, limit, reserve)
+
+        if (_claim([request.id for request, _ in approved], approver_id, datetime.utcnow())
+                and withdraw_batch([(request.id, plan) for request, plan in approved],
+                                   REASON_APPROVAL, user_id=approver_id)):
+            by_patient = Tally(request.patient_id for request, _ in approved)
+            if approved:
+                increment(requests_key('pending'), -len(approved))
+                increment(requests_key('approved'), len(approved))
+            for patient_id, count in by_patient.items():
+                increment(requests_key('pending', patient_id), -count)
+                increment(requests_key('approved', patient_id), count)
+            if approved:
+                requests_changed((request, 'approved') for request, _ in approved)
+            if approved or expired:
+                inventory_changed()
+            db.session.commit()
+            return BatchResult(approved, unfilled, time.perf_counter() - started)
+        db.session.rollback()
+        short_groups.update(blood_group for _, plan in approved for blood_group, _ in plan)
+    raise BatchApprovalError('Stock or pending requests kept changing during batch approval, please retry')
+
+
+def backfill_triage():
+    """Fill ``priority``/``deadline`` on requests created before they existed."""
+    rows = db.session.execute(
+        select(BloodRequest.id, BloodRequest.urgency, BloodRequest.request_date, BloodRequest.required_by)
+        .where((BloodRequest.priority.is_(None)) | (BloodRequest.deadline.is_(None)))
+    ).all()
+    if rows:
+        # Executemany UPDATE keyed on primary key
+        db.session.execute(update(BloodRequest), [
+            {'id': request_id,
+             'priority': triage_priority(urgency),
+             'deadline': triage_deadline(urgency, request_date, required_by)}
+            for request_id, urgency, request_date, required_by in rows
+        ])
+        db.session.commit()
+    return len(rows)
+
+
+@click.command('backfill-triage')
+def backfill_triage_command():
+    """Fill triage priority and deadline on blood requests that lack them."""
+    click.echo(f'Updated {backfill_triage()} blood requests')
@@ -0,0 +1,102 @@
+# versions.py
+"""
+Data version counters and version-checked in-process caches.
+
+Writers call ``bump_version(name)`` inside their transaction. Every worker
+process keeps its own ``VersionedCache`` and polls the (primary-key) version
+row at most once per ``CACHE_VERSION_POLL_INTERVAL`` seconds, reloading only
+when the version moved, so a write in one gunicorn worker is picked up by the
+others without each read hitting the underlying tables. Commits made by the
+current process invalidate its caches immediately.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import DataVersion
+from replicas import primary
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+_commit_callbacks = defaultdict(list)
+
+
+def bump_version(name):
+    """Increment the ``name`` version in the current transaction."""
+    bumped = db.session.execute(
+        update(DataVersion)
+        .where(DataVersion.name == name)
+        .values(version=DataVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not bumped:
+        try:
+            with db.session.begin_nested():
+                db.session.add(DataVersion(name=name, version=1))
+        except IntegrityError:
+            return bump_version(name)
+    db.session.info.setdefault('bumped_versions', set()).add(name)
+
+
+def get_version(name):
+    return db.session.query(DataVersion.version).filter_by(name=name).scalar() or 0
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_committed_versions(session):
+    for name in session.info.pop('bumped_versions', ()):
+        for callback in _commit_callbacks[name]:
+            callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bumped_versions(session):
+    session.info.pop('bumped_versions', None)
+
+
+class VersionedCache:
+    """A process-local value rebuilt by ``loader`` whenever the ``name`` version changes."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        # (version, value, checked_at) swapped as one tuple so readers never see a torn state
+        self._state = (None, None, 0.0)
+        _commit_callbacks[name].append(self.invalidate)
+
+    def get(self):
+        return self.get_versioned()[1]
+
+    def get_versioned(self):
+        """Return ``(version, value)``; the version can serve as a cache validator."""
+        version, value, checked_at = self._state
+        interval = current_app.config.get('CACHE_VERSION_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        now = time.monotonic()
+        if value is not None and now - checked_at < interval:
+            return version, value
+
+        with self._lock:
+            version, value, checked_at = self._state
+            if value is not None and now - checked_at < interval:
+                return version, value
+            # The version is read before the data, so a concurrent write can only
+            # make the cached value newer than its version, never older. Both come
+            # from the primary: the cache is shared with users pinned to it (replicas.py)
+            with primary():
+                current = get_version(self.name)
+                if value is None or current != version:
+                    value = self.loader()
+            self._state = (current, value, now)
+            return current, value
+
+    def invalidate(self):
+        version, value, _ = self._state
+        self._state = (version, value, 0.0)